@@ -1,15 +1,26 @@
-from flask import Flask, request, jsonify
-from firebase_service import FirebaseService
+from flask import Flask, Response, request, jsonify
+from storage_backend import StorageBackend, create_storage_backend
+from background import PeriodicTask
+from revocation import RevocationSet
+from jobs import JobManager, JobQueueFull
+from projection import POST_FIELDS, USER_FIELDS, LOG_FIELDS, parse_fields, project
+from export import EXPORT_FORMATS, CONTENT_TYPES, export_stream
+from serialization import FastJSONProvider, dumps
+from compression import compress_response, etag_variants
 from flask_cors import CORS
 import os
+import atexit
 from dotenv import load_dotenv
 import secrets
+import hashlib
 import jwt
 import datetime
 from datetime import timedelta
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app) # orjson when installed, encodes firestore timestamps itself
 CORS(app)
 
 # Load environment variables from .env file
@@ -19,7 +30,105 @@ load_dotenv()
 app.config['SECRET_KEY'] = os.environ.get('ADMIN_SECRET_KEY', secrets.token_hex(16)) # Secret key for JWT tokens - keep this secure
 ADMIN_REGISTRATION_KEY = os.environ.get('ADMIN_REGISTRATION_KEY', 'villanova-optima-admin-2025') # registration key required to create admin accounts
 
-firebase_service = FirebaseService()
+firebase_service = create_storage_backend() # firestore unless STORAGE_BACKEND says otherwise
+
+# shared bounded pool for running the independent service calls of a request concurrently
+request_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('ADMIN_FANOUT_WORKERS', 16)),
+    thread_name_prefix='admin-fanout'
+)
+
+# long running operations (cascading deletes, bulk moderation) run as background jobs
+job_manager = JobManager(
+    firebase_service,
+    max_workers=int(os.environ.get('ADMIN_JOB_WORKERS', 4)),
+    max_pending=int(os.environ.get('ADMIN_JOB_QUEUE_SIZE', 100))
+)
+job_manager.start() # fails the jobs a stopped worker left queued or running
+atexit.register(job_manager.shutdown)
+
+# keep the daily analytics rollups up to date in the background. Every worker process imports this module,
+# so the compactor is off unless ROLLUP_COMPACTOR is set, and it should be set on exactly one of them
+ROLLUP_COMPACTOR = os.environ.get('ROLLUP_COMPACTOR', 'false').lower() == 'true'
+ROLLUP_COMPACTION_INTERVAL = int(os.environ.get('ROLLUP_COMPACTION_INTERVAL', 300))
+if ROLLUP_COMPACTOR and ROLLUP_COMPACTION_INTERVAL > 0:
+    rollup_compactor = PeriodicTask('rollup-compactor', ROLLUP_COMPACTION_INTERVAL, firebase_service.compact_daily_rollups, run_immediately=True)
+    rollup_compactor.start()
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024)) # responses smaller than this (bytes) are sent uncompressed
+
+MAX_BULK_ITEMS = int(os.environ.get('MAX_BULK_ITEMS', 500)) # cap on ids per bulk moderation request
+
+# in stateless mode tokens carry the admin's claims and are validated without a firestore read,
+# disabled admins are rejected through a revocation set that is refreshed in the background.
+# The set is loaded before serving, while it is not fresh (never loaded, or the refreshes keep
+# failing for longer than the max age) tokens are checked against the database instead
+STATELESS_ADMIN_TOKENS = os.environ.get('STATELESS_ADMIN_TOKENS', 'true').lower() == 'true'
+ADMIN_REVOCATION_REFRESH_INTERVAL = int(os.environ.get('ADMIN_REVOCATION_REFRESH_INTERVAL', 60))
+ADMIN_REVOCATION_MAX_AGE = int(os.environ.get('ADMIN_REVOCATION_MAX_AGE', 3 * ADMIN_REVOCATION_REFRESH_INTERVAL))
+
+revoked_admins = RevocationSet(firebase_service.get_revoked_admin_ids, max_age=ADMIN_REVOCATION_MAX_AGE)
+if STATELESS_ADMIN_TOKENS:
+    try:
+        revoked_admins.refresh()
+    except Exception as e: # serve anyway, token_required reads the admin until a refresh succeeds
+        print(f'Error loading admin revocations: {e}')
+    revocation_refresher = PeriodicTask('admin-revocation-refresh', ADMIN_REVOCATION_REFRESH_INTERVAL, revoked_admins.refresh)
+    revocation_refresher.start()
+
+def parse_time(value, name):
+    '''Parse an iso 8601 query param into an aware datetime (utc when it has no offset), None when absent'''
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO 8601 timestamp')
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+
+def parse_threshold(value):
+    '''Check a similarity threshold query param is in (0, 1]'''
+    if value is None or not 0 < value <= 1:
+        raise ValueError('threshold must be a number between 0 and 1')
+    return value
+
+def make_etag(*parts):
+    '''Strong etag from what identifies a version of a response
+
+    Detail routes pass the document's update time so no body has to be built to get it,
+    list pages (and backends without update times) pass the content itself.
+    '''
+    return hashlib.sha256(dumps(parts, sort_keys=True)).hexdigest()[:32]
+
+def document_etag(kind, data):
+    '''Etag for a single document, from its updateTime when the backend tracks one'''
+    if data.get('updateTime'):
+        return make_etag(kind, data.get('id'), data['updateTime'])
+    return make_etag(kind, data)
+
+def public_document(data):
+    '''Copy of a service document for a response, without the updateTime kept for preconditions and etags'''
+    return {key: value for key, value in data.items() if key != 'updateTime'}
+
+def conditional_json(payload, etag):
+    '''jsonify payload with its etag, or an empty 304 when If-None-Match already has that version
+
+    Compressed bodies carry the etag with an encoding suffix, a 304 answers with the variant the client sent.
+    '''
+    matched = next((tag for tag in etag_variants(etag) if request.if_none_match.contains_weak(tag)), None) # weak comparison
+    if matched:
+        response = app.response_class(status=304)
+        response.set_etag(matched)
+    else:
+        response = jsonify(payload)
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache' # keep it, but revalidate every time
+    return response
+
+@app.after_request
+def compress(response):
+    '''gzip or brotli encode large json responses for clients that accept it'''
+    return compress_response(response, request.accept_encodings, COMPRESS_MIN_SIZE)
 
 # decorator for JWT token validation
 def token_required(f):
@@ -40,7 +149,22 @@ def token_required(f):
         
         try:
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_admin = firebase_service.get_admin(data['admin_id'])
+            
+            # tokens issued before claims were added, or a revocation set that can't be trusted, fall back to a lookup
+            if STATELESS_ADMIN_TOKENS and 'email' in data and revoked_admins.fresh:
+                if data['admin_id'] in revoked_admins:
+                    current_admin = None
+                else:
+                    current_admin = {
+                        'id': data['admin_id'],
+                        'email': data['email'],
+                        'name': data.get('name', '')
+                    }
+            else:
+                current_admin = firebase_service.get_admin(data['admin_id'])
+                if current_admin and current_admin.get('revoked'):
+                    current_admin = None
+            
             if not current_admin:
                 return jsonify({
                     'success': False,
@@ -81,9 +205,13 @@ def admin_login():
             }), 401
         
         # gen JWT token
+        now = datetime.datetime.now(datetime.timezone.utc)
         token = jwt.encode({
             'admin_id': admin_user['id'],
-            'exp': datetime.datetime.now(datetime.timezone.utc) + timedelta(hours=24)
+            'email': admin_user['email'],
+            'name': admin_user.get('name', ''),
+            'iat': now,
+            'exp': now + timedelta(hours=24)
         }, app.config['SECRET_KEY'], algorithm='HS256')
         
         return jsonify({
@@ -149,33 +277,136 @@ def admin_profile(current_admin):
                 'error': 'Admin account not found'
             }), 404
         
-        return jsonify({
+        return conditional_json({
             'success': True,
-            'admin': admin_data
-        })
+            'admin': public_document(admin_data)
+        }, document_etag('admin', admin_data))
     except Exception as e:
         return jsonify({
             'success': False,
             'error': f'Error retrieving admin profile: {str(e)}'
         }), 500
 
+@app.route('/api/admin/admins/<admin_id>/revoke', methods=['POST'])
+@token_required
+def revoke_admin(current_admin, admin_id):
+    '''Revoke or restore another admin's access'''
+    try:
+        data = request.json or {}
+        revoked = data.get('revoked', True)
+        
+        if admin_id == current_admin['id']:
+            return jsonify({
+                'success': False,
+                'error': 'Admins cannot revoke their own access'
+            }), 400
+        
+        firebase_service.set_admin_revoked(admin_id, revoked=revoked, acting_admin_id=current_admin['id'])
+        
+        # apply locally straight away, other processes pick it up on their next refresh
+        if revoked:
+            revoked_admins.add(admin_id)
+        else:
+            revoked_admins.discard(admin_id)
+        
+        return jsonify({
+            'success': True,
+            'message': f'Admin {admin_id} has been {"revoked" if revoked else "restored"}'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
 # Post management routes
 
 @app.route('/api/admin/posts', methods=['GET'])
 @token_required
 def get_posts(current_admin):
     try:
-        # extract pagination params
+        # extract pagination params, cursor is the opaque next_cursor of the previous page
         limit = request.args.get('limit', 50, type=int)
+        cursor = request.args.get('cursor')
         start_after = request.args.get('startAfter')
+        fields = parse_fields(request.args.get('fields'), POST_FIELDS) # e.g. fields=content,username,likeCount
         
         # Get posts with pagination
-        posts_data = firebase_service.get_all_posts(limit=limit, start_after=start_after)
+        posts_data = firebase_service.get_all_posts(limit=limit, start_after=start_after, cursor=cursor, fields=fields)
         
-        return jsonify({
+        payload = {
             'success': True,
             'posts': posts_data['posts'],
-            'last_post': posts_data['last_post']
+            'last_post': posts_data['last_post'],
+            'next_cursor': posts_data['next_cursor'],
+            'has_more': posts_data['has_more']
+        }
+        return conditional_json(payload, make_etag(payload))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/posts/search', methods=['GET'])
+@token_required
+def search_posts(current_admin):
+    try:
+        # words must all match, "quoted phrases" must match exactly, best matches first
+        query = request.args.get('q', '')
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        fields = parse_fields(request.args.get('fields'), POST_FIELDS)
+        
+        results = firebase_service.search_posts(query, limit=limit, offset=offset, fields=fields)
+        
+        return jsonify({
+            'success': True,
+            'posts': results['posts'],
+            'total': results['total'],
+            'has_more': results['has_more']
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/posts/duplicates', methods=['GET'])
+@token_required
+def get_duplicate_clusters(current_admin):
+    try:
+        # clusters of near-identical posts, the post_ids of a cluster can go straight to bulk-delete
+        threshold = parse_threshold(request.args.get('threshold', 0.7, type=float))
+        min_size = max(request.args.get('min_size', 3, type=int), 2)
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        
+        report = firebase_service.get_duplicate_clusters(threshold=threshold, min_size=min_size, limit=limit)
+        
+        return jsonify({
+            'success': True,
+            'clusters': report['clusters'],
+            'total_clusters': report['total_clusters']
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/posts/<post_id>/similar', methods=['GET'])
+@token_required
+def get_similar_posts(current_admin, post_id):
+    try:
+        threshold = parse_threshold(request.args.get('threshold', 0.5, type=float))
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        fields = parse_fields(request.args.get('fields'), POST_FIELDS)
+        
+        posts = firebase_service.get_similar_posts(post_id, threshold=threshold, limit=limit, fields=fields)
+        
+        return jsonify({
+            'success': True,
+            'posts': posts
         })
     except Exception as e:
         return jsonify({
@@ -189,10 +420,10 @@ def get_post_details(current_admin, post_id):
     try:
         post = firebase_service.get_post(post_id) # get post details
         
-        return jsonify({
+        return conditional_json({
             'success': True,
-            'post': post
-        })
+            'post': public_document(post)
+        }, document_etag('post', post))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -240,6 +471,30 @@ def update_post_content(current_admin, post_id):
             'error': str(e)
         }), 400
 
+@app.route('/api/admin/posts/<post_id>/comments', methods=['GET'])
+@token_required
+def get_post_comments(current_admin, post_id):
+    try:
+        # newest first, cursor is the opaque next_cursor of the previous page
+        cursor = request.args.get('cursor')
+        start_after = request.args.get('startAfter')
+        
+        comments_data = firebase_service.get_comments(post_id, last_comment=start_after, cursor=cursor)
+        
+        payload = {
+            'success': True,
+            'comments': comments_data['comments'],
+            'last_comment': comments_data['last_comment'],
+            'next_cursor': comments_data['next_cursor'],
+            'has_more': comments_data['has_more']
+        }
+        return conditional_json(payload, make_etag(payload))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
 @app.route('/api/admin/posts/<post_id>/comments/<comment_id>', methods=['DELETE'])
 @token_required
 def delete_comment(current_admin, post_id, comment_id):
@@ -257,22 +512,116 @@ def delete_comment(current_admin, post_id, comment_id):
             'error': str(e)
         }), 400
 
+@app.route('/api/admin/posts/bulk-delete', methods=['POST'])
+@token_required
+def bulk_delete_posts(current_admin):
+    try:
+        data = request.json or {}
+        post_ids = data.get('post_ids')
+        
+        # validate the id list
+        if not isinstance(post_ids, list) or not post_ids or not all(isinstance(post_id, str) and post_id for post_id in post_ids):
+            return jsonify({
+                'success': False,
+                'error': 'post_ids must be a non-empty list of post ids'
+            }), 400
+        if len(post_ids) > MAX_BULK_ITEMS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BULK_ITEMS} posts can be deleted per request'
+            }), 400
+        
+        result = firebase_service.bulk_delete_posts(post_ids, admin_id=current_admin['id'])
+        
+        return jsonify({
+            'success': True,
+            'deleted': result['deleted'],
+            'not_found': result['not_found'],
+            'message': f'{len(result['deleted'])} posts have been deleted'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/comments/bulk-delete', methods=['POST'])
+@token_required
+def bulk_delete_comments(current_admin):
+    try:
+        data = request.json or {}
+        comments = data.get('comments')
+        
+        # validate the list of {post_id, comment_id} pairs
+        if not isinstance(comments, list) or not comments or not all(
+            isinstance(comment, dict) and isinstance(comment.get('post_id'), str) and isinstance(comment.get('comment_id'), str)
+            for comment in comments
+        ):
+            return jsonify({
+                'success': False,
+                'error': 'comments must be a non-empty list of {post_id, comment_id}'
+            }), 400
+        if len(comments) > MAX_BULK_ITEMS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BULK_ITEMS} comments can be deleted per request'
+            }), 400
+        
+        result = firebase_service.bulk_delete_comments(comments, admin_id=current_admin['id'])
+        
+        return jsonify({
+            'success': True,
+            'deleted': result['deleted'],
+            'not_found': result['not_found'],
+            'message': f'{len(result['deleted'])} comments have been deleted'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
 # User management Routes
 
 @app.route('/api/admin/users', methods=['GET'])
 @token_required
 def get_users(current_admin):
     try:
-        # Extract pagination params
+        # Extract pagination params, cursor is the opaque next_cursor of the previous page
         limit = request.args.get('limit', 50, type=int)
+        cursor = request.args.get('cursor')
         start_after = request.args.get('startAfter')
+        fields = parse_fields(request.args.get('fields'), USER_FIELDS)
         
-        users_data = firebase_service.get_all_users(limit=limit, start_after=start_after) # get users with pagination
+        users_data = firebase_service.get_all_users(limit=limit, start_after=start_after, cursor=cursor, fields=fields) # get users with pagination
         
-        return jsonify({
+        payload = {
             'success': True,
             'users': users_data['users'],
-            'last_user': users_data['last_user']
+            'last_user': users_data['last_user'],
+            'next_cursor': users_data['next_cursor'],
+            'has_more': users_data['has_more']
+        }
+        return conditional_json(payload, make_etag(payload))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/users/search', methods=['GET'])
+@token_required
+def search_users(current_admin):
+    try:
+        # prefix of a username or email, matched case-insensitively
+        query = request.args.get('q', '')
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        
+        users = firebase_service.admin_search_users(query, limit=limit)
+        
+        return jsonify({
+            'success': True,
+            'users': users
         })
     except Exception as e:
         return jsonify({
@@ -284,19 +633,42 @@ def get_users(current_admin):
 @token_required
 def get_user_details(current_admin, user_id):
     try:
-        # get user profile
-        user = firebase_service.get_user_profile(user_id)
+        # extract pagination params for the user's posts
+        posts_limit = request.args.get('postsLimit', 50, type=int)
+        posts_cursor = request.args.get('postsCursor')
+        posts_order = request.args.get('postsOrder', 'desc')
+        posts_fields = parse_fields(request.args.get('postsFields'), POST_FIELDS)
+        fields = parse_fields(request.args.get('fields'), USER_FIELDS + ('posts',)) # the profile fields, plus 'posts'
+        include_posts = fields is None or 'posts' in fields
         
-        # get user's posts
-        posts = firebase_service.get_user_posts(user_id)
+        # get user profile and a page of the user's posts at the same time, the posts are skipped when not asked for
+        user_future = request_executor.submit(firebase_service.get_user_profile, user_id)
+        posts_future = None
+        if include_posts:
+            posts_future = request_executor.submit(
+                firebase_service.get_user_posts, user_id,
+                limit=posts_limit, cursor=posts_cursor, order=posts_order, fields=posts_fields
+            )
+        user_data = user_future.result()
+        user = public_document(project(user_data, fields)) # a copy, the cached profile must not get the posts
+        etag = document_etag('user', user_data)
         
-        # add posts to user data
-        user['posts'] = posts
+        if not posts_future:
+            return conditional_json({
+                'success': True,
+                'user': user
+            }, etag)
         
-        return jsonify({
+        # add posts to user data, the posts change without the user document so they are part of the etag
+        posts_data = posts_future.result()
+        user['posts'] = posts_data['posts']
+        
+        return conditional_json({
             'success': True,
-            'user': user
-        })
+            'user': user,
+            'posts_next_cursor': posts_data['next_cursor'],
+            'posts_has_more': posts_data['has_more']
+        }, make_etag(etag, posts_data))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -328,10 +700,92 @@ def suspend_user(current_admin, user_id):
 @token_required
 def delete_user(current_admin, user_id):
     try:
-        result = firebase_service.delete_user(user_id, admin_id=current_admin['id'])
+        # the cascade can take a while, run it as a job and let the client poll for the result
+        job_id = job_manager.submit(
+            'DELETE_USER', current_admin['id'], firebase_service.delete_user,
+            args=(user_id,), kwargs={'admin_id': current_admin['id']}, params={'user_id': user_id}
+        )
+        status_url = f'/api/admin/jobs/{job_id}'
+        
+        return jsonify({
+            'success': True,
+            'message': f'Deletion of user {user_id} has been queued',
+            'job_id': job_id,
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    except JobQueueFull as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+# Moderation routes
+
+@app.route('/api/admin/moderation/queue', methods=['GET'])
+@token_required
+def get_moderation_queue(current_admin):
+    try:
+        # pending by default, dismissed and removed items stay for the record
+        status = request.args.get('status', 'pending')
+        limit = request.args.get('limit', 50, type=int)
+        cursor = request.args.get('cursor')
+        
+        queue = firebase_service.get_moderation_queue(status=status, limit=limit, cursor=cursor)
+        
+        return jsonify({
+            'success': True,
+            'items': queue['items'],
+            'next_cursor': queue['next_cursor'],
+            'has_more': queue['has_more']
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/moderation/queue/<item_id>/resolve', methods=['POST'])
+@token_required
+def resolve_moderation_item(current_admin, item_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        action = data.get('action') # dismiss or remove
+        
+        item = firebase_service.resolve_moderation_item(item_id, action, admin_id=current_admin['id'])
+        
+        return jsonify({
+            'success': True,
+            'message': f"Review item has been {item['status']}",
+            'item': item
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+# Job routes
+
+@app.route('/api/admin/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job_status(current_admin, job_id):
+    try:
+        job = firebase_service.get_job(job_id)
+        
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found'
+            }), 404
+        
         return jsonify({
             'success': True,
-            'message': f'User {user_id} and {result['posts_deleted']} posts have been deleted'
+            'job': job
         })
     except Exception as e:
         return jsonify({
@@ -361,28 +815,276 @@ def get_analytics_summary(current_admin):
             'error': str(e)
         }), 400
 
+@app.route('/api/admin/analytics/timeseries', methods=['GET'])
+@token_required
+def get_analytics_timeseries(current_admin):
+    try:
+        # extract time period and requested metrics
+        days = request.args.get('days', 30, type=int)
+        metrics = request.args.get('metrics', ','.join(StorageBackend.ROLLUP_METRICS)).split(',')
+        metrics = [metric.strip() for metric in metrics if metric.strip()]
+        
+        if not 1 <= days <= 366:
+            return jsonify({
+                'success': False,
+                'error': 'days must be between 1 and 366'
+            }), 400
+        
+        invalid_metrics = [metric for metric in metrics if metric not in StorageBackend.ROLLUP_METRICS]
+        if not metrics or invalid_metrics:
+            return jsonify({
+                'success': False,
+                'error': f'metrics must be a comma separated list of {", ".join(StorageBackend.ROLLUP_METRICS)}'
+            }), 400
+        
+        timeseries = firebase_service.get_analytics_timeseries(days=days, metrics=metrics)
+        
+        return jsonify({
+            'success': True,
+            'timeseries': timeseries
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/analytics/counters/rebuild', methods=['POST'])
+@token_required
+def rebuild_analytics_counters(current_admin):
+    try:
+        # recompute the sharded counters from the collections, reads every document so it runs as a job
+        job_id = job_manager.submit(
+            'REBUILD_COUNTERS', current_admin['id'], firebase_service.rebuild_counters,
+            kwargs={'admin_id': current_admin['id']}
+        )
+        status_url = f'/api/admin/jobs/{job_id}'
+        
+        return jsonify({
+            'success': True,
+            'message': 'Counter rebuild has been queued',
+            'job_id': job_id,
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    except JobQueueFull as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+# Maintenance routes
+
+@app.route('/api/admin/maintenance/comments/migrate', methods=['POST'])
+@token_required
+def migrate_embedded_comments(current_admin):
+    try:
+        # moves comments out of post documents in the background, safe to run again until nothing is skipped
+        job_id = job_manager.submit('MIGRATE_COMMENTS', current_admin['id'], firebase_service.migrate_embedded_comments)
+        status_url = f'/api/admin/jobs/{job_id}'
+        
+        return jsonify({
+            'success': True,
+            'message': 'Comment migration has been queued',
+            'job_id': job_id,
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    except JobQueueFull as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/maintenance/search/reindex', methods=['POST'])
+@token_required
+def rebuild_post_index(current_admin):
+    try:
+        job_id = job_manager.submit('REINDEX_POSTS', current_admin['id'], firebase_service.rebuild_post_index)
+        status_url = f'/api/admin/jobs/{job_id}'
+        
+        return jsonify({
+            'success': True,
+            'message': 'Post search reindex has been queued',
+            'job_id': job_id,
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    except JobQueueFull as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/maintenance/moderation/scan', methods=['POST'])
+@token_required
+def scan_for_moderation(current_admin):
+    try:
+        # reloads the banned phrase list and sweeps every post and comment against it
+        job_id = job_manager.submit('MODERATION_SCAN', current_admin['id'], firebase_service.scan_for_moderation)
+        status_url = f'/api/admin/jobs/{job_id}'
+        
+        return jsonify({
+            'success': True,
+            'message': 'Moderation scan has been queued',
+            'job_id': job_id,
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    except JobQueueFull as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/admin/maintenance/duplicates/reindex', methods=['POST'])
+@token_required
+def rebuild_duplicate_index(current_admin):
+    try:
+        job_id = job_manager.submit('REINDEX_DUPLICATES', current_admin['id'], firebase_service.rebuild_duplicate_index)
+        status_url = f'/api/admin/jobs/{job_id}'
+        
+        return jsonify({
+            'success': True,
+            'message': 'Duplicate index rebuild has been queued',
+            'job_id': job_id,
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    except JobQueueFull as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+# Cache routes
+
+@app.route('/api/admin/cache/stats', methods=['GET'])
+@token_required
+def get_cache_stats(current_admin):
+    try:
+        return jsonify({
+            'success': True,
+            'caches': firebase_service.get_cache_stats()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
 # Admin Logs Routes
 
 @app.route('/api/admin/logs', methods=['GET'])
 @token_required
 def get_admin_logs(current_admin):
     try:
-        # extract limit params
+        # extract limit and pagination params
         limit = request.args.get('limit', 100, type=int)
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'), LOG_FIELDS)
+        
+        # filters, e.g. ?admin_id=...&action_type=POST_DELETED&since=2025-01-01T00:00:00Z
+        filters = {name: request.args[name] for name in StorageBackend.LOG_FILTERS if request.args.get(name)}
+        since = parse_time(request.args.get('since'), 'since')
+        until = parse_time(request.args.get('until'), 'until')
         
         # get admin logs
-        logs = firebase_service.get_admin_logs(limit=limit)
+        logs_data = firebase_service.get_admin_logs(
+            limit=limit, fields=fields, filters=filters,
+            since=since, until=until, cursor=cursor
+        )
         
-        return jsonify({
+        payload = {
             'success': True,
-            'logs': logs
-        })
+            'logs': logs_data['logs'],
+            'next_cursor': logs_data['next_cursor'],
+            'has_more': logs_data['has_more']
+        }
+        return conditional_json(payload, make_etag(payload))
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 400
 
+# Export routes
+
+EXPORTS = {
+    'users': ('iter_users', USER_FIELDS),
+    'posts': ('iter_posts', POST_FIELDS),
+    'logs': ('iter_admin_logs', LOG_FIELDS)
+}
+
+@app.route('/api/admin/export/<resource>', methods=['GET'])
+@token_required
+def export_data(current_admin, resource):
+    '''Stream every user, post or log entry as ndjson or csv, optionally gzipped'''
+    if resource not in EXPORTS:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown export {resource}'
+        }), 404
+    
+    try:
+        method, allowed = EXPORTS[resource]
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {export_format}, expected {' or '.join(EXPORT_FORMATS)}")
+        fields = parse_fields(request.args.get('fields'), allowed)
+        compress = request.args.get('gzip', 'false').lower() == 'true'
+        
+        columns = ['id', *(allowed if fields is None else fields)]
+        rows = getattr(firebase_service, method)(fields=fields)
+        
+        firebase_service.log_admin_action(
+            admin_id=current_admin['id'],
+            action_type='DATA_EXPORTED',
+            details={'resource': resource, 'format': export_format, 'fields': columns, 'gzip': compress}
+        )
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    def generate():
+        # the status line is already sent once rows stream, a failure can only cut the response short
+        try:
+            yield from export_stream(rows, export_format, columns, compress=compress)
+        except Exception as e:
+            print(f'Error in export of {resource}: {e}')
+            raise e
+    
+    filename = f"{resource}-{datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    if compress:
+        filename += '.gz'
+    
+    response = Response(generate(), mimetype='application/gzip' if compress else CONTENT_TYPES[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no' # don't let a proxy buffer the whole export
+    return response
+
 # Start server
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001)) # we use 5001 for now to use a different port than the main API
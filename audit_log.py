@@ -0,0 +1,217 @@
+# audit_log.py
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # not available on windows, the spool is then only locked within this process
+    fcntl = None
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0) # signal 0 only checks the process exists
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class AuditLogWriter:
+    '''Buffers admin log entries in memory and writes them in batches from a background thread
+
+    write_batch(entries) persists a list of entry dicts, it is called with at most `batch_size`
+    entries and must be idempotent (entries carry their own id) because a batch can be retried.
+    A batch that fails is appended to an append-only spool file and replayed before later
+    batches, entries still buffered at exit are flushed (or spooled) by close().
+
+    Every worker process shares the spool file, appends and the claim of a spool for replay
+    are locked across processes with flock. A claimed spool is renamed to a replay file of the
+    claiming process, so only that process reads and removes it, and the replay file of a
+    process that died mid replay is picked up by the next one.
+    '''
+
+    def __init__(self, write_batch, batch_size=200, flush_interval=1.0, max_buffered=10000, spool_path='admin_audit_spool.jsonl', retry_interval=30):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval # max seconds an entry waits in memory
+        self.max_buffered = max_buffered # past this the request thread spools directly
+        self.spool_path = spool_path
+        self.retry_interval = retry_interval # seconds to wait before retrying a failed spool replay
+        self._next_replay = 0.0
+        self._replay_path = f'{spool_path}.{os.getpid()}.replay'
+        self._lock_path = spool_path + '.lock'
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.written = 0
+        self.spooled = 0
+
+        self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, entry):
+        '''Queue an entry for writing, never blocks on the database'''
+        with self._lock:
+            if self._closed:
+                overflow = True
+            else:
+                overflow = len(self._buffer) >= self.max_buffered
+                if not overflow:
+                    self._buffer.append(entry)
+                    if len(self._buffer) >= self.batch_size:
+                        self._wakeup.set()
+
+        # the writer is falling behind (or gone), keep the entry on disk instead of growing the buffer
+        if overflow:
+            self._spool([entry])
+
+    def _take_batch(self):
+        with self._lock:
+            return [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            stopping = self._closed
+
+            try:
+                self._flush()
+            except Exception as e: # the thread must outlive any error, unwritten entries stay buffered for the next round
+                print(f'Error in audit log writer: {e}')
+                self._next_replay = time.monotonic() + self.retry_interval
+            if stopping:
+                return
+
+    def _flush(self):
+        # older spooled entries go first so a recovered database sees entries roughly in order
+        spool_ok = self._replay_spool()
+
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+
+            if not spool_ok:
+                self._spool(batch)
+                continue
+
+            try:
+                self.write_batch(batch)
+                self.written += len(batch)
+            except Exception as e:
+                print(f'Error in audit log flush, spooling {len(batch)} entries: {e}')
+                self._spool(batch)
+                self._next_replay = time.monotonic() + self.retry_interval
+                spool_ok = False # don't wait on a struggling database for every batch
+
+    def _spool(self, entries):
+        lines = ''.join(json.dumps(entry, default=str) + '\n' for entry in entries)
+        with self._spool_locked():
+            with open(self.spool_path, 'a', encoding='utf-8') as spool:
+                spool.write(lines)
+                spool.flush()
+                os.fsync(spool.fileno())
+            self.spooled += len(entries)
+
+    def _replay_spool(self):
+        '''Write spooled entries back to the database, returns False if it is still failing'''
+        if time.monotonic() < self._next_replay and not self._closed:
+            return False
+
+        with self._spool_locked():
+            if not os.path.exists(self._replay_path):
+                orphan = self._orphaned_replay()
+                if orphan:
+                    os.replace(orphan, self._replay_path) # the main spool is claimed on a later flush
+                elif not os.path.exists(self.spool_path):
+                    return True
+                else:
+                    # new spool writes go to a fresh file while this one is replayed
+                    os.replace(self.spool_path, self._replay_path)
+
+        entries = []
+        with open(self._replay_path, encoding='utf-8') as replay:
+            for line in replay:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError: # a torn last line from a crash, nothing to recover
+                    continue
+
+        try:
+            for i in range(0, len(entries), self.batch_size):
+                self.write_batch(entries[i:i + self.batch_size])
+        except Exception as e:
+            print(f'Error replaying audit log spool: {e}')
+            self._next_replay = time.monotonic() + self.retry_interval
+            return False
+
+        os.remove(self._replay_path)
+        self.written += len(entries)
+        return True
+
+    @contextmanager
+    def _spool_locked(self):
+        '''Hold the spool lock of this process and, where flock exists, of every process sharing the spool'''
+        with self._spool_lock:
+            with open(self._lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX) # released when the file is closed
+                yield
+
+    def _orphaned_replay(self):
+        '''A replay file left behind by a process that is gone (or by the unsuffixed name used before), None if there is none'''
+        legacy = self.spool_path + '.replay'
+        if os.path.exists(legacy):
+            return legacy
+        if fcntl is None: # without posix signals there is no safe way to tell a live process
+            return None
+        for path in glob.glob(glob.escape(self.spool_path) + '.*.replay'):
+            pid = path[len(self.spool_path) + 1:-len('.replay')]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                return path
+        return None
+
+    def close(self, timeout=30):
+        '''Stop accepting entries and flush what is buffered, entries that cannot be written stay spooled'''
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+        if not self._thread.is_alive():
+            try:
+                self._flush() # normally a no-op, the thread already flushed before exiting
+            except Exception as e:
+                print(f'Error in audit log flush on close: {e}')
+
+        # whatever the writer did not get to (it is stuck on the database, or the flush above failed) goes to disk
+        with self._lock:
+            remaining = list(self._buffer)
+            self._buffer.clear()
+        if remaining:
+            try:
+                self._spool(remaining)
+            except Exception as e:
+                print(f'Error spooling {len(remaining)} audit log entries on close: {e}')
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            'buffered': buffered,
+            'written': self.written,
+            'spooled': self.spooled,
+            'spool_pending': os.path.exists(self.spool_path) or os.path.exists(self._replay_path)
+        }
@@ -0,0 +1,28 @@
+# background.py
+import threading
+
+class PeriodicTask(threading.Thread):
+    '''Daemon thread that calls a function every `interval` seconds until stopped'''
+
+    def __init__(self, name, interval, func, run_immediately=False):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.func = func
+        self.run_immediately = run_immediately
+        self._stopped = threading.Event()
+
+    def run(self):
+        if self.run_immediately:
+            self._run_once()
+
+        while not self._stopped.wait(self.interval):
+            self._run_once()
+
+    def _run_once(self):
+        try:
+            self.func()
+        except Exception as e: # keep the thread alive, the next tick retries
+            print(f'Error in {self.name}: {e}')
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,93 @@
+# cache.py
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+class TTLCache:
+    '''Bounded, thread-safe read-through cache with a TTL and LRU eviction
+
+    Values are deep copied in and out so callers can mutate what they get back
+    (routes add keys to the dicts returned by the service) without touching the cache.
+    '''
+
+    def __init__(self, name, max_entries=1024, ttl=30):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self._generation = 0 # bumped by every invalidation, see get_or_load
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        '''Get a copy of the cached value, or None if it is missing or expired'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key, value, generation=None):
+        '''Cache a value, skipped if an invalidation happened since `generation` was read'''
+        value = copy.deepcopy(value)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        '''Read-through lookup, loader(key) is called on a miss and None results are not cached'''
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        # a write that invalidates while we are loading must win over the value we read
+        with self._lock:
+            generation = self._generation
+        value = loader(key)
+        if value is not None:
+            self.set(key, value, generation=generation)
+        return value
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
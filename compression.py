@@ -0,0 +1,73 @@
+# compression.py
+import gzip
+
+try:
+    import brotli
+except ImportError: # optional, only gzip is offered without it
+    brotli = None
+
+# encodings in order of preference when the client accepts several with the same quality
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # the default 11 is meant for static assets, far too slow per response
+
+def negotiate_encoding(accept_encodings):
+    '''Pick the encoding to use from a request's Accept-Encoding, None when it accepts none of ours'''
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        quality = accept_encodings[encoding] # 0 when not listed or refused with q=0, * counts
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0) # no timestamp, same body gives same bytes
+
+def etag_variants(etag):
+    '''The etag of a response and of its compressed representations'''
+    return [etag] + [f'{etag}-{encoding}' for encoding in ENCODINGS]
+
+def is_compressible(response):
+    '''Only buffered, not yet encoded, successful text responses; streamed exports are left as they are'''
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    return (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)
+
+def compress_response(response, accept_encodings, min_size=1024):
+    '''Compress a response body in place with the best encoding the client accepts
+
+    Bodies under min_size are sent as they are, compressing them costs more than it saves.
+    A compressed body is a different representation, so a strong etag gets the encoding as a
+    suffix (etag_variants lists them for If-None-Match checks).
+    '''
+    if response.status_code == 304:
+        response.vary.add('Accept-Encoding') # a 304 repeats the Vary of the full response
+    if not is_compressible(response):
+        return response
+
+    response.vary.add('Accept-Encoding') # caches must key on it even when this body goes uncompressed
+    if response.content_length is not None and response.content_length < min_size:
+        return response
+
+    encoding = negotiate_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
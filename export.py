@@ -0,0 +1,78 @@
+# export.py
+import csv
+import datetime
+import io
+import zlib
+from serialization import dumps
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8'
+}
+CHUNK_SIZE = 64 * 1024 # bytes handed to the server per write
+
+def ndjson_lines(rows):
+    '''One json document per line'''
+    for row in rows:
+        yield dumps(row).decode('utf-8') + '\n'
+
+def csv_lines(rows, columns):
+    '''A header line and then one line per row, nested values (lists, dicts) are written as json'''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(columns)
+    for row in rows:
+        yield line([_csv_value(row.get(column)) for column in columns])
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list, tuple)):
+        return dumps(value).decode('utf-8')
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+def _chunks(lines, chunk_size=CHUNK_SIZE):
+    '''Join lines into chunks of about chunk_size bytes so the server isn't called per row'''
+    parts = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield b''.join(parts)
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits 31 writes a gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(rows, export_format, columns, compress=False):
+    '''Encode an iterable of row dicts as ndjson or csv bytes without holding more than a chunk in memory
+
+    columns is the csv header (ignored for ndjson), compress gzips the output as it streams.
+    '''
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected {' or '.join(EXPORT_FORMATS)}")
+
+    lines = ndjson_lines(rows) if export_format == 'ndjson' else csv_lines(rows, columns)
+    chunks = _chunks(lines)
+    return _gzip(chunks) if compress else chunks
@@ -1,13 +1,54 @@
 # firebase_service.py
 import firebase_admin
 from firebase_admin import credentials, firestore, auth, storage
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, BulkRetry
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import FailedPrecondition, NotFound
 import hashlib
-import uuid
 import datetime
 import tempfile
 import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from sharded_counter import ShardedCounter
+from cache import TTLCache
+from audit_log import AuditLogWriter
+from background import PeriodicTask
+from user_index import UserSearchIndex, search_summary
+from text_index import TextIndex
+from minhash import DuplicateIndex
+from moderation import PhraseMatcher, load_phrases, review_item
+from storage_backend import StorageBackend
+from pagination import encode_cursor, decode_cursor
+from projection import POST_FIELDS, USER_FIELDS, project
 
-class FirebaseService:
+FAILED_PRECONDITION = 9 # grpc status code of a write whose precondition did not hold
+BATCH_WRITE_LIMIT = 500 # firestore caps a write batch at 500 writes
+BULK_CHUNK_SIZE = 200 # posts per batch in bulk moderation, each takes a delete and a log write
+# comments per batch in bulk moderation, each takes a delete, a log write and (when on its own post) a
+# post count update, which leaves room under the batch limit for the counter day buckets
+BULK_COMMENT_CHUNK_SIZE = (BATCH_WRITE_LIMIT - 50) // 3
+
+# where each StorageBackend.LOG_FILTERS filter lives in an admin_logs document
+LOG_FILTER_FIELDS = {
+    'admin_id': 'admin_id',
+    'action_type': 'action_type',
+    'user_id': 'details.user_id',
+    'post_id': 'details.post_id'
+}
+
+def _preview(text):
+    return text[:50] + '...' if len(text) > 50 else text
+
+def _comment_time(value):
+    '''Embedded comments kept createdAt as a naive iso string, comment documents use a utc timestamp'''
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if isinstance(value, datetime.datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+class FirebaseService(StorageBackend):
     def __init__(self):
         # Use the application default credentials or specify path to service account
         # You'll need to generate a service account key from Firebase console
@@ -22,6 +63,105 @@ class FirebaseService:
         self.db = firestore.client()
         self.bucket = storage.bucket()
         
+        # running totals maintained by the write paths, read by the analytics summary
+        num_shards = int(os.environ.get('COUNTER_SHARDS', 10))
+        self.counters = {
+            name: ShardedCounter(self.db, name, num_shards)
+            for name in ('users', 'posts', 'comments')
+        }
+        
+        # read-through caches for hot point lookups, invalidated by the write paths below
+        cache_entries = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+        cache_ttl = int(os.environ.get('CACHE_TTL_SECONDS', 30))
+        self.admin_cache = TTLCache('admins', cache_entries, cache_ttl)
+        self.user_cache = TTLCache('users', cache_entries, cache_ttl)
+        self.post_cache = TTLCache('posts', cache_entries, cache_ttl)
+        
+        # shared pool for fanning independent firestore RPCs out in parallel
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('FIRESTORE_IO_WORKERS', 8)),
+            thread_name_prefix='firestore-io'
+        )
+        
+        # comments are documents in the top-level comments collection, until migrate_embedded_comments
+        # has run on every post the comments still embedded in post documents are read (and deleted) too
+        self.comments_dual_read = os.environ.get('COMMENTS_DUAL_READ', 'true').lower() == 'true'
+        
+        # admin log entries are buffered and written in batches off the request path
+        self.audit_write_timeout = float(os.environ.get('AUDIT_WRITE_TIMEOUT', 10))
+        self.audit_log = None
+        if os.environ.get('ASYNC_AUDIT_LOG', 'true').lower() == 'true':
+            self.audit_log = AuditLogWriter(
+                self._write_log_entries,
+                flush_interval=float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0)),
+                spool_path=os.environ.get('AUDIT_SPOOL_PATH', 'admin_audit_spool.jsonl')
+            )
+        
+        # admin user search is served from an in-process prefix index that a snapshot listener
+        # on the users collection keeps current, the watchdog restarts the listener if it dies
+        self.user_index = None
+        if os.environ.get('USER_SEARCH_INDEX', 'true').lower() == 'true':
+            self.user_index = UserSearchIndex()
+            self._user_index_watch = None
+            self._user_index_watchdog = PeriodicTask('user-index-watchdog', 60, self._watch_users, run_immediately=True)
+            self._user_index_watchdog.start()
+        
+        # banned phrases compiled into one automaton, new posts and comments are scanned as they are written
+        self.moderation_phrases_path = os.environ.get('MODERATION_PHRASES_PATH', 'banned_phrases.txt')
+        self.moderation = PhraseMatcher(load_phrases(self.moderation_phrases_path))
+        
+        # full-text search over post content, the write paths below keep this process's index
+        # current and the periodic rebuild picks up posts written through other processes.
+        # Opt in: every worker process holds its own index and builds it by reading the whole posts
+        # collection at startup and on every rebuild, which only pays off for a few workers
+        self.post_index = TextIndex() if os.environ.get('POST_SEARCH_INDEX', 'false').lower() == 'true' else None
+        
+        # minhash/lsh index over post content for spotting spam waves, maintained the same way and opt in for the same reason
+        self.duplicate_index = DuplicateIndex() if os.environ.get('DUPLICATE_INDEX', 'false').lower() == 'true' else None
+        
+        # one builder reads the posts once for both indexes
+        if self.post_index is not None or self.duplicate_index is not None:
+            self._post_index_builder = PeriodicTask(
+                'post-index-builder',
+                int(os.environ.get('POST_INDEX_REBUILD_INTERVAL', 3600)),
+                self._rebuild_post_indexes,
+                run_immediately=True
+            )
+            self._post_index_builder.start()
+        
+    def _paginate(self, query, limit, cursor=None, start_after_ref=None, order='desc', order_field='createdAt'):
+        '''Fetch one page of a query in order_field order (newest first by default), returns (docs, next_cursor)
+
+        The page is fetched with limit + 1 so knowing whether there is a next page needs no extra
+        query, and an opaque cursor goes straight into start_after without reading the previous
+        document. start_after_ref is the older document id style cursor, which still costs a read.
+        '''
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'")
+        
+        direction = firestore.Query.DESCENDING if order == 'desc' else firestore.Query.ASCENDING
+        query = (
+            query
+            .order_by(order_field, direction=direction)
+            .order_by('__name__', direction=direction)
+            .limit(limit + 1)
+        )
+        
+        if cursor:
+            created_at, doc_id = decode_cursor(cursor)
+            query = query.start_after({order_field: created_at, '__name__': doc_id})
+        elif start_after_ref:
+            last_doc = start_after_ref.get()
+            if last_doc.exists:
+                query = query.start_after(last_doc)
+        
+        docs = list(query.stream())
+        if len(docs) <= limit:
+            return docs, None
+        
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1].get(order_field), docs[-1].id)
+    
     # Authentication Methods
     def register_user(self, email, password, username):
         try:
@@ -32,13 +172,16 @@ class FirebaseService:
                 display_name=username
             )
             
-            # Create user document in Firestore
-            self.db.collection('users').document(user.uid).set({
+            # Create user document in Firestore and count it in the same batch
+            batch = self.db.batch()
+            batch.set(self.db.collection('users').document(user.uid), {
                 'email': email,
                 'username': username,
                 'friends': [],
                 'createdAt': firestore.SERVER_TIMESTAMP
             })
+            self.counters['users'].increment(batch, 1)
+            batch.commit()
             
             return {
                 'uid': user.uid,
@@ -91,41 +234,45 @@ class FirebaseService:
             raise e
     
     # User Methods
+    def _load_user_profile(self, user_id):
+        user_doc = self.db.collection('users').document(user_id).get()
+        
+        if not user_doc.exists:
+            return None
+            
+        user_data = user_doc.to_dict()
+        user_data['id'] = user_doc.id
+        user_data['updateTime'] = user_doc.update_time.rfc3339() # precondition for later writes
+        
+        return user_data
+    
     def get_user_profile(self, user_id):
         try:
-            user_doc = self.db.collection('users').document(user_id).get()
+            user_data = self.user_cache.get_or_load(user_id, self._load_user_profile)
             
-            if not user_doc.exists:
+            if not user_data:
                 raise Exception("User not found")
-                
-            user_data = user_doc.to_dict()
-            user_data['id'] = user_doc.id
             
             return user_data
         except Exception as e:
             print(f"Error in get_user_profile: {e}")
             raise e
     
-    def get_user_posts(self, user_id): # ! Added for admin-api
-        '''Get all posts created by a specific user'''
+    def get_user_posts(self, user_id, limit=50, cursor=None, order='desc', fields=None): # ! Added for admin-api
+        '''Get a page of the posts created by a specific user'''
         try:
-            # query posts by the user
-            posts_query = self.db.collection('posts').where('userId', '==', user_id).stream()
-            posts = []
-            
-            for doc in posts_query:
-                post_data = doc.to_dict()
-                post_data['id'] = doc.id
-                
-                if 'createdAt' in post_data and post_data['createdAt']:
-                    post_data['createdAt'] = post_data['createdAt'].isoformat()
-                
-                post_data['commentCount'] = len(post_data.get('comments', []))
-                post_data['likeCount'] = len(post_data.get('likes', []))
-                
-                posts.append(post_data)
+            # query posts by the user, served by the (userId, createdAt) composite indexes
+            docs, next_cursor = self._paginate(
+                self._post_summaries(self.db.collection('posts').where('userId', '==', user_id), fields),
+                limit, cursor=cursor, order=order
+            )
+            posts = [self._post_summary(doc, fields) for doc in docs]
             
-            return posts
+            return {
+                'posts': posts,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
         except Exception as e:
             print(f'Error in get_user_posts: {e}')
             raise e
@@ -161,6 +308,55 @@ class FirebaseService:
             print(f"Error in search_users: {e}")
             raise e
     
+    def _watch_users(self):
+        '''Start the users snapshot listener feeding the search index, unless it is already running'''
+        if self._user_index_watch is not None and self._user_index_watch.is_active:
+            return
+        
+        initial = True
+        
+        def on_snapshot(docs, changes, read_time):
+            nonlocal initial
+            try:
+                # the first snapshot holds every user, load it in one go rather than change by change
+                if initial:
+                    self.user_index.replace((doc.id, doc.to_dict()) for doc in docs)
+                    initial = False
+                    return
+                
+                for change in changes:
+                    if change.type.name == 'REMOVED':
+                        self.user_index.remove(change.document.id)
+                    else:
+                        self.user_index.upsert(change.document.id, change.document.to_dict())
+            except Exception as e:
+                print(f'Error in user index snapshot: {e}')
+        
+        self._user_index_watch = self.db.collection('users').on_snapshot(on_snapshot)
+    
+    def admin_search_users(self, search_term, limit=20):
+        '''Find users whose username or email starts with search_term, ignoring case'''
+        try:
+            if self.user_index and self.user_index.ready.is_set():
+                return self.user_index.search(search_term, limit)
+            
+            # index disabled or still loading, fall back to (case-sensitive) range queries
+            users = {}
+            for field in ('username', 'email'):
+                query = (
+                    self.db.collection('users')
+                    .where(field, '>=', search_term)
+                    .where(field, '<=', search_term + '\uf8ff')
+                    .select(['username', 'email', 'suspended'])
+                    .limit(limit)
+                )
+                for doc in query.stream():
+                    users.setdefault(doc.id, search_summary(doc.id, doc.to_dict()))
+            return list(users.values())[:limit]
+        except Exception as e:
+            print(f'Error in admin_search_users: {e}')
+            raise e
+    
     # Friend Methods
     def add_friend(self, user_id, friend_id):
         try:
@@ -173,6 +369,7 @@ class FirebaseService:
             self.db.collection('users').document(friend_id).update({
                 'friends': firestore.ArrayUnion([user_id])
             })
+            self.user_cache.invalidate(user_id, friend_id)
             
             return True
         except Exception as e:
@@ -190,6 +387,7 @@ class FirebaseService:
             self.db.collection('users').document(friend_id).update({
                 'friends': firestore.ArrayRemove([user_id])
             })
+            self.user_cache.invalidate(user_id, friend_id)
             
             return True
         except Exception as e:
@@ -202,14 +400,20 @@ class FirebaseService:
             user = self.get_user_profile(user_id)
             post_ref = self.db.collection('posts').document()
             
-            post_ref.set({
+            batch = self.db.batch()
+            batch.set(post_ref, {
                 'userId': user_id,
                 'username': user['username'],
                 'content': content,
                 'likes': [],
-                'comments': [],
+                'likeCount': 0,
+                'commentCount': 0,
                 'createdAt': firestore.SERVER_TIMESTAMP
             })
+            self.counters['posts'].increment(batch, 1)
+            batch.commit()
+            self._index_post(post_ref.id, content)
+            self._moderate('post', post_ref.id, None, user_id, content)
             
             return post_ref.id
         except Exception as e:
@@ -242,12 +446,8 @@ class FirebaseService:
             
             for doc in query.stream():
                 post_data = doc.to_dict()
-                # Convert timestamps to strings for JSON serialization
-                if 'createdAt' in post_data and post_data['createdAt']:
-                    post_data['createdAt'] = post_data['createdAt'].isoformat()
-                    
                 post_data['id'] = doc.id
-                posts.append(post_data)
+                posts.append(self._with_counts(post_data))
                 
             return posts
         except Exception as e:
@@ -258,23 +458,25 @@ class FirebaseService:
     def toggle_like(self, post_id, user_id):
         try:
             post_ref = self.db.collection('posts').document(post_id)
-            post_doc = post_ref.get()
-            
-            if not post_doc.exists:
-                raise Exception("Post not found")
+            has_liked = False
+            
+            # likeCount moves with the likes array, the update-time precondition keeps
+            # two concurrent toggles from counting the same like twice
+            def write(batch, post_data, option):
+                nonlocal has_liked
+                likes = post_data.get('likes', [])
+                has_liked = user_id in likes
+                change = -1 if has_liked else 1
                 
-            post_data = post_doc.to_dict()
-            likes = post_data.get('likes', [])
-            has_liked = user_id in likes
-            
-            if has_liked:
-                post_ref.update({
-                    'likes': firestore.ArrayRemove([user_id])
-                })
-            else:
-                post_ref.update({
-                    'likes': firestore.ArrayUnion([user_id])
-                })
+                # posts from before likeCount existed get the exact value, the precondition makes it safe
+                like_count = firestore.Increment(change) if 'likeCount' in post_data else len(likes) + change
+                batch.update(post_ref, {
+                    'likes': firestore.ArrayRemove([user_id]) if has_liked else firestore.ArrayUnion([user_id]),
+                    'likeCount': like_count
+                }, option=option)
+            
+            if not self._conditional_write(self.post_cache, post_id, self._load_post, write):
+                raise Exception("Post not found")
                 
             return not has_liked
         except Exception as e:
@@ -285,43 +487,73 @@ class FirebaseService:
         try:
             user = self.get_user_profile(user_id)
             post_ref = self.db.collection('posts').document(post_id)
+            comment_ref = self.db.collection('comments').document()
+            created_at = datetime.datetime.now(datetime.timezone.utc)
             
-            comment = {
-                'id': str(uuid.uuid4()),
+            # the comment is its own document, the post only keeps the count
+            batch = self.db.batch()
+            batch.set(comment_ref, {
+                'post_id': post_id,
                 'userId': user_id,
                 'username': user['username'],
                 'content': content,
-                'createdAt': datetime.datetime.now().isoformat()
-            }
-            
-            post_ref.update({
-                'comments': firestore.ArrayUnion([comment])
+                'createdAt': created_at
             })
+            batch.update(post_ref, {'commentCount': firestore.Increment(1)}) # fails the batch if the post is gone
+            self.counters['comments'].increment(batch, 1, when=created_at)
+            try:
+                batch.commit()
+            except NotFound:
+                raise Exception('Post not found')
+            self.post_cache.invalidate(post_id)
+            self._moderate('comment', post_id, comment_ref.id, user_id, content)
             
-            return comment
+            return {
+                'id': comment_ref.id,
+                'userId': user_id,
+                'username': user['username'],
+                'content': content,
+                'createdAt': created_at
+            }
         except Exception as e:
             print(f"Error in add_comment: {e}")
             raise e
             
-    def get_like_details(self, post_id):
+    def _get_usernames(self, user_ids, chunk_size=100):
+        '''Resolve usernames for many users with chunked multi-gets that run in parallel'''
+        users_ref = self.db.collection('users')
+        
+        def fetch(chunk):
+            refs = [users_ref.document(user_id) for user_id in chunk]
+            return {
+                doc.id: (doc.to_dict() or {}).get('username', 'Unknown') # a profile without a username would raise in doc.get
+                for doc in self.db.get_all(refs, field_paths=['username'])
+                if doc.exists
+            }
+        
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+        usernames = {}
+        for result in self.io_executor.map(fetch, chunks):
+            usernames.update(result)
+        return usernames
+    
+    def get_like_details(self, post_id, limit=None, offset=0):
         try:
-            likes = []
-            post_doc = self.db.collection('posts').document(post_id).get()
+            post_doc = self.db.collection('posts').document(post_id).get(field_paths=['likes'])
             
             if not post_doc.exists:
                 raise Exception("Post not found")
                 
-            like_user_ids = post_doc.to_dict().get('likes', [])
-            
-            # Get user details for each like
-            for user_id in like_user_ids:
-                user_doc = self.db.collection('users').document(user_id).get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    likes.append({
-                        'userId': user_id,
-                        'username': user_data.get('username')
-                    })
+            like_user_ids = (post_doc.to_dict() or {}).get('likes', [])
+            like_user_ids = like_user_ids[offset:offset + limit] if limit is not None else like_user_ids[offset:]
+            
+            # Get usernames for the page of likes in a few batched reads, keeping the like order
+            usernames = self._get_usernames(like_user_ids)
+            likes = [
+                {'userId': user_id, 'username': usernames[user_id]}
+                for user_id in like_user_ids
+                if user_id in usernames
+            ]
                     
             return likes
         except Exception as e:
@@ -329,96 +561,148 @@ class FirebaseService:
             raise e
     
     # Additional methods from star.jsx
+    def _load_post(self, post_id):
+        post_doc = self.db.collection('posts').document(post_id).get()
+        
+        if not post_doc.exists:
+            return None
+            
+        post_data = post_doc.to_dict()
+        post_data['id'] = post_doc.id
+        post_data['updateTime'] = post_doc.update_time.rfc3339() # precondition for later writes
+        return post_data
+    
     def get_post(self, post_id):
         try:
-            post_doc = self.db.collection('posts').document(post_id).get()
+            post_data = self.post_cache.get_or_load(post_id, self._load_post)
             
-            if not post_doc.exists:
+            if not post_data:
                 raise Exception("Post not found")
                 
-            post_data = post_doc.to_dict()
-            post_data['id'] = post_doc.id
-            
-            # Convert timestamp to string
-            if 'createdAt' in post_data and post_data['createdAt']:
-                post_data['createdAt'] = post_data['createdAt'].isoformat()
-                
-            return post_data
+            return self._with_counts(post_data)
         except Exception as e:
             print(f"Error in get_post: {e}")
             raise e
     
-    def get_feed(self, user_id, last_post=None):
+    def get_feed(self, user_id, last_post=None, cursor=None):
         try:
-            # Create base query
-            query = (
-                self.db.collection('posts')
-                .order_by('createdAt', direction=firestore.Query.DESCENDING)
-                .limit(10)
+            posts_ref = self.db.collection('posts')
+            docs, next_cursor = self._paginate(
+                posts_ref, 10, cursor=cursor,
+                start_after_ref=posts_ref.document(last_post) if last_post else None
             )
-            
-            # If last_post provided, use it as start_after
-            if last_post:
-                last_post_doc = self.db.collection('posts').document(last_post).get()
-                if last_post_doc.exists:
-                    query = query.start_after(last_post_doc)
                     
-            # Execute query
             posts = []
-            for doc in query.stream():
+            for doc in docs:
                 post_data = doc.to_dict()
                 post_data['id'] = doc.id
-                
-                # Convert timestamp to string
-                if 'createdAt' in post_data and post_data['createdAt']:
-                    post_data['createdAt'] = post_data['createdAt'].isoformat()
-                    
-                posts.append(post_data)
+                posts.append(self._with_counts(post_data))
                 
             return {
                 'posts': posts,
-                'last_post': posts[-1]['id'] if posts else None
+                'last_post': posts[-1]['id'] if posts else None,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }
         except Exception as e:
             print(f"Error in get_feed: {e}")
             raise e
     
-    def get_comments(self, post_id, last_comment=None):
+    def _comment_dict(self, doc):
+        comment_data = doc.to_dict()
+        comment_data['id'] = doc.id
+        return comment_data
+    
+    def _embedded_comments(self, post_id):
+        '''Get the comments still embedded in a post that has not been migrated'''
+        post_doc = self.db.collection('posts').document(post_id).get(field_paths=['comments'])
+        return (post_doc.to_dict() or {}).get('comments') or [] if post_doc.exists else []
+    
+    def _with_counts(self, post_data):
+        '''Set commentCount and likeCount, replacing the embedded comments of a post that has not been migrated'''
+        embedded = post_data.pop('comments', None) or []
+        post_data.pop('commenterIds', None)
+        post_data['commentCount'] = post_data.get('commentCount', 0) + len(embedded)
+        if 'likeCount' not in post_data:
+            post_data['likeCount'] = len(post_data.get('likes', []))
+        return post_data
+    
+    def _post_summaries(self, query, fields=None):
+        '''Project a post query onto the summary fields (or the requested subset of them)
+
+        Like ids and comment bodies stay on the server, only the counts maintained on the post are
+        read (migrate_embedded_comments backfills them on posts from before they were maintained).
+        createdAt is always read because the page cursor is built from it.
+        '''
+        return query.select(self._post_summary_fields(fields))
+    
+    def _post_summary_fields(self, fields=None):
+        return sorted(set(POST_FIELDS if fields is None else fields) | {'createdAt'})
+    
+    def _post_summary(self, doc, fields=None):
+        post_data = doc.to_dict()
+        post_data['id'] = doc.id
+        self._with_counts(post_data)
+        post_data.pop('likes', None)
+        return project(post_data, fields)
+    
+    def get_comments(self, post_id, last_comment=None, cursor=None):
         try:
-            # Create base query
-            query = (
-                self.db.collection('comments')
-                .where('post_id', '==', post_id)
-                .order_by('createdAt', direction=firestore.Query.DESCENDING)
-                .limit(20)
-            )
-            
-            # If last_comment provided, use it as start_after
-            if last_comment:
-                last_comment_doc = self.db.collection('comments').document(last_comment).get()
-                if last_comment_doc.exists:
-                    query = query.start_after(last_comment_doc)
-                    
-            # Execute query
-            comments = []
-            for doc in query.stream():
-                comment_data = doc.to_dict()
-                comment_data['id'] = doc.id
-                
-                # Convert timestamp to string
-                if 'createdAt' in comment_data and comment_data['createdAt']:
-                    comment_data['createdAt'] = comment_data['createdAt'].isoformat()
-                    
-                comments.append(comment_data)
+            comments_ref = self.db.collection('comments')
+            query = comments_ref.where('post_id', '==', post_id)
+            embedded = self._embedded_comments(post_id) if self.comments_dual_read else []
+            
+            if not embedded:
+                docs, next_cursor = self._paginate(
+                    query, 20, cursor=cursor,
+                    start_after_ref=comments_ref.document(last_comment) if last_comment else None
+                )
+                comments = [self._comment_dict(doc) for doc in docs]
+            else:
+                comments, next_cursor = self._merge_embedded_comments(query, embedded, 20, cursor, last_comment)
                 
             return {
                 'comments': comments,
-                'last_comment': comments[-1]['id'] if comments else None
+                'last_comment': comments[-1]['id'] if comments else None,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }
         except Exception as e:
             print(f"Error in get_comments: {e}")
             raise e
     
+    def _merge_embedded_comments(self, query, embedded, limit, cursor=None, last_comment=None):
+        '''Page through comment documents and a post's embedded comments as one (createdAt, id) ordered list'''
+        def sort_key(comment):
+            return (_comment_time(comment.get('createdAt')) or datetime.datetime.min.replace(tzinfo=datetime.timezone.utc), comment['id'])
+        
+        embedded = [dict(comment, createdAt=_comment_time(comment.get('createdAt'))) for comment in embedded]
+        
+        # the page starts after the cursor, or after the legacy last comment id wherever it is stored
+        position = decode_cursor(cursor) if cursor else None
+        if last_comment and not cursor:
+            previous = next((comment for comment in embedded if comment['id'] == last_comment), None)
+            if previous is None:
+                previous_doc = self.db.collection('comments').document(last_comment).get(field_paths=['createdAt'])
+                previous = {'id': last_comment, 'createdAt': previous_doc.get('createdAt')} if previous_doc.exists else None
+            position = sort_key(previous) if previous else None
+        position = (_comment_time(position[0]), position[1]) if position else None
+        
+        docs, docs_cursor = self._paginate(query, limit, cursor=encode_cursor(*position) if position else None)
+        comments = [dict(doc.to_dict(), id=doc.id) for doc in docs]
+        seen = {comment['id'] for comment in comments}
+        comments.extend(
+            comment for comment in embedded
+            if comment['id'] not in seen and (position is None or sort_key(comment) < position)
+        )
+        comments.sort(key=sort_key, reverse=True)
+        
+        page = comments[:limit]
+        next_cursor = None
+        if docs_cursor or len(comments) > limit:
+            next_cursor = encode_cursor(*sort_key(page[-1]))
+        return page, next_cursor
+    
     def check_like_status(self, post_id, user_id):
         try:
             like_ref = self.db.collection('likes').document(f"{post_id}_{user_id}").get()
@@ -446,6 +730,7 @@ class FirebaseService:
                 target_ref.update({
                     'followers_count': firestore.Increment(-1)
                 })
+                self.user_cache.invalidate(follower_id, target_user_id)
                 return False
             else:
                 # Follow
@@ -455,6 +740,7 @@ class FirebaseService:
                 target_ref.update({
                     'followers_count': firestore.Increment(1)
                 })
+                self.user_cache.invalidate(follower_id, target_user_id)
                 return True
         except Exception as e:
             print(f"Error in toggle_follow: {e}")
@@ -464,6 +750,7 @@ class FirebaseService:
         try:
             updates['updated_at'] = firestore.SERVER_TIMESTAMP
             self.db.collection('users').document(user_id).update(updates)
+            self.user_cache.invalidate(user_id)
             return True
         except Exception as e:
             print(f"Error in update_user_profile: {e}")
@@ -550,6 +837,9 @@ class FirebaseService:
             if admin_data.get('password') != hashed_password: # check password
                 return None
             
+            if admin_data.get('revoked'): # disabled admins can't log in
+                return None
+            
             admin_return = admin_data.copy()
             admin_return.pop('password')
             admin_return['id'] = admin_doc.id
@@ -559,24 +849,64 @@ class FirebaseService:
             print(f'Error in login_admin: {e}')
             raise(e)
 
+    def _load_admin(self, admin_id):
+        admin_doc = self.db.collection('admins').document(admin_id).get()
+        
+        if not admin_doc.exists:
+            return None
+        
+        admin_data = admin_doc.to_dict()
+        
+        # remove passw from return obj
+        admin_return = admin_data.copy()
+        admin_return.pop('password', None)
+        admin_return['id'] = admin_doc.id
+        admin_return['updateTime'] = admin_doc.update_time.rfc3339() # version for etags
+        
+        return admin_return
+    
     def get_admin(self, admin_id):
         '''Get admin by id'''
         try:
-            admin_doc = self.db.collection('admins').document(admin_id).get()
+            return self.admin_cache.get_or_load(admin_id, self._load_admin)
+        except Exception as e:
+            print(f'Error in get_admin: {e}')
+            raise(e)
+    
+    def get_revoked_admin_ids(self):
+        '''Get the ids of all admins whose access has been revoked'''
+        try:
+            query = self.db.collection('admins').where('revoked', '==', True).select([])
+            return [doc.id for doc in query.stream()]
+        except Exception as e:
+            print(f'Error in get_revoked_admin_ids: {e}')
+            raise(e)
+    
+    def set_admin_revoked(self, admin_id, revoked=True, acting_admin_id=None):
+        '''Revoke or restore an admin's access'''
+        try:
+            admin_ref = self.db.collection('admins').document(admin_id)
+            admin_doc = admin_ref.get()
             
             if not admin_doc.exists:
-                return None
+                raise Exception('Admin not found')
             
-            admin_data = admin_doc.to_dict()
+            admin_ref.update({
+                'revoked': revoked,
+                'revokedAt': firestore.SERVER_TIMESTAMP if revoked else None
+            })
+            self.admin_cache.invalidate(admin_id)
             
-            # remove passw from return obj
-            admin_return = admin_data.copy()
-            admin_return.pop('password', None)
-            admin_return['id'] = admin_doc.id
+            if acting_admin_id:
+                action_type = 'ADMIN_REVOKED' if revoked else 'ADMIN_RESTORED'
+                self.log_admin_action(acting_admin_id, action_type, {
+                    'target_admin_id': admin_id,
+                    'admin_email': admin_doc.to_dict().get('email', '')
+                })
             
-            return admin_return
+            return True
         except Exception as e:
-            print(f'Error in get_admin: {e}')
+            print(f'Error in set_admin_revoked: {e}')
             raise(e)
 
     # Task management methods, commented out as tasks are not implemented in db yet
@@ -649,41 +979,43 @@ class FirebaseService:
     
     # User management methods
     
-    def get_all_users(self, limit=50, start_after=None):
-        '''Get all users with basic info'''
+    def _user_summaries(self, query, fields=None):
+        selected = set(USER_FIELDS if fields is None else fields) | {'createdAt'} # createdAt makes the cursor
+        return query.select(sorted(selected))
+    
+    def _user_summary(self, doc, fields=None):
+        user_data = doc.to_dict()
+        
+        # filtered user object wo we don't see password and other details
+        filtered_user = {
+            'id': doc.id,
+            'username': user_data.get('username', ''),
+            'email': user_data.get('email', ''),
+            'friends': len(user_data.get('friends', [])),
+            'suspended': user_data.get('suspended', False)
+        }
+        
+        if user_data.get('createdAt'):
+            filtered_user['createdAt'] = user_data['createdAt']
+        
+        return project(filtered_user, fields)
+    
+    def get_all_users(self, limit=50, start_after=None, cursor=None, fields=None):
+        '''Get all users with basic info, or only the requested fields of it'''
         try:
-            query = (
-                self.db.collection('users')
-                .order_by('createdAt', direction=firestore.Query.DESCENDING)
-                .limit(limit)
-            ) # base query
-            
-            if start_after: # start after given user assuming it is given and exists
-                last_doc = self.db.collection('users').document(start_after).get()
-                if last_doc.exists:
-                    query = query.start_after(last_doc)
+            users_ref = self.db.collection('users')
+            docs, next_cursor = self._paginate(
+                self._user_summaries(users_ref, fields), limit, cursor=cursor,
+                start_after_ref=users_ref.document(start_after) if start_after else None # older clients send the last user id
+            )
             
-            users = []
-            for doc in query.stream():
-                user_data = doc.to_dict()
-                
-                # filtered user object wo we don't see password and other details
-                filtered_user = {
-                    'id': doc.id,
-                    'username': user_data.get('username', ''),
-                    'email': user_data.get('email', ''),
-                    'friends': len(user_data.get('friends', [])),
-                    'suspended': user_data.get('suspended', False)
-                }
-                
-                if 'createdAt' in user_data and user_data['createdAt']:
-                    filtered_user['createdAt'] = user_data['createdAt'].isoformat()
-                
-                users.append(filtered_user)
+            users = [self._user_summary(doc, fields) for doc in docs]
             
             return {
                 'users': users,
-                'last_user': users[-1]['id'] if users else None
+                'last_user': users[-1]['id'] if users else None,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }
         except Exception as e:
             print(f'Error in get_all_users: {e}')
@@ -735,30 +1067,191 @@ class FirebaseService:
     #         print(f'Error in reset_user_password: {e}')
     #         raise(e)
     
-    def delete_user(self, user_id, admin_id=None):
-        '''Delete a user and their posts'''
+    CASCADE_PAGE_SIZE = 300
+    CASCADE_MAX_ATTEMPTS = 6
+    
+    def _stream_pages(self, query, page_size):
+        '''Yield the results of a query one page at a time in document id order'''
+        query = query.order_by('__name__').limit(page_size)
+        last_doc = None
+        while True:
+            docs = list((query.start_after(last_doc) if last_doc else query).stream())
+            if docs:
+                yield docs
+            if len(docs) < page_size:
+                return
+            last_doc = docs[-1]
+    
+    def _cascade_writer(self, written):
+        '''BulkWriter for cascades, records the paths of successful writes in `written`'''
+        # bulk writer commits small batches in parallel and backs off exponentially on failures
+        writer = self.db.bulk_writer(BulkWriterOptions(retry=BulkRetry.exponential))
+        writer.on_write_result(lambda reference, result, bulk_writer: written.add(reference.path))
+        # a failed precondition means the document changed, retrying the same write cannot succeed
+        writer.on_write_error(lambda error, bulk_writer: error.attempts < self.CASCADE_MAX_ATTEMPTS and error.code != FAILED_PRECONDITION)
+        return writer
+    
+    def delete_user(self, user_id, admin_id=None, progress=None):
+        '''Delete a user, their posts, and their comments and likes on other posts
+
+        Everything is streamed a page at a time and written through a BulkWriter, so there is no
+        limit on how much a user has written. progress(counts) is called after every page. If some
+        writes still fail after retrying the user document is kept so the deletion can be rerun.
+        '''
         try:
             user_ref = self.db.collection('users').document(user_id)
-            user_doc = user_ref.get()
+            user_data = self.user_cache.get_or_load(user_id, self._load_user_profile)
             
-            if not user_doc.exists:
+            if not user_data:
                 raise Exception('User not found')
             
-            user_data = user_doc.to_dict()
-            
-            # get user's posts
-            posts_query = self.db.collection('posts').where('userId', '==', user_id).stream()
-            post_ids = [doc.id for doc in posts_query]
-            
-            batch = self.db.batch() # use batch to delete user and posts all at once
-            
-            # delete user and associated posts
-            batch.delete(user_ref)
-            for post_id in post_ids:
-                post_ref = self.db.collection('posts').document(post_id)
-                batch.delete(post_ref)
-            
-            batch.commit() # commit batch
+            posts_ref = self.db.collection('posts')
+            counts = {'posts_deleted': 0, 'comments_deleted': 0, 'likes_removed': 0, 'failed': 0}
+            written = set()
+            writer = self._cascade_writer(written)
+            
+            def finish_page(decrements=None):
+                # decrement the counters for the writes of the page that went through
+                decrements = {name: days for name, days in (decrements or {}).items() if days}
+                if decrements:
+                    batch = self.db.batch()
+                    for name, days in decrements.items():
+                        self.counters[name].increment_by_day(batch, self._negate(days))
+                    batch.commit()
+                written.clear()
+                if progress:
+                    progress(dict(counts))
+            
+            def delete_comment_docs(docs, post_counts=False):
+                # delete comment documents, optionally decrementing the commentCount of their posts
+                for doc in docs:
+                    writer.delete(doc.reference)
+                writer.flush()
+                
+                comment_days = Counter()
+                removed_per_post = Counter()
+                for doc in docs:
+                    if doc.reference.path not in written:
+                        counts['failed'] += 1
+                        continue
+                    comment_days.update(self._counter_days([doc.get('createdAt')]))
+                    removed_per_post[doc.get('post_id')] += 1
+                    counts['comments_deleted'] += 1
+                
+                if post_counts:
+                    for post_id, removed in removed_per_post.items():
+                        writer.update(posts_ref.document(post_id), {'commentCount': firestore.Increment(-removed)})
+                    writer.flush()
+                    self.post_cache.invalidate(*removed_per_post)
+                return comment_days
+            
+            try:
+                # the user's own posts, with their embedded comments and the comment documents on them
+                own_posts = posts_ref.where('userId', '==', user_id).select(['createdAt', 'comments'])
+                for page in self._stream_pages(own_posts, self.CASCADE_PAGE_SIZE):
+                    for doc in page:
+                        writer.delete(doc.reference)
+                    writer.flush()
+                    
+                    post_days = Counter()
+                    comment_days = Counter()
+                    deleted_ids = []
+                    for doc in page:
+                        if doc.reference.path not in written:
+                            counts['failed'] += 1
+                            continue
+                        post_data = doc.to_dict()
+                        post_days.update(self._counter_days([post_data.get('createdAt')]))
+                        comment_days.update(self._counter_days(
+                            comment.get('createdAt') for comment in post_data.get('comments', [])
+                        ))
+                        deleted_ids.append(doc.id)
+                        counts['posts_deleted'] += 1
+                    self.post_cache.invalidate(*[doc.id for doc in page])
+                    self._unindex_posts(*deleted_ids)
+                    
+                    for comment_page in self._comment_pages('post_id', deleted_ids):
+                        comment_days.update(delete_comment_docs(comment_page))
+                    
+                    finish_page({'posts': post_days, 'comments': comment_days})
+                
+                # the user's comments on other people's posts
+                for page in self._comment_pages('userId', [user_id]):
+                    finish_page({'comments': delete_comment_docs(page, post_counts=True)})
+                
+                # comments still embedded in posts that have not been migrated
+                commented = []
+                if self.comments_dual_read:
+                    commented = self._stream_pages(
+                        posts_ref.where('commenterIds', 'array_contains', user_id).select(['userId', 'comments']),
+                        self.CASCADE_PAGE_SIZE
+                    )
+                for page in commented:
+                    removed = {}
+                    for doc in page:
+                        post_data = doc.to_dict()
+                        if post_data.get('userId') == user_id:
+                            continue # already deleted above
+                        removed[doc.reference.path] = [
+                            comment for comment in post_data.get('comments', [])
+                            if comment.get('userId') == user_id
+                        ]
+                        writer.update(doc.reference, {
+                            'comments': firestore.ArrayRemove(removed[doc.reference.path]),
+                            'commenterIds': firestore.ArrayRemove([user_id])
+                        })
+                    writer.flush()
+                    
+                    comment_days = Counter()
+                    for path, comments in removed.items():
+                        if path not in written:
+                            counts['failed'] += 1
+                            continue
+                        comment_days.update(self._counter_days(comment.get('createdAt') for comment in comments))
+                        counts['comments_deleted'] += len(comments)
+                    self.post_cache.invalidate(*[doc.id for doc in page])
+                    
+                    finish_page({'comments': comment_days})
+                
+                # the user's likes on other people's posts
+                liked = posts_ref.where('likes', 'array_contains', user_id).select(['userId', 'likeCount'])
+                for page in self._stream_pages(liked, self.CASCADE_PAGE_SIZE):
+                    others = [doc for doc in page if doc.to_dict().get('userId') != user_id]
+                    for doc in others:
+                        updates = {'likes': firestore.ArrayRemove([user_id])}
+                        if doc.to_dict().get('likeCount') is not None:
+                            # only decrement if the like is still there, a changed post fails and is redone on rerun
+                            updates['likeCount'] = firestore.Increment(-1)
+                            writer.update(doc.reference, updates, option=self.db.write_option(last_update_time=doc.update_time.timestamp_pb()))
+                        else:
+                            writer.update(doc.reference, updates)
+                    writer.flush()
+                    
+                    for doc in others:
+                        if doc.reference.path in written:
+                            counts['likes_removed'] += 1
+                        else:
+                            counts['failed'] += 1
+                    self.post_cache.invalidate(*[doc.id for doc in others])
+                    
+                    finish_page()
+            finally:
+                writer.close()
+            
+            if counts['failed']:
+                raise Exception(f"{counts['failed']} writes failed while deleting user {user_id}, run the deletion again to finish it")
+            
+            # delete the user document last so an interrupted cascade can be rerun, the exists
+            # precondition keeps two concurrent deletions from both decrementing the user count
+            batch = self.db.batch()
+            batch.delete(user_ref, option=self.db.write_option(exists=True))
+            self.counters['users'].increment_by_day(batch, self._negate(self._counter_days([user_data.get('createdAt')])))
+            try:
+                batch.commit()
+            except NotFound:
+                raise Exception('User not found')
+            finally:
+                self.user_cache.invalidate(user_id)
             
             # log action
             if admin_id:
@@ -766,30 +1259,60 @@ class FirebaseService:
                     'user_id': user_id,
                     'username': user_data.get('username', ''),
                     'email': user_data.get('email', ''),
-                    'posts_deleted': len(post_ids)
+                    'posts_deleted': counts['posts_deleted'],
+                    'comments_deleted': counts['comments_deleted'],
+                    'likes_removed': counts['likes_removed']
                 })
             
             return {
                 'success': True,
-                'posts_deleted': len(post_ids)
+                'posts_deleted': counts['posts_deleted'],
+                'comments_deleted': counts['comments_deleted'],
+                'likes_removed': counts['likes_removed']
             }
         except Exception as e:
             print(f'Error in delete_user: {e}')
             raise e
     
+    PRECONDITION_ATTEMPTS = 3
+    
+    def _conditional_write(self, cache, key, loader, write):
+        '''Apply write(batch, data, option) to a document based on its cached copy, or None if it does not exist
+
+        The batch is committed with the document's last update time as a precondition, so when the
+        document is cached this is a single round trip. If it changed or was deleted since it was
+        read, it is read again and the write retried instead of overwriting the concurrent change.
+        write can raise NotFound itself to have a cached copy that lacks what it looks for read again.
+        '''
+        data = cache.get_or_load(key, loader)
+        for _ in range(self.PRECONDITION_ATTEMPTS):
+            if not data:
+                return None
+            
+            batch = self.db.batch()
+            option = self.db.write_option(last_update_time=DatetimeWithNanoseconds.from_rfc3339(data['updateTime']).timestamp_pb())
+            try:
+                write(batch, data, option)
+                batch.commit()
+                cache.invalidate(key)
+                return data
+            except (FailedPrecondition, NotFound):
+                cache.invalidate(key)
+                data = loader(key)
+        
+        raise Exception('The document is being modified concurrently, try again')
+    
     def suspend_user(self, user_id, suspended=True, admin_id=None):
         '''Suspend or unsuspend a user account'''
         try:
             user_ref = self.db.collection('users').document(user_id)
-            user_doc = user_ref.get()
             
-            if not user_doc.exists:
-                raise Exception('User not found')
+            def write(batch, user_data, option):
+                batch.update(user_ref, {'suspended': suspended}, option=option)
             
-            user_data = user_doc.to_dict()
-            user_ref.update({
-                'suspended': suspended
-            })
+            user_data = self._conditional_write(self.user_cache, user_id, self._load_user_profile, write)
+            if not user_data:
+                raise Exception('User not found')
             
             if admin_id:
                 action_type = 'USER_SUSPENDED' if suspended else 'USER_UNSUSPENDED'
@@ -806,37 +1329,23 @@ class FirebaseService:
     
     # Post Management methods
     
-    def get_all_posts(self, limit=50, start_after=None):
+    def get_all_posts(self, limit=50, start_after=None, cursor=None, fields=None):
         '''Get all posts with a specific limit'''
         try:
-            query = (
-                self.db.collection('posts')
-                .order_by('createdAt', direction=firestore.Query.DESCENDING)
-                .limit(limit)
+            posts_ref = self.db.collection('posts')
+            docs, next_cursor = self._paginate(
+                self._post_summaries(posts_ref, fields), limit, cursor=cursor,
+                start_after_ref=posts_ref.document(start_after) if start_after else None # older clients send the last post id
             )
             
-            if start_after: # if a post is provided to start after
-                last_doc = self.db.collection('posts').document(start_after).get()
-                if last_doc.exists:
-                    query = query.start_after(last_doc)
-            
-            posts = []
-            for doc in query.stream():
-                post_data = doc.to_dict()
-                post_data['id'] = doc.id
-                
-                # convert timestamp to str
-                if 'createdAt' in post_data and post_data['createdAt']:
-                    post_data['createdAt'] = post_data['createdAt'].isoformat()
-                
-                # count comments and likes
-                post_data['commentCount'] = len(post_data.get('comments', []))
-                post_data['likeCount'] = len(post_data.get('likes', []))
-                posts.append(post_data)
+            # only the summary fields are read, the counts are maintained on the post
+            posts = [self._post_summary(doc, fields) for doc in docs]
             
             return {
                 'posts': posts,
-                'last_post': posts[-1]['id'] if posts else None
+                'last_post': posts[-1]['id'] if posts else None,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }
         except Exception as e:
             print(f'Error in suspend_user: {e}')
@@ -846,14 +1355,22 @@ class FirebaseService:
         '''Delete a specified post'''
         try:
             post_ref = self.db.collection('posts').document(post_id)
-            post_doc = post_ref.get()
             
-            if not post_doc.exists:
-                raise Exception('Post not found')
+            # delete post and decrement the counters in the same batch
+            def write(batch, post_data, option):
+                batch.delete(post_ref, option=option)
+                self.counters['posts'].increment_by_day(batch, self._negate(self._counter_days([post_data.get('createdAt')])))
+                self.counters['comments'].increment_by_day(batch, self._negate(self._counter_days(
+                    comment.get('createdAt') for comment in post_data.get('comments', [])
+                )))
             
-            post_data = post_doc.to_dict()
+            post_data = self._conditional_write(self.post_cache, post_id, self._load_post, write)
+            if not post_data:
+                raise Exception('Post not found')
+            self._unindex_posts(post_id)
             
-            post_ref.delete() # delete post
+            # the post is gone first so no new comment can be added while its comments are deleted
+            self._delete_post_comments([post_id])
             
             if admin_id:
                 self.log_admin_action(admin_id, 'POST_DELETED', {
@@ -871,19 +1388,22 @@ class FirebaseService:
         '''Update a post's content'''
         try:
             post_ref = self.db.collection('posts').document(post_id)
-            post_doc = post_ref.get()
             
-            if not post_doc.exists:
+            # update post
+            def write(batch, post_data, option):
+                batch.update(post_ref, {
+                    'content': new_content,
+                    'editedAt': firestore.SERVER_TIMESTAMP,
+                    'editedByAdmin': True
+                }, option=option)
+            
+            post_data = self._conditional_write(self.post_cache, post_id, self._load_post, write)
+            if not post_data:
                 raise Exception('Post not found')
+            self._index_post(post_id, new_content)
+            self._moderate('post', post_id, None, post_data.get('userId'), new_content)
             
-            old_content = post_doc.to_dict().get('content', '') # keep record for logging purpose
-            
-            # update post
-            post_ref.update({
-                'content': new_content,
-                'editedAt': firestore.SERVER_TIMESTAMP,
-                'editedByAdmin': True
-            })
+            old_content = post_data.get('content', '') # keep record for logging purpose
             
             # log action if we have the admin id
             if admin_id:
@@ -898,118 +1418,955 @@ class FirebaseService:
             print(f'Error in update_post_content: {e}')
             raise e
     
+    # Post search methods
+    
+    POST_INDEX_PAGE_SIZE = 1000
+    
+    def _index_post(self, post_id, content):
+        for index in (self.post_index, self.duplicate_index):
+            if index is not None: # an empty index is falsy (it has a len), it still has to take writes
+                index.add(post_id, content)
+    
+    def _unindex_posts(self, *post_ids):
+        for index in (self.post_index, self.duplicate_index):
+            if index is not None:
+                index.remove(*post_ids)
+    
+    def _post_contents(self, counts, progress=None):
+        '''Stream (post id, content) for every post, counting them in counts['posts_indexed']'''
+        query = self.db.collection('posts').select(['content'])
+        for page in self._stream_pages(query, self.POST_INDEX_PAGE_SIZE):
+            for doc in page:
+                yield doc.id, doc.to_dict().get('content', '')
+            counts['posts_indexed'] += len(page)
+            if progress:
+                progress(dict(counts))
+    
+    def _post_summaries_by_id(self, post_ids, fields=None):
+        '''Read the summaries of a page of posts in one multi-get, returns {post id: summary} for the ones that exist'''
+        if not post_ids:
+            return {}
+        posts_ref = self.db.collection('posts')
+        refs = [posts_ref.document(post_id) for post_id in post_ids]
+        return {
+            doc.id: self._post_summary(doc, fields)
+            for doc in self.db.get_all(refs, field_paths=self._post_summary_fields(fields))
+            if doc.exists
+        }
+    
+    def _rebuild_post_indexes(self):
+        '''Rebuild every enabled post index from one pass over the posts collection'''
+        indexes = [index for index in (self.post_index, self.duplicate_index) if index is not None]
+        try:
+            # writes made while the posts are read are recorded by each index and replayed onto its rebuild
+            for index in indexes:
+                index.begin_replace()
+            counts = {'posts_indexed': 0}
+            try:
+                posts = list(self._post_contents(counts)) # the indexes hold all of it anyway, read it once for both
+            except Exception:
+                for index in indexes:
+                    index.cancel_replace()
+                raise
+            
+            for index in indexes:
+                index.replace(posts)
+            return counts
+        except Exception as e:
+            print(f'Error in _rebuild_post_indexes: {e}')
+            raise e
+    
+    def rebuild_post_index(self, progress=None):
+        '''Bulk (re)build the post search index from every post's content, returns {'posts_indexed'}'''
+        try:
+            if self.post_index is None:
+                raise Exception('Post search is disabled, set POST_SEARCH_INDEX=true to enable it')
+            
+            counts = {'posts_indexed': 0}
+            self.post_index.replace(self._post_contents(counts, progress))
+            return counts
+        except Exception as e:
+            print(f'Error in rebuild_post_index: {e}')
+            raise e
+    
+    def search_posts(self, query, limit=20, offset=0, fields=None):
+        '''Rank posts whose content matches query, returns {'posts', 'total', 'has_more'}
+        
+        The index yields the ids of one page, only those posts are read (in one multi-get).
+        '''
+        try:
+            if self.post_index is None:
+                raise Exception('Post search is disabled, set POST_SEARCH_INDEX=true to enable it')
+            if not self.post_index.ready.is_set():
+                raise Exception('Post search index is still building, try again shortly')
+            
+            total, ranked = self.post_index.search(query, limit=limit, offset=offset)
+            summaries = self._post_summaries_by_id([post_id for post_id, _ in ranked], fields)
+            
+            posts = []
+            for post_id, score in ranked:
+                if post_id in summaries: # deleted through another process since the last rebuild
+                    posts.append({**summaries[post_id], 'score': score})
+            
+            return {
+                'posts': posts,
+                'total': total,
+                'has_more': offset + len(ranked) < total
+            }
+        except Exception as e:
+            print(f'Error in search_posts: {e}')
+            raise e
+    
+    # Duplicate detection methods
+    
+    def _ready_duplicate_index(self):
+        if self.duplicate_index is None:
+            raise Exception('Duplicate detection is disabled, set DUPLICATE_INDEX=true to enable it')
+        if not self.duplicate_index.ready.is_set():
+            raise Exception('Duplicate index is still building, try again shortly')
+        return self.duplicate_index
+    
+    def rebuild_duplicate_index(self, progress=None):
+        '''Bulk (re)build the near-duplicate index from every post's content, returns {'posts_indexed'}'''
+        try:
+            if self.duplicate_index is None:
+                raise Exception('Duplicate detection is disabled, set DUPLICATE_INDEX=true to enable it')
+            
+            counts = {'posts_indexed': 0}
+            self.duplicate_index.replace(self._post_contents(counts, progress))
+            return counts
+        except Exception as e:
+            print(f'Error in rebuild_duplicate_index: {e}')
+            raise e
+    
+    def get_similar_posts(self, post_id, threshold=0.5, limit=50, fields=None):
+        '''Posts whose content is a near-duplicate of a post, most similar first, with a similarity estimate each'''
+        try:
+            index = self._ready_duplicate_index()
+            
+            # a post written through another process since the last rebuild isn't indexed here yet
+            content = None
+            if post_id not in index:
+                content = self.get_post(post_id).get('content', '')
+            
+            matches = index.similar(text=content, doc_id=post_id, threshold=threshold, limit=limit)
+            summaries = self._post_summaries_by_id([match_id for match_id, _ in matches], fields)
+            return [
+                {**summaries[match_id], 'similarity': round(similarity, 3)}
+                for match_id, similarity in matches
+                if match_id in summaries
+            ]
+        except Exception as e:
+            print(f'Error in get_similar_posts: {e}')
+            raise e
+    
+    def get_duplicate_clusters(self, threshold=0.7, min_size=3, limit=20):
+        '''Clusters of near-duplicate posts, largest first, each with the post ids and one sample post'''
+        try:
+            clusters = self._ready_duplicate_index().clusters(threshold=threshold, min_size=min_size)
+            samples = self._post_summaries_by_id([post_ids[0] for post_ids in clusters[:limit]])
+            
+            return {
+                'clusters': [
+                    {'size': len(post_ids), 'post_ids': post_ids, 'sample': samples.get(post_ids[0])}
+                    for post_ids in clusters[:limit]
+                ],
+                'total_clusters': len(clusters)
+            }
+        except Exception as e:
+            print(f'Error in get_duplicate_clusters: {e}')
+            raise e
+    
+    def _comment_pages(self, field, values, fields=('post_id', 'userId', 'createdAt')):
+        '''Stream the comment documents whose `field` is one of `values`, a page at a time'''
+        comments_ref = self.db.collection('comments')
+        for i in range(0, len(values), 30): # an in filter takes at most 30 values
+            query = comments_ref.where(field, 'in', values[i:i + 30]).select(list(fields))
+            yield from self._stream_pages(query, self.CASCADE_PAGE_SIZE)
+    
+    def _delete_post_comments(self, post_ids):
+        '''Delete the comment documents of deleted posts and decrement the comment counter, returns the count'''
+        def plan(batch, docs):
+            return {'comments': self._counter_days(doc.to_dict().get('createdAt') for doc in docs)}
+        
+        deleted = 0
+        for page in self._comment_pages('post_id', post_ids, fields=('createdAt',)):
+            deleted += len(self._commit_deletes(page, plan))
+        return deleted
+    
     def delete_comment(self, post_id, comment_id, admin_id=None):
         '''Delete a comment from a post'''
         try:
-            post_ref = self.db.collection('posts').document(post_id)
-            post_doc = post_ref.get()
+            comment_ref = self.db.collection('comments').document(comment_id)
+            comment_doc = comment_ref.get()
             
-            if not post_doc.exists:
-                raise Exception('Post not found')
+            if comment_doc.exists and comment_doc.get('post_id') == post_id:
+                comment_to_delete = comment_doc.to_dict()
+                
+                # one document delete, the precondition makes a concurrent delete count only once
+                batch = self.db.batch()
+                batch.delete(comment_ref, option=self.db.write_option(exists=True))
+                batch.update(self.db.collection('posts').document(post_id), {'commentCount': firestore.Increment(-1)})
+                self.counters['comments'].increment_by_day(batch, self._negate(self._counter_days([comment_to_delete.get('createdAt')])))
+                try:
+                    batch.commit()
+                except NotFound:
+                    raise Exception('Comment not found')
+                self.post_cache.invalidate(post_id)
+            elif self.comments_dual_read:
+                comment_to_delete = self._delete_embedded_comment(post_id, comment_id)
+            else:
+                raise Exception('Comment not found')
+            
+            if admin_id:
+                self.log_admin_action(admin_id, 'COMMENT_DELETED', {
+                    'post_id': post_id,
+                    'comment_id': comment_id,
+                    'user_id': comment_to_delete.get('userId'),
+                    'content_preview': comment_to_delete.get('content', '')[:50] + '...' if len(comment_to_delete.get('content', '')) > 50 else comment_to_delete.get('content', '')
+                })
             
-            post_data = post_doc.to_dict()
-            comments = post_data.get('comments', [])
+            return True
+        except Exception as e:
+            print(f'Error in delete_comment: {e}')
+            raise e
+    
+    def _delete_embedded_comment(self, post_id, comment_id):
+        '''Remove a comment from the comments array of a post that has not been migrated, returns the comment'''
+        post_ref = self.db.collection('posts').document(post_id)
+        comment_to_delete = None
+        reloaded = False
+        
+        # the comments array is rewritten, the precondition keeps a concurrent comment from being lost
+        def write(batch, post_data, option):
+            nonlocal comment_to_delete, reloaded
             
             # finding comment to delete
             comment_to_delete = None
             new_comments = []
             
-            for comment in comments:
+            for comment in post_data.get('comments', []):
                 if comment.get('id') == comment_id:
                     comment_to_delete = comment
                 else:
                     new_comments.append(comment)
             
             if not comment_to_delete:
+                if not reloaded:
+                    # the cached copy may be older than the comment, NotFound has _conditional_write read the post again
+                    reloaded = True
+                    raise NotFound('Comment not in the cached post')
                 raise Exception('Comment not found')
             
-            post_ref.update({
-                'comments': new_comments
+            # drop the author from commenterIds when this was their last comment on the post
+            comment_author = comment_to_delete.get('userId')
+            updates = {'comments': new_comments}
+            if not any(comment.get('userId') == comment_author for comment in new_comments):
+                updates['commenterIds'] = firestore.ArrayRemove([comment_author])
+            
+            batch.update(post_ref, updates, option=option)
+            self.counters['comments'].increment_by_day(batch, self._negate(self._counter_days([comment_to_delete.get('createdAt')])))
+        
+        if not self._conditional_write(self.post_cache, post_id, self._load_post, write):
+            raise Exception('Post not found')
+        
+        return comment_to_delete
+    
+    def _commit_counter_writes(self, batch, decrements):
+        '''Add counter decrements (name -> {day: n}) to batch and commit it, spilling into more batches when they do not fit
+
+        batch is always committed first, so when it carries preconditions nothing is written if they fail.
+        '''
+        for name, days in decrements.items():
+            days = list(self._negate(days).items())
+            while days:
+                room = BATCH_WRITE_LIMIT - len(batch) - 1 # the shard total takes one write, each day one more
+                if room < 1:
+                    batch.commit()
+                    batch = self.db.batch()
+                    continue
+                self.counters[name].increment_by_day(batch, dict(days[:room]))
+                days = days[room:]
+        if len(batch):
+            batch.commit()
+    
+    def _commit_deletes(self, docs, plan):
+        '''Delete docs in one batch, each conditioned on the snapshot it was read as, with the writes plan adds
+
+        plan(batch, docs) adds any other writes (audit entries, count updates) and returns the
+        counter decrements of the deletes. A document changed or deleted since it was read fails
+        the whole batch, the documents are then read again and the batch planned from those that
+        still exist, so counters are only decremented for deletes that commit. Returns the deleted docs.
+        '''
+        for _ in range(self.PRECONDITION_ATTEMPTS):
+            if not docs:
+                return []
+            
+            batch = self.db.batch()
+            for doc in docs:
+                batch.delete(doc.reference, option=self.db.write_option(last_update_time=doc.update_time))
+            decrements = plan(batch, docs)
+            try:
+                self._commit_counter_writes(batch, decrements)
+                return docs
+            except (FailedPrecondition, NotFound):
+                docs = [doc for doc in self.db.get_all([doc.reference for doc in docs]) if doc.exists]
+        
+        raise Exception('The documents are being modified concurrently, try again')
+    
+    def bulk_delete_posts(self, post_ids, admin_id=None):
+        '''Delete many posts with one multi-get and chunked write batches that also carry the audit entries'''
+        try:
+            post_ids = list(dict.fromkeys(post_ids)) # drop duplicates, keep the order
+            posts_ref = self.db.collection('posts')
+            found = {
+                doc.id: doc
+                for doc in self.db.get_all([posts_ref.document(post_id) for post_id in post_ids])
+                if doc.exists
+            }
+            
+            def plan(batch, docs):
+                posts = [doc.to_dict() for doc in docs]
+                if admin_id:
+                    for doc, post_data in zip(docs, posts):
+                        batch.set(self.db.collection('admin_logs').document(), self._log_entry(admin_id, 'POST_DELETED', {
+                            'post_id': doc.id,
+                            'user_id': post_data.get('userId'),
+                            'content_preview': _preview(post_data.get('content', ''))
+                        }))
+                return {
+                    'posts': self._counter_days(post_data.get('createdAt') for post_data in posts),
+                    'comments': self._counter_days(
+                        comment.get('createdAt')
+                        for post_data in posts
+                        for comment in post_data.get('comments', [])
+                    )
+                }
+            
+            # posts deleted concurrently (by another admin or a retry) are neither counted nor reported as deleted here
+            candidates = [post_id for post_id in post_ids if post_id in found]
+            deleted = []
+            for i in range(0, len(candidates), BULK_CHUNK_SIZE):
+                chunk = candidates[i:i + BULK_CHUNK_SIZE]
+                committed = {doc.id for doc in self._commit_deletes([found[post_id] for post_id in chunk], plan)}
+                
+                self.post_cache.invalidate(*chunk)
+                self._unindex_posts(*committed)
+                deleted.extend(post_id for post_id in chunk if post_id in committed)
+            
+            self._delete_post_comments(deleted)
+            
+            deleted_ids = set(deleted)
+            return {
+                'deleted': deleted,
+                'not_found': [post_id for post_id in post_ids if post_id not in deleted_ids]
+            }
+        except Exception as e:
+            print(f'Error in bulk_delete_posts: {e}')
+            raise e
+    
+    def bulk_delete_comments(self, comments, admin_id=None):
+        '''Delete many comments given as [{'post_id', 'comment_id'}] with one multi-get and chunked write batches'''
+        try:
+            requested = list(dict.fromkeys((comment['post_id'], comment['comment_id']) for comment in comments))
+            comments_ref = self.db.collection('comments')
+            found = {}
+            for doc in self.db.get_all([comments_ref.document(comment_id) for _, comment_id in requested]):
+                if doc.exists:
+                    found[(doc.get('post_id'), doc.id)] = doc
+            
+            def plan(batch, docs):
+                comments = [doc.to_dict() for doc in docs]
+                if admin_id:
+                    for doc, comment_data in zip(docs, comments):
+                        batch.set(self.db.collection('admin_logs').document(), self._log_entry(admin_id, 'COMMENT_DELETED', {
+                            'post_id': comment_data.get('post_id'),
+                            'comment_id': doc.id,
+                            'user_id': comment_data.get('userId'),
+                            'content_preview': _preview(comment_data.get('content', ''))
+                        }))
+                
+                # one count update per post
+                removed_per_post = Counter(comment_data.get('post_id') for comment_data in comments)
+                for post_id, removed in removed_per_post.items():
+                    batch.update(self.db.collection('posts').document(post_id), {'commentCount': firestore.Increment(-removed)})
+                
+                return {'comments': self._counter_days(comment_data.get('createdAt') for comment_data in comments)}
+            
+            candidates = [key for key in requested if key in found]
+            deleted = []
+            for i in range(0, len(candidates), BULK_COMMENT_CHUNK_SIZE):
+                chunk = candidates[i:i + BULK_COMMENT_CHUNK_SIZE]
+                committed = {(doc.get('post_id'), doc.id) for doc in self._commit_deletes([found[key] for key in chunk], plan)}
+                
+                self.post_cache.invalidate(*{post_id for post_id, _ in chunk})
+                deleted.extend(key for key in chunk if key in committed)
+            
+            result = {
+                'deleted': [{'post_id': post_id, 'comment_id': comment_id} for post_id, comment_id in deleted],
+                'not_found': []
+            }
+            
+            # the rest may still be embedded in posts that have not been migrated
+            deleted_keys = set(deleted)
+            missing = [key for key in requested if key not in deleted_keys]
+            if missing and self.comments_dual_read:
+                embedded = self._bulk_delete_embedded_comments(missing, admin_id)
+                result['deleted'].extend(embedded['deleted'])
+                missing = [(comment['post_id'], comment['comment_id']) for comment in embedded['not_found']]
+            result['not_found'] = [{'post_id': post_id, 'comment_id': comment_id} for post_id, comment_id in missing]
+            
+            return result
+        except Exception as e:
+            print(f'Error in bulk_delete_comments: {e}')
+            raise e
+    
+    def _bulk_delete_embedded_comments(self, comments, admin_id=None):
+        '''Delete (post_id, comment_id) comments embedded in posts that have not been migrated, one update per post'''
+        # group the requested comment ids by post
+        by_post = {}
+        for post_id, comment_id in comments:
+            by_post.setdefault(post_id, set()).add(comment_id)
+        
+        posts_ref = self.db.collection('posts')
+        found = {
+            doc.id: doc.to_dict()
+            for doc in self.db.get_all([posts_ref.document(post_id) for post_id in by_post])
+            if doc.exists
+        }
+        
+        deleted = []
+        not_found = []
+        post_ids = list(by_post)
+        for i in range(0, len(post_ids), BULK_CHUNK_SIZE):
+            batch = self.db.batch()
+            removed_dates = []
+            touched = []
+            
+            for post_id in post_ids[i:i + BULK_CHUNK_SIZE]:
+                comment_ids = by_post[post_id]
+                if post_id not in found:
+                    not_found.extend({'post_id': post_id, 'comment_id': comment_id} for comment_id in comment_ids)
+                    continue
+                
+                post_data = found[post_id]
+                removed = [comment for comment in post_data.get('comments', []) if comment.get('id') in comment_ids]
+                kept = [comment for comment in post_data.get('comments', []) if comment.get('id') not in comment_ids]
+                removed_ids = {comment.get('id') for comment in removed}
+                not_found.extend(
+                    {'post_id': post_id, 'comment_id': comment_id}
+                    for comment_id in comment_ids - removed_ids
+                )
+                if not removed:
+                    continue
+                
+                # drop authors from commenterIds when none of their comments are left on the post
+                updates = {'comments': kept}
+                remaining_authors = {comment.get('userId') for comment in kept}
+                gone_authors = list({comment.get('userId') for comment in removed} - remaining_authors)
+                if gone_authors:
+                    updates['commenterIds'] = firestore.ArrayRemove(gone_authors)
+                batch.update(posts_ref.document(post_id), updates)
+                touched.append(post_id)
+                
+                for comment in removed:
+                    removed_dates.append(comment.get('createdAt'))
+                    deleted.append({'post_id': post_id, 'comment_id': comment.get('id')})
+                    if admin_id:
+                        batch.set(self.db.collection('admin_logs').document(), self._log_entry(admin_id, 'COMMENT_DELETED', {
+                            'post_id': post_id,
+                            'comment_id': comment.get('id'),
+                            'user_id': comment.get('userId'),
+                            'content_preview': _preview(comment.get('content', ''))
+                        }))
+                    
+                    # a post with many removed comments can fill a batch on its own
+                    if len(batch) >= BATCH_WRITE_LIMIT - 1:
+                        batch.commit()
+                        batch = self.db.batch()
+            
+            self._commit_counter_writes(batch, {'comments': self._counter_days(removed_dates)})
+            self.post_cache.invalidate(*touched)
+        
+        return {
+            'deleted': deleted,
+            'not_found': not_found
+        }
+
+    MIGRATION_BATCH_SIZE = 400 # comments moved per batch, the post update takes one more write
+    
+    def migrate_embedded_comments(self, progress=None):
+        '''Move the comments embedded in post documents into the comments collection
+
+        Posts from before the maintained counts also get their likeCount and commentCount backfilled,
+        post lists only read those fields. Runs online with COMMENTS_DUAL_READ on and can be rerun: every
+        batch writes a slice of the comment documents together with the post update that takes the same
+        comments out of the array, conditioned on the post's update time. A comment is never both embedded
+        and a document, and a post that changes during the migration is skipped (keeping whatever slices
+        were already moved) and picked up by the next run. Once a run reports no skipped posts,
+        COMMENTS_DUAL_READ can be turned off.
+        '''
+        try:
+            comments_ref = self.db.collection('comments')
+            counts = {'posts_migrated': 0, 'comments_migrated': 0, 'posts_skipped': 0}
+            
+            posts = self.db.collection('posts').select(['comments', 'commenterIds', 'likes', 'likeCount', 'commentCount'])
+            for page in self._stream_pages(posts, self.CASCADE_PAGE_SIZE):
+                for doc in page:
+                    post_data = doc.to_dict()
+                    if 'comments' not in post_data and 'commenterIds' not in post_data and 'likeCount' in post_data and 'commentCount' in post_data:
+                        continue # already migrated or created after the cutover
+                    
+                    embedded = post_data.get('comments') or []
+                    update_time = doc.update_time
+                    moved = 0
+                    committed = False
+                    while True:
+                        chunk = embedded[moved:moved + self.MIGRATION_BATCH_SIZE]
+                        remaining = embedded[moved + len(chunk):]
+                        
+                        batch = self.db.batch()
+                        for comment in chunk:
+                            batch.set(comments_ref.document(comment['id']), {
+                                'post_id': doc.id,
+                                'userId': comment.get('userId'),
+                                'username': comment.get('username'),
+                                'content': comment.get('content', ''),
+                                'createdAt': _comment_time(comment.get('createdAt'))
+                            })
+                        
+                        updates = {'commentCount': firestore.Increment(len(chunk))}
+                        if remaining:
+                            updates['comments'] = remaining
+                        else:
+                            updates['comments'] = firestore.DELETE_FIELD
+                            updates['commenterIds'] = firestore.DELETE_FIELD
+                        if 'likeCount' not in post_data and not moved:
+                            updates['likeCount'] = len(post_data.get('likes', []))
+                        batch.update(doc.reference, updates, option=self.db.write_option(last_update_time=update_time.timestamp_pb()))
+                        try:
+                            results = batch.commit()
+                        except (FailedPrecondition, NotFound):
+                            counts['posts_skipped'] += 1
+                            break
+                        
+                        committed = True
+                        update_time = results[-1].update_time # the post update is the last write, the next slice is conditioned on it
+                        moved += len(chunk)
+                        counts['comments_migrated'] += len(chunk)
+                        if not remaining:
+                            counts['posts_migrated'] += 1
+                            break
+                    
+                    if committed:
+                        self.post_cache.invalidate(doc.id)
+                
+                if progress:
+                    progress(dict(counts))
+            
+            return counts
+        except Exception as e:
+            print(f'Error in migrate_embedded_comments: {e}')
+            raise e
+    
+    # Moderation methods
+    
+    MODERATION_PAGE_SIZE = 500
+    
+    def _moderate(self, kind, post_id, comment_id, user_id, content):
+        '''Queue a newly written post or comment for review if it contains a banned phrase'''
+        matches = self.moderation.scan(content) if self.moderation else []
+        if not matches:
+            return
+        
+        try:
+            item = review_item(kind, post_id, comment_id, user_id, content, matches)
+            self.db.collection('moderation_queue').document(item.pop('id')).set({**item, 'createdAt': firestore.SERVER_TIMESTAMP})
+        except Exception as e: # the write itself went through, a sweep will pick the item up
+            print(f'Error queueing {kind} {comment_id or post_id} for review: {e}')
+    
+    def _queue_for_review(self, items):
+        '''Add flagged items to the review queue unless they are queued already (or were resolved), returns how many were added'''
+        if not items:
+            return 0
+        
+        queue_ref = self.db.collection('moderation_queue')
+        refs = [queue_ref.document(item['id']) for item in items]
+        queued = {doc.id for doc in self.db.get_all(refs, field_paths=['status']) if doc.exists}
+        
+        new_items = [item for item in items if item['id'] not in queued]
+        for i in range(0, len(new_items), BATCH_WRITE_LIMIT):
+            batch = self.db.batch()
+            for item in new_items[i:i + BATCH_WRITE_LIMIT]:
+                item = dict(item)
+                batch.set(queue_ref.document(item.pop('id')), {**item, 'createdAt': firestore.SERVER_TIMESTAMP})
+            batch.commit()
+        return len(new_items)
+    
+    def scan_for_moderation(self, progress=None):
+        '''Sweep every post and comment through the banned phrase automaton, flagged ones go to the review queue
+        
+        The phrase list is reloaded first so a sweep applies the current rules. Posts and comments
+        are streamed a page at a time, the cost is linear in the text scanned whatever the rule count.
+        Returns {'posts_scanned', 'comments_scanned', 'flagged', 'rules'}.
+        '''
+        try:
+            self.moderation = PhraseMatcher(load_phrases(self.moderation_phrases_path))
+            matcher = self.moderation
+            counts = {'posts_scanned': 0, 'comments_scanned': 0, 'flagged': 0, 'rules': len(matcher)}
+            if not matcher:
+                return counts
+            
+            def flag(kind, post_id, comment_id, user_id, content):
+                matches = matcher.scan(content)
+                return [review_item(kind, post_id, comment_id, user_id, content, matches)] if matches else []
+            
+            # posts, with the comments still embedded in posts that have not been migrated
+            fields = ['userId', 'content', 'comments'] if self.comments_dual_read else ['userId', 'content']
+            posts = self.db.collection('posts').select(fields)
+            for page in self._stream_pages(posts, self.MODERATION_PAGE_SIZE):
+                items = []
+                for doc in page:
+                    post_data = doc.to_dict()
+                    items += flag('post', doc.id, None, post_data.get('userId'), post_data.get('content', ''))
+                    for comment in post_data.get('comments', []):
+                        items += flag('comment', doc.id, comment.get('id'), comment.get('userId'), comment.get('content', ''))
+                        counts['comments_scanned'] += 1
+                counts['posts_scanned'] += len(page)
+                counts['flagged'] += self._queue_for_review(items)
+                if progress:
+                    progress(dict(counts))
+            
+            comments = self.db.collection('comments').select(['post_id', 'userId', 'content'])
+            for page in self._stream_pages(comments, self.MODERATION_PAGE_SIZE):
+                items = []
+                for doc in page:
+                    comment_data = doc.to_dict()
+                    items += flag('comment', comment_data.get('post_id'), doc.id, comment_data.get('userId'), comment_data.get('content', ''))
+                counts['comments_scanned'] += len(page)
+                counts['flagged'] += self._queue_for_review(items)
+                if progress:
+                    progress(dict(counts))
+            
+            return counts
+        except Exception as e:
+            print(f'Error in scan_for_moderation: {e}')
+            raise e
+    
+    def get_moderation_queue(self, status='pending', limit=50, cursor=None):
+        '''Get a page of review queue items with the given status, newest first'''
+        try:
+            query = self.db.collection('moderation_queue').where('status', '==', status)
+            docs, next_cursor = self._paginate(query, limit, cursor=cursor)
+            
+            items = []
+            for doc in docs:
+                item = doc.to_dict()
+                item['id'] = doc.id
+                items.append(item)
+            
+            return {
+                'items': items,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        except Exception as e:
+            print(f'Error in get_moderation_queue: {e}')
+            raise e
+    
+    def resolve_moderation_item(self, item_id, action, admin_id=None):
+        '''Dismiss a review queue item or remove the flagged post/comment, returns {'id', 'kind', 'post_id', 'comment_id', 'status'}'''
+        try:
+            if action not in self.MODERATION_ACTIONS:
+                raise ValueError(f"action must be {' or '.join(self.MODERATION_ACTIONS)}")
+            
+            item_ref = self.db.collection('moderation_queue').document(item_id)
+            item_doc = item_ref.get()
+            if not item_doc.exists:
+                raise Exception('Review item not found')
+            item = item_doc.to_dict()
+            
+            if action == 'remove':
+                try:
+                    if item['kind'] == 'comment':
+                        self.delete_comment(item['post_id'], item['comment_id'], admin_id=admin_id)
+                    else:
+                        self.delete_post(item['post_id'], admin_id=admin_id)
+                except Exception as e:
+                    if 'not found' not in str(e): # already deleted some other way, still resolve it
+                        raise
+            
+            status = 'removed' if action == 'remove' else 'dismissed'
+            item_ref.update({
+                'status': status,
+                'resolvedAt': firestore.SERVER_TIMESTAMP,
+                'resolvedBy': admin_id
             })
             
             if admin_id:
-                self.log_admin_action(admin_id, 'COMMENT_DELETED', {
-                    'post_id': post_id,
-                    'comment_id': comment_id,
-                    'user_id': comment_to_delete.get('userId'),
-                    'content_preview': comment_to_delete.get('content', '')[:50] + '...' if len(comment_to_delete.get('content', '')) > 50 else comment_to_delete.get('content', '')
+                self.log_admin_action(admin_id, 'MODERATION_RESOLVED', {
+                    'item_id': item_id,
+                    'action': action,
+                    'post_id': item.get('post_id'),
+                    'comment_id': item.get('comment_id'),
+                    'user_id': item.get('userId')
                 })
             
-            return True
+            return {
+                'id': item_id,
+                'kind': item['kind'],
+                'post_id': item.get('post_id'),
+                'comment_id': item.get('comment_id'),
+                'status': status
+            }
         except Exception as e:
-            print(f'Error in delete_comment: {e}')
+            print(f'Error in resolve_moderation_item: {e}')
             raise e
 
     # Analytics methods
 
-    def get_analytics_summary(self, days=30): # Can be refactored
+    def _counter_days(self, dates):
+        '''Count dates per day bucket, dates without a usable value fall into today's bucket'''
+        days = Counter()
+        for date in dates:
+            try:
+                days[ShardedCounter.day_key(date or None)] += 1
+            except (ValueError, TypeError, AttributeError):
+                days[ShardedCounter.day_key()] += 1
+        return days
+    
+    def _negate(self, days):
+        return {day: -amount for day, amount in days.items()}
+    
+    def get_analytics_summary(self, days=30):
         '''Get summary analytics for the dashboard'''
         try:
-            end_date = datetime.datetime.now()
-            start_date = end_date - datetime.timedelta(days=days)
+            start_date = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
             
-            # count users
-            users_query = self.db.collection('users').stream()
-            users_count = len(list(users_query))
+            # totals come from the counter shards, period counts from a sum over the day buckets
+            summary = {}
+            for name, counter in self.counters.items():
+                summary[f'total_{name}'] = counter.total()
+                summary[f'new_{name}'] = counter.total_since(start_date)
+            summary['period_days'] = days
             
-            # count new users in period
-            new_users_query = (
-                self.db.collection('users')
-                .where('createdAt', '>=', start_date)
-                .stream()
-            )
-            new_users = len(list(new_users_query))
+            return summary
+        except Exception as e:
+            print(f'Error in get_analytics_summary: {e}')
+            raise e
+    
+    COUNTER_REBUILD_PAGE_SIZE = 1000
+    
+    def rebuild_counters(self, admin_id=None, progress=None):
+        '''Recompute every counter from the users, posts and comments collections
+
+        Used to seed the counters for existing data or to repair drift, writes that happen
+        while this runs may be lost so it should be run during a maintenance window.
+        Reads every document, so it runs as a background job reporting the documents read.
+        '''
+        try:
+            counts = {'users_read': 0, 'posts_read': 0, 'comments_read': 0}
+            
+            def read(collection, fields):
+                for page in self._stream_pages(self.db.collection(collection).select(fields), self.COUNTER_REBUILD_PAGE_SIZE):
+                    yield from page
+                    counts[f'{collection}_read'] += len(page)
+                    if progress:
+                        progress(dict(counts))
+            
+            user_days = Counter()
+            for doc in read('users', ['createdAt']):
+                user_days.update(self._counter_days([doc.to_dict().get('createdAt')]))
+            
+            post_days = Counter()
+            comment_days = Counter()
+            for doc in read('posts', ['createdAt', 'comments']):
+                post_data = doc.to_dict()
+                post_days.update(self._counter_days([post_data.get('createdAt')]))
+                comment_days.update(self._counter_days(
+                    comment.get('createdAt') for comment in post_data.get('comments', [])
+                ))
+            for doc in read('comments', ['createdAt']):
+                comment_days.update(self._counter_days([doc.to_dict().get('createdAt')]))
+            
+            totals = {}
+            for name, day_counts in (('users', user_days), ('posts', post_days), ('comments', comment_days)):
+                counter = self.counters[name]
+                counter.clear()
+                
+                # write the day buckets in chunks to stay under the batch limit
+                items = list(day_counts.items())
+                for i in range(0, len(items), 400):
+                    batch = self.db.batch()
+                    counter.increment_by_day(batch, dict(items[i:i + 400]))
+                    batch.commit()
+                
+                totals[name] = sum(day_counts.values())
             
-            # count total posts
-            posts_query = self.db.collection('posts').stream()
-            posts_count = len(list(posts_query))
+            # the comment buckets were rewritten, have the next compaction resync every day from them
+            self.db.collection('analytics_meta').document('rollups').set({'comments_synced_at': firestore.DELETE_FIELD}, merge=True)
             
-            # count new posts in period
-            new_posts_query = (
-                self.db.collection('posts')
-                .where('createdAt', '>=', start_date)
-                .stream()
-            )
-            new_posts = len(list(new_posts_query))
-            
-            # count total comments
-            total_comments = 0
-            all_posts_query = self.db.collection('posts').stream()
-            for post in all_posts_query:
-                post_data = post.to_dict()
-                total_comments += len(post_data.get('comments', []))
-            
-            # count new comments in period
-            new_comments = 0
-            all_posts_query = (
-                self.db.collection('posts')
-                .stream()
+            if admin_id:
+                self.log_admin_action(admin_id, 'COUNTERS_REBUILT', totals)
+            return totals
+        except Exception as e:
+            print(f'Error in rebuild_counters: {e}')
+            raise e
+    
+    # Daily rollups
+    
+    def _rollup_page(self, collection, cutoff, page_size):
+        '''Fold the next page of documents after the rollup cursor into the daily rollups'''
+        cursor_ref = self.db.collection('analytics_meta').document('rollups')
+        
+        # reading the cursor and writing it back in one transaction means concurrent
+        # compactors (e.g. one per worker process) can't count the same page twice
+        @firestore.transactional
+        def compact(transaction):
+            cursor_doc = cursor_ref.get(transaction=transaction)
+            cursor = (cursor_doc.to_dict() or {}).get(collection)
+            
+            query = (
+                self.db.collection(collection)
+                .where('createdAt', '<', cutoff)
+                .order_by('createdAt')
+                .order_by('__name__')
+                .select(['createdAt'])
+                .limit(page_size)
             )
+            if cursor:
+                query = query.start_after({'createdAt': cursor['createdAt'], '__name__': cursor['id']})
             
-            for post in all_posts_query:
-                post_data = post.to_dict()
-                for comment in post_data.get('comments', []):
-                    comment_date = comment.get('createdAt', None)
-                    if comment_date:
-                        try:
-                            comment_datetime = datetime.datetime.fromisoformat(comment_date.replace('Z', '+00:00'))
-                            if comment_datetime >= start_date:
-                                new_comments += 1
-                        except (ValueError, TypeError):
-                            pass # skip comments with invalid dates
+            docs = list(transaction.get(query))
+            if not docs:
+                return 0
             
+            for day, amount in self._counter_days(doc.get('createdAt') for doc in docs).items():
+                transaction.set(self.db.collection('analytics_daily').document(day), {
+                    'date': day,
+                    collection: firestore.Increment(amount)
+                }, merge=True)
+            
+            last_doc = docs[-1]
+            transaction.set(cursor_ref, {
+                collection: {'createdAt': last_doc.get('createdAt'), 'id': last_doc.id}
+            }, merge=True)
+            
+            return len(docs)
+        
+        return compact(self.db.transaction())
+    
+    def _rollup_comments(self, settle_seconds=60):
+        '''Sync the comments of the daily rollups with the comment counter's day buckets
+
+        The counter already keeps per-day buckets, including for comments that are still embedded
+        in posts and have no document to page through. Deletes decrement the bucket of the day a
+        comment was written, long after that day closed, so instead of copying each day once every
+        day whose buckets changed since the previous run is summed again and overwritten.
+        '''
+        cursor_ref = self.db.collection('analytics_meta').document('rollups')
+        synced_at = (cursor_ref.get().to_dict() or {}).get('comments_synced_at')
+        now = datetime.datetime.now(datetime.timezone.utc)
+        days_ref = self.counters['comments'].ref.collection('days')
+        
+        totals = Counter()
+        if synced_at:
+            # bucket writes committed just before the previous run may not have been visible to it
+            changed = days_ref.where('updatedAt', '>=', synced_at - datetime.timedelta(seconds=settle_seconds))
+            days = sorted({doc.get('date') for doc in changed.select(['date']).stream()})
+            for i in range(0, len(days), 30): # an in filter takes at most 30 values
+                for doc in days_ref.where('date', 'in', days[i:i + 30]).select(['date', 'count']).stream():
+                    bucket = doc.to_dict()
+                    totals[bucket['date']] += bucket.get('count', 0)
+        else:
+            # first sync (or after a counter rebuild): every bucket, and days left without any go back to 0
+            for doc in days_ref.select(['date', 'count']).stream():
+                bucket = doc.to_dict()
+                totals[bucket['date']] += bucket.get('count', 0)
+            rolled_up = self.db.collection('analytics_daily').where('comments', '!=', 0).select(['date'])
+            days = sorted(set(totals) | {doc.get('date') for doc in rolled_up.stream()})
+        
+        for i in range(0, max(len(days), 1), 400):
+            batch = self.db.batch()
+            for day in days[i:i + 400]:
+                batch.set(self.db.collection('analytics_daily').document(day), {
+                    'date': day,
+                    'comments': totals[day]
+                }, merge=True)
+            if i + 400 >= len(days): # the sync time moves only once every changed day is written
+                batch.set(cursor_ref, {'comments_synced_at': now}, merge=True)
+            batch.commit()
+        
+        return len(days)
+    
+    def compact_daily_rollups(self, page_size=400, settle_seconds=60):
+        '''Incrementally build the analytics_daily rollup documents
+
+        Users and posts are scanned in createdAt order from where the previous run stopped,
+        documents newer than settle_seconds are left for the next run so late server timestamps
+        are not skipped.
+        '''
+        try:
+            cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=settle_seconds)
+            compacted = {}
+            
+            for collection in ('users', 'posts'):
+                compacted[collection] = 0
+                while True:
+                    count = self._rollup_page(collection, cutoff, page_size)
+                    compacted[collection] += count
+                    if count < page_size:
+                        break
+            
+            compacted['comment_days'] = self._rollup_comments(settle_seconds)
+            
+            return compacted
+        except Exception as e:
+            print(f'Error in compact_daily_rollups: {e}')
+            raise e
+    
+    def get_analytics_timeseries(self, days=30, metrics=StorageBackend.ROLLUP_METRICS):
+        '''Get per-day counts for the last `days` days from the rollup documents'''
+        try:
+            today = datetime.datetime.now(datetime.timezone.utc).date()
+            start_day = today - datetime.timedelta(days=days - 1)
+            
+            rollups = {}
+            query = (
+                self.db.collection('analytics_daily')
+                .where('date', '>=', start_day.isoformat())
+                .order_by('date')
+                .select(['date', *metrics])
+            )
+            for doc in query.stream():
+                rollup = doc.to_dict()
+                rollups[rollup['date']] = rollup
+            
+            # fill in days without a rollup document so the series has no gaps
+            series = []
+            for offset in range(days):
+                day = (start_day + datetime.timedelta(days=offset)).isoformat()
+                rollup = rollups.get(day, {})
+                point = {'date': day}
+                for metric in metrics:
+                    point[metric] = rollup.get(metric, 0)
+                series.append(point)
+            
+            # tell the caller how far the compactor has got
+            cursor_doc = self.db.collection('analytics_meta').document('rollups').get()
+            cursor = cursor_doc.to_dict() or {}
+            compacted_through = {'comments': cursor.get('comments_synced_at')}
+            for collection in ('users', 'posts'):
+                compacted_through[collection] = cursor.get(collection, {}).get('createdAt')
             
             return {
-                'total_users': users_count,
-                'new_users': new_users,
-                'total_posts': posts_count,
-                'new_posts': new_posts,
-                'total_comments': total_comments,
-                'new_comments': new_comments,
-                'period_days': days
+                'series': series,
+                'metrics': list(metrics),
+                'period_days': days,
+                'compacted_through': compacted_through
             }
         except Exception as e:
-            print(f'Error in get_analytics_summary: {e}')
+            print(f'Error in get_analytics_timeseries: {e}')
             raise e
     
     # NOT USABLE
@@ -1108,47 +2465,213 @@ class FirebaseService:
     #         print(f'Error in get_screentime_analytics: {e}')
     #         raise e
     
+    # Cache methods
+    
+    def get_cache_stats(self):
+        '''Get hit/miss statistics for the point lookup caches'''
+        return [cache.stats() for cache in (self.admin_cache, self.user_cache, self.post_cache)]
+    
+    # Job methods
+    
+    def create_job(self, job_type, admin_id, params):
+        '''Record a queued background job'''
+        try:
+            job_ref = self.db.collection('admin_jobs').document()
+            job_ref.set({
+                'type': job_type,
+                'status': 'queued',
+                'admin_id': admin_id,
+                'params': params,
+                'progress': {},
+                'result': None,
+                'error': None,
+                'createdAt': firestore.SERVER_TIMESTAMP,
+                'heartbeatAt': firestore.SERVER_TIMESTAMP,
+                'startedAt': None,
+                'finishedAt': None
+            })
+            return job_ref.id
+        except Exception as e:
+            print(f'Error in create_job: {e}')
+            raise e
+    
+    def update_job(self, job_id, status=None, progress=None, result=None, error=None, started=False, finished=False):
+        '''Update the state of a background job'''
+        try:
+            updates = {}
+            if status is not None:
+                updates['status'] = status
+            if progress is not None:
+                updates['progress'] = progress
+            if result is not None:
+                updates['result'] = result
+            if error is not None:
+                updates['error'] = error
+            if started:
+                updates['startedAt'] = firestore.SERVER_TIMESTAMP
+            if finished:
+                updates['finishedAt'] = firestore.SERVER_TIMESTAMP
+            
+            if updates:
+                self.db.collection('admin_jobs').document(job_id).update(updates)
+            return True
+        except Exception as e:
+            print(f'Error in update_job: {e}')
+            raise e
+    
+    def get_job(self, job_id):
+        '''Get a background job by id'''
+        try:
+            job_doc = self.db.collection('admin_jobs').document(job_id).get()
+            
+            if not job_doc.exists:
+                return None
+            
+            job_data = job_doc.to_dict()
+            job_data['id'] = job_doc.id
+            return job_data
+        except Exception as e:
+            print(f'Error in get_job: {e}')
+            raise e
+    
+    def heartbeat_jobs(self, job_ids):
+        '''Stamp the heartbeat of jobs that are still queued or running in this process'''
+        try:
+            jobs_ref = self.db.collection('admin_jobs')
+            for i in range(0, len(job_ids), BATCH_WRITE_LIMIT):
+                batch = self.db.batch()
+                for job_id in job_ids[i:i + BATCH_WRITE_LIMIT]:
+                    batch.update(jobs_ref.document(job_id), {'heartbeatAt': firestore.SERVER_TIMESTAMP})
+                batch.commit()
+            return True
+        except Exception as e:
+            print(f'Error in heartbeat_jobs: {e}')
+            raise e
+    
+    def fail_stale_jobs(self, stale_after, error):
+        '''Mark queued and running jobs without a heartbeat for stale_after seconds as failed, returns how many'''
+        try:
+            cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=stale_after)
+            unfinished = self.db.collection('admin_jobs').where('status', 'in', ['queued', 'running'])
+            
+            failed = 0
+            for doc in unfinished.stream():
+                job_data = doc.to_dict()
+                heartbeat = job_data.get('heartbeatAt') or job_data.get('startedAt') or job_data.get('createdAt') # jobs from before the heartbeat
+                if heartbeat is None or heartbeat >= cutoff:
+                    continue
+                
+                # the precondition loses to a heartbeat or a finish written since the read
+                try:
+                    doc.reference.update({
+                        'status': 'failed',
+                        'error': error,
+                        'finishedAt': firestore.SERVER_TIMESTAMP
+                    }, option=self.db.write_option(last_update_time=doc.update_time.timestamp_pb()))
+                    failed += 1
+                except (FailedPrecondition, NotFound):
+                    continue
+            return failed
+        except Exception as e:
+            print(f'Error in fail_stale_jobs: {e}')
+            raise e
+    
     # Admin logs methods
     
+    def _log_entry(self, admin_id, action_type, details=None):
+        '''Build an admin_logs document, also used to write log entries inside other batches'''
+        return {
+            'admin_id': admin_id,
+            'action_type': action_type,
+            'details': details or dict(),
+            'timestamp': firestore.SERVER_TIMESTAMP,
+            'ip_address': None # to get from the request in the actual route handler
+        }
+    
     def log_admin_action(self, admin_id, action_type, details=None):
         '''Log an action taken/performed by an admin'''
         try:
-            log_ref = self.db.collection('admin_logs').document()
+            log_ref = self.db.collection('admin_logs').document() # ids are generated client side, no read
             
-            log_data = {
-                'admin_id': admin_id,
-                'action_type': action_type,
-                'details': details or dict(),
-                'timestamp': firestore.SERVER_TIMESTAMP,
-                'ip_address': None # to get from the request in the actual route handler
-            }
+            log_data = self._log_entry(admin_id, action_type, details)
             
-            log_ref.set(log_data)
+            if self.audit_log:
+                # the entry is written later, so stamp it with the time of the action
+                log_data['timestamp'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+                self.audit_log.enqueue({'id': log_ref.id, **log_data})
+            else:
+                log_ref.set(log_data)
             return log_ref.id
         except Exception as e:
             print(f'Error in log_admin_actions: {e}')
             raise e
     
-    def get_admin_logs(self, limit=100):
-        '''Get admin activity logs'''
+    def _write_log_entries(self, entries):
+        '''Write a batch of buffered log entries, set() by id so a retried batch doesn't duplicate'''
+        batch = self.db.batch()
+        for entry in entries:
+            log_data = dict(entry)
+            log_ref = self.db.collection('admin_logs').document(log_data.pop('id'))
+            log_data['timestamp'] = datetime.datetime.fromisoformat(log_data['timestamp'])
+            batch.set(log_ref, log_data)
+        batch.commit(timeout=self.audit_write_timeout)
+    
+    def get_admin_logs(self, limit=100, fields=None, filters=None, since=None, until=None, cursor=None):
+        '''Get a page of admin activity logs, newest first, only the requested fields when fields is given
+        
+        Every filter is a where clause on an indexed field (see firestore.indexes.json), so a
+        lookup reads only the matching entries whatever the size of the log.
+        '''
         try:
-            logs = []
-            logs_query = (
-                self.db.collection('admin_logs')
-                .order_by('timestamp', direction=firestore.Query.DESCENDING)
-                .limit(limit)
-                .stream()
-            )
+            logs_query = self.db.collection('admin_logs')
+            if fields is not None:
+                logs_query = logs_query.select(sorted(set(fields) | {'timestamp'})) # timestamp makes the cursor
             
-            for doc in logs_query:
-                log_data = doc.to_dict()
-                log_data['id'] = doc.id
-                
-                if 'timestamp' in log_data and log_data['timestamp']: # convert time stamp to string if it exists
-                    log_data['timestamp'] = log_data['timestamp'].isoformat()
-                logs.append(log_data)
+            for name, value in (filters or {}).items():
+                logs_query = logs_query.where(LOG_FILTER_FIELDS[name], '==', value)
+            if since:
+                logs_query = logs_query.where('timestamp', '>=', since)
+            if until:
+                logs_query = logs_query.where('timestamp', '<', until)
             
-            return logs
+            docs, next_cursor = self._paginate(logs_query, limit, cursor=cursor, order_field='timestamp')
+            
+            return {
+                'logs': [project(self._log_dict(doc), fields) for doc in docs],
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
         except Exception as e:
             print(f'Error in get_admins_logs: {e}')
-            raise e
\ No newline at end of file
+            raise e
+    
+    def _log_dict(self, doc):
+        log_data = doc.to_dict()
+        log_data['id'] = doc.id
+        return log_data
+    
+    # Export methods
+    
+    EXPORT_PAGE_SIZE = 500
+    
+    def iter_users(self, fields=None):
+        '''Yield every user summary, reading one page at a time so memory stays flat'''
+        query = self._user_summaries(self.db.collection('users'), fields)
+        for page in self._stream_pages(query, self.EXPORT_PAGE_SIZE):
+            for doc in page:
+                yield self._user_summary(doc, fields)
+    
+    def iter_posts(self, fields=None):
+        '''Yield every post summary, one page at a time'''
+        query = self._post_summaries(self.db.collection('posts'), fields)
+        for page in self._stream_pages(query, self.EXPORT_PAGE_SIZE):
+            for doc in page:
+                yield self._post_summary(doc, fields)
+    
+    def iter_admin_logs(self, fields=None):
+        '''Yield every admin log entry, one page at a time'''
+        logs_ref = self.db.collection('admin_logs')
+        query = logs_ref.select(list(fields)) if fields is not None else logs_ref
+        for page in self._stream_pages(query, self.EXPORT_PAGE_SIZE):
+            for doc in page:
+                yield self._log_dict(doc)
\ No newline at end of file
@@ -0,0 +1,112 @@
+# jobs.py
+from concurrent.futures import ThreadPoolExecutor
+from background import PeriodicTask
+import threading
+import time
+
+INTERRUPTED = 'interrupted' # error of a job whose process stopped before it finished
+
+class JobQueueFull(Exception):
+    pass
+
+class JobManager:
+    '''Runs long admin operations on a bounded worker pool outside the request
+
+    Every job has a record in the storage backend (status, progress, result or error) so it
+    can be polled from any worker process while it runs. The function of a job must accept a
+    `progress` keyword argument, which it calls with a dict of running counts.
+
+    The jobs a process holds get a heartbeat every heartbeat_interval seconds. A job left queued
+    or running by a process that died (crash, deploy, OOM kill) stops getting one, and after
+    stale_after seconds any manager records it as failed with the error 'interrupted'.
+    '''
+
+    def __init__(self, storage, max_workers=4, max_pending=100, progress_interval=1.0, heartbeat_interval=30, stale_after=300):
+        self.storage = storage
+        self.max_pending = max_pending
+        self.progress_interval = progress_interval # seconds between progress writes
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='admin-job')
+        self._pending = 0
+        self._futures = {} # job id -> future, for the jobs queued or running here
+        self._lock = threading.Lock()
+        self._heartbeat = PeriodicTask('admin-job-heartbeat', heartbeat_interval, self._beat)
+
+    def start(self):
+        '''Fail the jobs a stopped process left behind, then keep the heartbeat of ours going'''
+        try:
+            interrupted = self.storage.fail_stale_jobs(self.stale_after, INTERRUPTED)
+            if interrupted:
+                print(f'Marked {interrupted} interrupted jobs as failed')
+        except Exception as e: # jobs are still accepted, the heartbeat retries the sweep
+            print(f'Error recovering interrupted jobs: {e}')
+        self._heartbeat.start()
+
+    def _beat(self):
+        with self._lock:
+            job_ids = list(self._futures)
+        if job_ids:
+            self.storage.heartbeat_jobs(job_ids)
+        self.storage.fail_stale_jobs(self.stale_after, INTERRUPTED)
+
+    def submit(self, job_type, admin_id, func, args=(), kwargs=None, params=None):
+        '''Queue func(*args, **kwargs, progress=...) as a job, returns the job id'''
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull('Too many jobs are queued, try again later')
+            self._pending += 1
+
+        try:
+            job_id = self.storage.create_job(job_type, admin_id, params or {})
+            future = self._executor.submit(self._run, job_id, func, args, kwargs or {})
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._forget(job_id)) # runs right away if the job is already done
+        return job_id
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._pending -= 1
+
+    def _run(self, job_id, func, args, kwargs):
+        last_write = 0.0
+        latest = {}
+
+        def progress(counts):
+            nonlocal last_write
+            latest.update(counts)
+            # throttle progress writes, a busy job reports far more often than anyone polls
+            if time.monotonic() - last_write >= self.progress_interval:
+                last_write = time.monotonic()
+                self.storage.update_job(job_id, progress=dict(latest))
+
+        try:
+            self.storage.update_job(job_id, status='running', started=True)
+            result = func(*args, progress=progress, **kwargs)
+            self.storage.update_job(job_id, status='succeeded', progress=dict(latest), result=result, finished=True)
+        except Exception as e:
+            print(f'Error in job {job_id}: {e}')
+            try:
+                self.storage.update_job(job_id, status='failed', progress=dict(latest), error=str(e), finished=True)
+            except Exception as update_error:
+                print(f'Error recording failure of job {job_id}: {update_error}')
+
+    def shutdown(self, wait=True):
+        '''Stop taking jobs, the queued ones are recorded as interrupted and running ones finish when wait is set'''
+        with self._lock:
+            futures = dict(self._futures)
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._heartbeat.stop() # after the wait, running jobs must not go stale while they finish
+
+        for job_id, future in futures.items():
+            if future.cancelled():
+                try:
+                    self.storage.update_job(job_id, status='failed', error=INTERRUPTED, finished=True)
+                except Exception as e:
+                    print(f'Error recording interruption of job {job_id}: {e}')
@@ -0,0 +1,212 @@
+# minhash.py
+import threading
+import zlib
+import numpy as np
+from text_index import tokenize
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+def shingles(text, size=3):
+    '''Hash the overlapping word n-grams of a text to 32 bit ints, short texts become one shingle'''
+    tokens = tokenize(text)
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    grams = [' '.join(tokens[i:i + size]) for i in range(max(len(tokens) - size + 1, 1))]
+    # crc32 rather than hash() so signatures are the same in every process
+    return np.unique(np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams)))
+
+class MinHasher:
+    '''MinHash signatures computed for all permutations at once with numpy
+
+    Each permutation is a universal hash (a * x + b) mod p over the 32 bit shingle hashes, the
+    signature keeps the minimum of each permutation. Two signatures agree on a position with
+    probability equal to the jaccard similarity of the shingle sets.
+    '''
+
+    def __init__(self, num_perm=64, seed=1):
+        generator = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = generator.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = generator.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        '''Signature of a text, None when it has no words'''
+        hashes = shingles(text)
+        if not hashes.size:
+            return None
+        # the product wraps at 2**64 which keeps it a (weaker but fine) universal hash, then fold into 32 bits
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=1).astype(np.uint32)
+
+class DuplicateIndex:
+    '''Locality sensitive hashing over MinHash signatures to find near-duplicate texts
+
+    Signatures are cut into `bands` bands, texts whose signatures are equal on any band share a
+    bucket and become candidates, so a lookup never compares against the whole corpus. Candidates
+    are kept only when their estimated jaccard similarity reaches the requested threshold.
+    With 64 permutations in 16 bands pairs above roughly 0.5 similarity are almost always found.
+    '''
+
+    def __init__(self, num_perm=64, bands=16):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ready = threading.Event()
+        self._signatures = {}
+        self._buckets = [dict() for _ in range(bands)]
+        self._changes = None # adds and removes made while a rebuild is reading, replayed onto its result
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def replace(self, docs):
+        '''Rebuild the whole index from (doc_id, text) pairs and mark it ready'''
+        with self._lock:
+            if self._changes is None: # begin_replace may have started recording already
+                self._changes = []
+
+        try:
+            signatures = {}
+            buckets = [dict() for _ in range(self.bands)]
+            for doc_id, text in docs:
+                signature = self.hasher.signature(text)
+                if signature is None:
+                    continue
+                signatures[doc_id] = signature
+                for band, key in enumerate(self._band_keys(signature)):
+                    buckets[band].setdefault(key, set()).add(doc_id)
+
+            with self._lock:
+                self._signatures = signatures
+                self._buckets = buckets
+                for doc_id, signature in self._changes:
+                    self._remove(doc_id)
+                    if signature is not None:
+                        self._add(doc_id, signature)
+        finally:
+            with self._lock:
+                self._changes = None
+        self.ready.set()
+
+    def begin_replace(self):
+        '''Start recording changes for a replace whose documents are read from now on'''
+        with self._lock:
+            if self._changes is None:
+                self._changes = []
+
+    def cancel_replace(self):
+        '''Stop recording after begin_replace when the replace will not happen'''
+        with self._lock:
+            self._changes = None
+
+    def add(self, doc_id, text):
+        '''Index a document, replacing its previous text if it was indexed'''
+        signature = self.hasher.signature(text)
+        with self._lock:
+            self._remove(doc_id)
+            if signature is not None:
+                self._add(doc_id, signature)
+            if self._changes is not None:
+                self._changes.append((doc_id, signature))
+
+    def remove(self, *doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+                if self._changes is not None:
+                    self._changes.append((doc_id, None))
+
+    def _add(self, doc_id, signature):
+        self._signatures[doc_id] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, set()).add(doc_id)
+
+    def _remove(self, doc_id):
+        signature = self._signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def _estimate(self, signature, doc_ids):
+        # share of agreeing positions against every candidate in one vectorized comparison
+        matrix = np.stack([self._signatures[doc_id] for doc_id in doc_ids])
+        return (matrix == signature).mean(axis=1)
+
+    def similar(self, text=None, doc_id=None, threshold=0.5, limit=50):
+        '''Documents similar to an indexed doc_id (or to a text), returns [(doc_id, similarity)] best first'''
+        with self._lock:
+            signature = self._signatures.get(doc_id) if doc_id is not None else None
+        if signature is None:
+            signature = self.hasher.signature(text or '')
+        if signature is None:
+            return []
+
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(key, ()))
+            candidates.discard(doc_id)
+            if not candidates:
+                return []
+            candidates = list(candidates)
+            estimates = self._estimate(signature, candidates)
+
+        matches = [(candidate, float(estimate)) for candidate, estimate in zip(candidates, estimates) if estimate >= threshold]
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:limit]
+
+    def clusters(self, threshold=0.7, min_size=3):
+        '''Group documents into near-duplicate clusters of at least min_size, largest first
+
+        Only documents sharing a bucket are compared, each member against the first document of
+        the bucket, so the work grows with the bucket sizes rather than the number of pairs.
+        '''
+        parent = {}
+
+        def find(doc_id):
+            root = doc_id
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while doc_id != root: # point the whole path at the root
+                parent[doc_id], doc_id = root, parent[doc_id]
+            return root
+
+        with self._lock:
+            for buckets in self._buckets:
+                for bucket in buckets.values():
+                    if len(bucket) < 2:
+                        continue
+                    members = sorted(bucket)
+                    first, rest = members[0], members[1:]
+                    estimates = self._estimate(self._signatures[first], rest)
+                    for member, estimate in zip(rest, estimates):
+                        if estimate >= threshold:
+                            root_first, root_member = find(first), find(member)
+                            if root_first != root_member:
+                                parent[root_member] = root_first
+
+        groups = {}
+        for doc_id in parent:
+            groups.setdefault(find(doc_id), []).append(doc_id)
+        for root, members in groups.items():
+            if root not in members:
+                members.append(root)
+
+        clusters = [sorted(members) for members in groups.values() if len(members) >= min_size]
+        clusters.sort(key=lambda members: (-len(members), members[0]))
+        return clusters
+
+    def __contains__(self, doc_id):
+        return doc_id in self._signatures
+
+    def __len__(self):
+        return len(self._signatures)
@@ -0,0 +1,95 @@
+# moderation.py
+import os
+from collections import deque
+
+def normalize(text):
+    '''Casefold and collapse runs of whitespace so "Buy  NOW" matches the phrase "buy now"'''
+    return ' '.join((text or '').casefold().split())
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+def load_phrases(path):
+    '''Read banned phrases from a text file, one per line, blank lines and # comments skipped'''
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as phrases_file:
+        return [line.strip() for line in phrases_file if line.strip() and not line.lstrip().startswith('#')]
+
+class PhraseMatcher:
+    '''Aho–Corasick automaton over a list of banned phrases
+
+    Scanning a text walks it once whatever the number of phrases, each state carries the
+    phrases that end there (including through its failure links). A match only counts when it
+    is not part of a longer word, so "ass" does not flag "class".
+    '''
+
+    def __init__(self, phrases):
+        self.phrases = list(dict.fromkeys(phrase for phrase in map(normalize, phrases) if phrase))
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for index, phrase in enumerate(self.phrases):
+            state = 0
+            for char in phrase:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        # failure links, breadth first so a state's fallback is always resolved before its children
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def __bool__(self):
+        return bool(self.phrases)
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def scan(self, text):
+        '''Return the sorted distinct phrases found in text'''
+        text = normalize(text)
+        found = set()
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+
+            for index in self._output[state]:
+                phrase = self.phrases[index]
+                start = position - len(phrase) + 1
+                if _is_word_char(phrase[0]) and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if _is_word_char(phrase[-1]) and position + 1 < len(text) and _is_word_char(text[position + 1]):
+                    continue
+                found.add(phrase)
+        return sorted(found)
+
+def review_item(kind, post_id, comment_id, user_id, content, matches):
+    '''Build a review queue entry, its id is derived from the flagged item so a rescan can't queue it twice'''
+    return {
+        'id': f'{kind}_{comment_id if kind == "comment" else post_id}',
+        'kind': kind,
+        'post_id': post_id,
+        'comment_id': comment_id,
+        'userId': user_id,
+        'content_preview': content[:200] + '...' if len(content) > 200 else content,
+        'matches': matches,
+        'status': 'pending'
+    }
@@ -0,0 +1,21 @@
+# pagination.py
+import base64
+import datetime
+import json
+
+def encode_cursor(created_at, doc_id):
+    '''Encode the (createdAt, id) of the last row of a page as an opaque url-safe cursor'''
+    if isinstance(created_at, datetime.datetime):
+        created_at = created_at.isoformat()
+
+    payload = json.dumps({'t': created_at, 'id': doc_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    '''Decode a cursor made by encode_cursor into (createdAt datetime, id), raises ValueError if it is malformed'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.datetime.fromisoformat(payload['t']), str(payload['id'])
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError('Invalid cursor') from e
@@ -0,0 +1,27 @@
+# projection.py
+
+# fields a client can ask for with ?fields= on each list, 'id' is always returned
+POST_FIELDS = ('userId', 'username', 'content', 'createdAt', 'editedAt', 'editedByAdmin', 'likeCount', 'commentCount')
+USER_FIELDS = ('username', 'email', 'friends', 'suspended', 'createdAt')
+LOG_FIELDS = ('admin_id', 'action_type', 'details', 'timestamp', 'ip_address')
+
+def parse_fields(value, allowed=None):
+    '''Parse a comma separated fields parameter into a tuple, None when it is absent
+
+    Raises ValueError for fields outside `allowed` (any field is accepted when it is None).
+    '''
+    if value is None or not value.strip():
+        return None
+
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    if allowed is not None:
+        unknown = [field for field in fields if field != 'id' and field not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(field for field in fields if field != 'id')
+
+def project(data, fields):
+    '''Keep the id and the requested fields of a dict, everything when fields is None'''
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key == 'id' or key in fields}
@@ -0,0 +1,46 @@
+# revocation.py
+import threading
+import time
+
+class RevocationSet:
+    '''In-process set of revoked admin ids
+
+    The set is replaced wholesale on every refresh so lookups never need a lock,
+    `loader` returns the revoked ids from the database. Until a refresh has succeeded, or
+    when the last one is older than max_age seconds, the set is not `fresh` and callers
+    have to check the database instead of trusting it.
+    '''
+
+    def __init__(self, loader, max_age=180):
+        self._loader = loader
+        self.max_age = max_age
+        self._revoked = frozenset()
+        self._loaded_at = None # monotonic time of the last successful refresh
+        self._lock = threading.Lock() # serialises writers only
+
+    def refresh(self):
+        revoked = frozenset(self._loader())
+        with self._lock:
+            self._revoked = revoked
+            self._loaded_at = time.monotonic()
+        return len(revoked)
+
+    @property
+    def fresh(self):
+        loaded_at = self._loaded_at
+        return loaded_at is not None and time.monotonic() - loaded_at <= self.max_age
+
+    def add(self, admin_id):
+        '''Revoke an admin locally straight away instead of waiting for the next refresh'''
+        with self._lock:
+            self._revoked = self._revoked | {admin_id}
+
+    def discard(self, admin_id):
+        with self._lock:
+            self._revoked = self._revoked - {admin_id}
+
+    def __contains__(self, admin_id):
+        return admin_id in self._revoked
+
+    def __len__(self):
+        return len(self._revoked)
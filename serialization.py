@@ -0,0 +1,59 @@
+# serialization.py
+import datetime
+import decimal
+import json
+import uuid
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # optional, the stdlib encoder is used without it
+    orjson = None
+
+def json_default(value):
+    '''Encode what json can't: datetimes (firestore's DatetimeWithNanoseconds included) as iso 8601, sets as lists
+
+    Services hand documents over with their timestamps as they were read, this is the one place
+    they become strings, for responses, etags and exports alike.
+    '''
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps(obj, sort_keys=False):
+    '''Encode obj to compact json bytes, with orjson when it is installed'''
+    if orjson is not None:
+        # orjson only encodes exact datetimes natively, their subclasses go through json_default
+        return orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+    return json.dumps(obj, default=json_default, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+class FastJSONProvider(DefaultJSONProvider):
+    '''Flask json provider backed by orjson, falls back to the stdlib encoder without it
+
+    Keys are not sorted: etags are computed separately (see make_etag), so the order of
+    the body does not matter and sorting a large list page is wasted work.
+    '''
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs: # formatting options (indent for debug output) need the stdlib encoder
+            kwargs.setdefault('default', json_default)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs) # pretty printing goes through the stdlib encoder
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype) # bytes straight to the body
@@ -0,0 +1,96 @@
+# sharded_counter.py
+from firebase_admin import firestore
+import datetime
+import random
+
+class ShardedCounter:
+    '''Running total for a metric spread over several shard documents
+
+    Layout in firestore:
+        counters/{name}/shards/{shard}          {'count': int}
+        counters/{name}/days/{YYYY-MM-DD}_{shard}  {'date': 'YYYY-MM-DD', 'count': int, 'updatedAt': timestamp}
+
+    Writes pick a random shard so concurrent increments don't contend on a single document,
+    reads sum the shards (totals) or aggregate the day buckets (totals for a time period).
+    '''
+
+    def __init__(self, db, name, num_shards=10):
+        self.db = db
+        self.name = name
+        self.num_shards = num_shards
+        self.ref = db.collection('counters').document(name)
+
+    @staticmethod
+    def day_key(when=None):
+        '''Get the day bucket key (YYYY-MM-DD) for a datetime, date, iso string or now'''
+        if when is None:
+            when = datetime.datetime.now(datetime.timezone.utc)
+        elif isinstance(when, str):
+            when = datetime.datetime.fromisoformat(when.replace('Z', '+00:00'))
+
+        if isinstance(when, datetime.datetime):
+            if when.tzinfo is not None:
+                when = when.astimezone(datetime.timezone.utc)
+            when = when.date()
+
+        return when.isoformat()
+
+    def _shard_ref(self, shard):
+        return self.ref.collection('shards').document(str(shard))
+
+    def _day_ref(self, day, shard):
+        return self.ref.collection('days').document(f'{day}_{shard}')
+
+    def increment(self, batch, amount=1, when=None):
+        '''Add an increment (or decrement) for a single day to a write batch'''
+        self.increment_by_day(batch, {self.day_key(when): amount})
+
+    def increment_by_day(self, batch, amounts):
+        '''Add increments for several days at once to a write batch, amounts maps day key -> delta'''
+        amounts = {day: amount for day, amount in amounts.items() if amount}
+        if not amounts:
+            return
+
+        shard = random.randrange(self.num_shards)
+        batch.set(self._shard_ref(shard), {
+            'count': firestore.Increment(sum(amounts.values()))
+        }, merge=True)
+
+        for day, amount in amounts.items():
+            batch.set(self._day_ref(day, shard), {
+                'date': day,
+                'count': firestore.Increment(amount),
+                'updatedAt': firestore.SERVER_TIMESTAMP # lets rollups find the days that changed
+            }, merge=True)
+
+    def total(self):
+        '''Read the running total by summing the shard documents'''
+        refs = [self._shard_ref(shard) for shard in range(self.num_shards)]
+        total = 0
+        for doc in self.db.get_all(refs, field_paths=['count']):
+            if doc.exists:
+                total += doc.to_dict().get('count', 0)
+        return total
+
+    def total_since(self, day):
+        '''Read the total for all day buckets from day (inclusive) onwards with a server-side sum'''
+        query = self.ref.collection('days').where('date', '>=', self.day_key(day))
+        results = query.sum('count', alias='total').get()
+        if not results:
+            return 0
+        return int(results[0][0].value or 0)
+
+    def clear(self):
+        '''Delete every shard and day bucket document of this counter'''
+        for collection in ('shards', 'days'):
+            batch = self.db.batch()
+            pending = 0
+            for doc in self.ref.collection(collection).select([]).stream():
+                batch.delete(doc.reference)
+                pending += 1
+                if pending == 500: # firestore batch limit
+                    batch.commit()
+                    batch = self.db.batch()
+                    pending = 0
+            if pending:
+                batch.commit()
@@ -0,0 +1,1488 @@
+# sqlite_service.py
+from storage_backend import StorageBackend
+from pagination import encode_cursor, decode_cursor
+from projection import project
+from user_index import normalize, search_summary
+from text_index import parse_query
+from moderation import PhraseMatcher, load_phrases, review_item
+from minhash import DuplicateIndex
+from contextlib import contextmanager
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    username TEXT NOT NULL,
+    password TEXT,
+    friends TEXT NOT NULL DEFAULT '[]',
+    following TEXT NOT NULL DEFAULT '[]',
+    followers_count INTEGER NOT NULL DEFAULT 0,
+    suspended INTEGER NOT NULL DEFAULT 0,
+    extra TEXT NOT NULL DEFAULT '{}',
+    createdAt TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+CREATE INDEX IF NOT EXISTS users_username_lower ON users (lower(username));
+CREATE INDEX IF NOT EXISTS users_email_lower ON users (lower(email));
+CREATE INDEX IF NOT EXISTS users_created ON users (createdAt, id);
+
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    userId TEXT NOT NULL,
+    username TEXT NOT NULL,
+    content TEXT NOT NULL,
+    createdAt TEXT NOT NULL,
+    editedAt TEXT,
+    editedByAdmin INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS posts_created ON posts (createdAt, id);
+CREATE INDEX IF NOT EXISTS posts_user_created ON posts (userId, createdAt, id);
+
+-- full-text index over post content, kept current by triggers. It is keyed on the posts rowid,
+-- which VACUUM can renumber, so run rebuild_post_index after a VACUUM
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5 (content, content='posts', content_rowid='rowid');
+CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts (rowid, content) VALUES (new.rowid, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF content ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+    INSERT INTO posts_fts (rowid, content) VALUES (new.rowid, new.content);
+END;
+
+CREATE TABLE IF NOT EXISTS likes (
+    post_id TEXT NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    user_id TEXT NOT NULL,
+    createdAt TEXT NOT NULL,
+    PRIMARY KEY (post_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS likes_user ON likes (user_id);
+
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    post_id TEXT NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    userId TEXT NOT NULL,
+    username TEXT NOT NULL,
+    content TEXT NOT NULL,
+    createdAt TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_post_created ON comments (post_id, createdAt, id);
+CREATE INDEX IF NOT EXISTS comments_user ON comments (userId);
+CREATE INDEX IF NOT EXISTS comments_created ON comments (createdAt);
+
+CREATE TABLE IF NOT EXISTS admins (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    revoked INTEGER NOT NULL DEFAULT 0,
+    revokedAt TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS admins_email ON admins (email);
+
+CREATE TABLE IF NOT EXISTS admin_logs (
+    id TEXT PRIMARY KEY,
+    admin_id TEXT NOT NULL,
+    action_type TEXT NOT NULL,
+    details TEXT NOT NULL DEFAULT '{}',
+    timestamp TEXT NOT NULL,
+    ip_address TEXT
+);
+-- keyset pagination needs id in each index, these replace the older (admin_id, timestamp) style ones
+DROP INDEX IF EXISTS admin_logs_timestamp;
+DROP INDEX IF EXISTS admin_logs_admin;
+CREATE INDEX IF NOT EXISTS admin_logs_time ON admin_logs (timestamp, id);
+CREATE INDEX IF NOT EXISTS admin_logs_admin_time ON admin_logs (admin_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS admin_logs_action_time ON admin_logs (action_type, timestamp, id);
+CREATE INDEX IF NOT EXISTS admin_logs_user_time ON admin_logs (json_extract(details, '$.user_id'), timestamp, id);
+CREATE INDEX IF NOT EXISTS admin_logs_post_time ON admin_logs (json_extract(details, '$.post_id'), timestamp, id);
+
+CREATE TABLE IF NOT EXISTS moderation_queue (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    comment_id TEXT,
+    userId TEXT,
+    content_preview TEXT NOT NULL,
+    matches TEXT NOT NULL DEFAULT '[]',
+    status TEXT NOT NULL,
+    createdAt TEXT NOT NULL,
+    resolvedAt TEXT,
+    resolvedBy TEXT
+);
+CREATE INDEX IF NOT EXISTS moderation_queue_status_created ON moderation_queue (status, createdAt, id);
+
+CREATE TABLE IF NOT EXISTS admin_jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    admin_id TEXT,
+    params TEXT NOT NULL DEFAULT '{}',
+    progress TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    createdAt TEXT NOT NULL,
+    heartbeatAt TEXT,
+    startedAt TEXT,
+    finishedAt TEXT
+);
+'''
+
+# users columns that update_user_profile writes directly, anything else goes into the extra json
+USER_COLUMNS = ('email', 'username', 'suspended', 'followers_count')
+USER_SUMMARY_COLUMNS = 'id, username, email, friends, suspended, createdAt'
+
+# the indexed expression behind each StorageBackend.LOG_FILTERS filter
+LOG_FILTER_COLUMNS = {
+    'admin_id': 'admin_id',
+    'action_type': 'action_type',
+    'user_id': "json_extract(details, '$.user_id')",
+    'post_id': "json_extract(details, '$.post_id')"
+}
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+def _new_id():
+    return uuid.uuid4().hex
+
+def _preview(text):
+    return text[:50] + '...' if len(text) > 50 else text
+
+class SQLiteService(StorageBackend):
+    '''StorageBackend backed by a local sqlite database
+
+    Meant for local load tests and small deployments, every query is served from an index.
+    Each thread gets its own connection, writes that read before they write run in
+    BEGIN IMMEDIATE transactions so they can't interleave.
+    '''
+
+    def __init__(self, path='admin.db'):
+        self.path = path
+        self._local = threading.local()
+        self.moderation_phrases_path = os.environ.get('MODERATION_PHRASES_PATH', 'banned_phrases.txt')
+        self.moderation = PhraseMatcher(load_phrases(self.moderation_phrases_path))
+        self.duplicate_index = DuplicateIndex() # built from the posts table on first use
+        self._duplicate_index_lock = threading.Lock()
+        has_search_index = self._query_one("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'") is not None
+        self._conn().executescript(SCHEMA)
+        if not has_search_index: # posts written before the index existed
+            self.rebuild_post_index()
+        job_columns = {row['name'] for row in self._conn().execute('PRAGMA table_info(admin_jobs)')}
+        if 'heartbeatAt' not in job_columns: # databases created before job heartbeats
+            self._conn().execute('ALTER TABLE admin_jobs ADD COLUMN heartbeatAt TEXT')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+    def _query(self, sql, params=()):
+        return self._conn().execute(sql, params).fetchall()
+
+    def _query_one(self, sql, params=()):
+        return self._conn().execute(sql, params).fetchone()
+
+    def _iter_pages(self, sql, params=(), page_size=500):
+        '''Yield the rows of a query in lists of page_size without loading them all'''
+        cursor = self._conn().execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            cursor.close()
+
+    def _paginate(self, table, where, params, limit, cursor=None, start_after=None, columns='*', order='desc', order_field='createdAt'):
+        '''Fetch one page of rows in order_field order (newest first by default), returns (rows, next_cursor)
+
+        Same contract as FirebaseService._paginate, an opaque cursor becomes a keyset condition
+        on the (order_field, id) index and start_after is the older row id style cursor.
+        '''
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'")
+
+        comparison = '<' if order == 'desc' else '>'
+        conditions = [where] if where else []
+        params = list(params)
+
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            conditions.append(f'({order_field}, id) {comparison} (?, ?)')
+            params += [created_at.isoformat(), row_id]
+        elif start_after:
+            last_row = self._query_one(f'SELECT {order_field}, id FROM {table} WHERE id = ?', (start_after,))
+            if last_row:
+                conditions.append(f'({order_field}, id) {comparison} (?, ?)')
+                params += [last_row[order_field], last_row['id']]
+
+        sql = f'SELECT {columns} FROM {table}'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        direction = order.upper()
+        rows = self._query(sql + f' ORDER BY {order_field} {direction}, id {direction} LIMIT ?', params + [limit + 1])
+
+        if len(rows) <= limit:
+            return rows, None
+
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1][order_field], rows[-1]['id'])
+
+    # Row conversion helpers
+
+    def _user_summary(self, row, fields=None):
+        return project({
+            'id': row['id'],
+            'username': row['username'],
+            'email': row['email'],
+            'friends': len(json.loads(row['friends'])),
+            'suspended': bool(row['suspended']),
+            'createdAt': row['createdAt']
+        }, fields)
+
+    def _log_dict(self, row):
+        return {
+            'id': row['id'],
+            'admin_id': row['admin_id'],
+            'action_type': row['action_type'],
+            'details': json.loads(row['details']),
+            'timestamp': row['timestamp'],
+            'ip_address': row['ip_address']
+        }
+
+    def _user_dict(self, row):
+        user_data = json.loads(row['extra'])
+        user_data.update({
+            'id': row['id'],
+            'email': row['email'],
+            'username': row['username'],
+            'friends': json.loads(row['friends']),
+            'createdAt': row['createdAt']
+        })
+        if row['suspended']:
+            user_data['suspended'] = True
+        if row['following'] != '[]':
+            user_data['following'] = json.loads(row['following'])
+        if row['followers_count']:
+            user_data['followers_count'] = row['followers_count']
+        if row['updated_at']:
+            user_data['updated_at'] = row['updated_at']
+        return user_data
+
+    def _comment_dict(self, row):
+        return {
+            'id': row['id'],
+            'userId': row['userId'],
+            'username': row['username'],
+            'content': row['content'],
+            'createdAt': row['createdAt']
+        }
+
+    def _post_dicts(self, rows, summary=False):
+        '''Convert post rows to the firestore post shape with like and comment counts
+
+        Full posts also embed the ids of the users who liked them, summaries (used by the
+        list endpoints) only carry the counts.
+        '''
+        if not rows:
+            return []
+
+        post_ids = [row['id'] for row in rows]
+        placeholders = ','.join('?' * len(post_ids))
+
+        likes = {post_id: [] for post_id in post_ids}
+        if summary:
+            like_counts = {
+                row['post_id']: row['count']
+                for row in self._query(f'SELECT post_id, COUNT(*) AS count FROM likes WHERE post_id IN ({placeholders}) GROUP BY post_id', post_ids)
+            }
+        else:
+            for like in self._query(f'SELECT post_id, user_id FROM likes WHERE post_id IN ({placeholders}) ORDER BY createdAt', post_ids):
+                likes[like['post_id']].append(like['user_id'])
+            like_counts = {post_id: len(user_ids) for post_id, user_ids in likes.items()}
+
+        comment_counts = {
+            row['post_id']: row['count']
+            for row in self._query(f'SELECT post_id, COUNT(*) AS count FROM comments WHERE post_id IN ({placeholders}) GROUP BY post_id', post_ids)
+        }
+
+        posts = []
+        for row in rows:
+            post_data = {
+                'id': row['id'],
+                'userId': row['userId'],
+                'username': row['username'],
+                'content': row['content'],
+                'likeCount': like_counts.get(row['id'], 0),
+                'commentCount': comment_counts.get(row['id'], 0),
+                'createdAt': row['createdAt']
+            }
+            if not summary:
+                post_data['likes'] = likes[row['id']]
+            if row['editedAt']:
+                post_data['editedAt'] = row['editedAt']
+                post_data['editedByAdmin'] = bool(row['editedByAdmin'])
+            posts.append(post_data)
+        return posts
+
+    def _admin_dict(self, row):
+        admin_data = {
+            'id': row['id'],
+            'email': row['email'],
+            'name': row['name'],
+            'created_at': row['created_at'],
+            'revoked': bool(row['revoked'])
+        }
+        if row['revokedAt']:
+            admin_data['revokedAt'] = row['revokedAt']
+        return admin_data
+
+    # Authentication Methods
+
+    def register_user(self, email, password, username):
+        try:
+            if self._query_one('SELECT 1 FROM users WHERE email = ?', (email,)):
+                raise Exception('User with this email already exists')
+
+            user_id = _new_id()
+            with self._transaction() as conn:
+                conn.execute(
+                    'INSERT INTO users (id, email, username, password, createdAt) VALUES (?, ?, ?, ?, ?)',
+                    (user_id, email, username, hashlib.sha256(password.encode()).hexdigest(), _now())
+                )
+
+            return {
+                'uid': user_id,
+                'email': email,
+                'displayName': username
+            }
+        except Exception as e:
+            print(f"Error in register_user: {e}")
+            raise e
+
+    def login_user(self, email, password):
+        try:
+            row = self._query_one('SELECT id, email, username, password FROM users WHERE email = ?', (email,))
+
+            if not row:
+                raise Exception("User not found")
+
+            if row['password'] and row['password'] != hashlib.sha256(password.encode()).hexdigest():
+                raise Exception("Invalid credentials")
+
+            return {
+                'uid': row['id'],
+                'email': row['email'],
+                'displayName': row['username']
+            }
+        except Exception as e:
+            print(f"Error in login_user: {e}")
+            raise e
+
+    # User Methods
+
+    def get_user_profile(self, user_id):
+        try:
+            row = self._query_one('SELECT * FROM users WHERE id = ?', (user_id,))
+
+            if not row:
+                raise Exception("User not found")
+
+            return self._user_dict(row)
+        except Exception as e:
+            print(f"Error in get_user_profile: {e}")
+            raise e
+
+    def get_user_posts(self, user_id, limit=50, cursor=None, order='desc', fields=None):
+        '''Get a page of the posts created by a specific user'''
+        try:
+            rows, next_cursor = self._paginate('posts', 'userId = ?', (user_id,), limit, cursor=cursor, order=order)
+
+            return {
+                'posts': [project(post_data, fields) for post_data in self._post_dicts(rows, summary=True)],
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        except Exception as e:
+            print(f'Error in get_user_posts: {e}')
+            raise e
+
+    def search_users(self, search_term):
+        try:
+            rows = self._query(
+                'SELECT * FROM users WHERE username >= ? AND username <= ? ORDER BY username LIMIT 10',
+                (search_term, search_term + '\uf8ff')
+            )
+            return [self._user_dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error in search_users: {e}")
+            raise e
+
+    def admin_search_users(self, search_term, limit=20):
+        '''Find users whose username or email starts with search_term, ignoring case
+
+        Served by range scans on the lower(username) and lower(email) indexes.
+        '''
+        try:
+            prefix = normalize(search_term)
+            if not prefix:
+                return []
+
+            users = {}
+            for column in ('username', 'email'):
+                rows = self._query(
+                    f'SELECT id, username, email, suspended FROM users WHERE lower({column}) >= ? AND lower({column}) < ? ORDER BY lower({column}) LIMIT ?',
+                    (prefix, prefix + '\uffff', limit)
+                )
+                for row in rows:
+                    users.setdefault(row['id'], search_summary(row['id'], {**dict(row), 'suspended': bool(row['suspended'])}))
+            return list(users.values())[:limit]
+        except Exception as e:
+            print(f'Error in admin_search_users: {e}')
+            raise e
+
+    # Friend Methods
+
+    def _update_json_list(self, conn, user_id, column, add=None, remove=None):
+        row = conn.execute(f'SELECT {column} FROM users WHERE id = ?', (user_id,)).fetchone()
+        if not row:
+            raise Exception("User not found")
+
+        values = json.loads(row[column])
+        if add is not None and add not in values:
+            values.append(add)
+        if remove is not None and remove in values:
+            values.remove(remove)
+
+        conn.execute(f'UPDATE users SET {column} = ? WHERE id = ?', (json.dumps(values), user_id))
+        return values
+
+    def add_friend(self, user_id, friend_id):
+        try:
+            with self._transaction() as conn:
+                self._update_json_list(conn, user_id, 'friends', add=friend_id)
+                self._update_json_list(conn, friend_id, 'friends', add=user_id)
+            return True
+        except Exception as e:
+            print(f"Error in add_friend: {e}")
+            raise e
+
+    def remove_friend(self, user_id, friend_id):
+        try:
+            with self._transaction() as conn:
+                self._update_json_list(conn, user_id, 'friends', remove=friend_id)
+                self._update_json_list(conn, friend_id, 'friends', remove=user_id)
+            return True
+        except Exception as e:
+            print(f"Error in remove_friend: {e}")
+            raise e
+
+    def toggle_follow(self, follower_id, target_user_id):
+        try:
+            with self._transaction() as conn:
+                row = conn.execute('SELECT following FROM users WHERE id = ?', (follower_id,)).fetchone()
+                if not row:
+                    raise Exception("Follower user not found")
+
+                if target_user_id in json.loads(row['following']):
+                    # Unfollow
+                    self._update_json_list(conn, follower_id, 'following', remove=target_user_id)
+                    conn.execute('UPDATE users SET followers_count = followers_count - 1 WHERE id = ?', (target_user_id,))
+                    return False
+
+                # Follow
+                self._update_json_list(conn, follower_id, 'following', add=target_user_id)
+                conn.execute('UPDATE users SET followers_count = followers_count + 1 WHERE id = ?', (target_user_id,))
+                return True
+        except Exception as e:
+            print(f"Error in toggle_follow: {e}")
+            raise e
+
+    def update_user_profile(self, user_id, updates):
+        try:
+            with self._transaction() as conn:
+                row = conn.execute('SELECT extra FROM users WHERE id = ?', (user_id,)).fetchone()
+                if not row:
+                    raise Exception("User not found")
+
+                columns = {key: value for key, value in updates.items() if key in USER_COLUMNS}
+                extra = json.loads(row['extra'])
+                extra.update({key: value for key, value in updates.items() if key not in USER_COLUMNS})
+                columns['extra'] = json.dumps(extra)
+                columns['updated_at'] = _now()
+
+                assignments = ', '.join(f'{column} = ?' for column in columns)
+                conn.execute(f'UPDATE users SET {assignments} WHERE id = ?', (*columns.values(), user_id))
+            return True
+        except Exception as e:
+            print(f"Error in update_user_profile: {e}")
+            raise e
+
+    # Post Methods
+
+    def create_post(self, user_id, content):
+        try:
+            user = self.get_user_profile(user_id)
+            post_id = _new_id()
+
+            with self._transaction() as conn:
+                conn.execute(
+                    'INSERT INTO posts (id, userId, username, content, createdAt) VALUES (?, ?, ?, ?, ?)',
+                    (post_id, user_id, user['username'], content, _now())
+                )
+                self._moderate(conn, 'post', post_id, None, user_id, content)
+            self.duplicate_index.add(post_id, content)
+
+            return post_id
+        except Exception as e:
+            print(f"Error in create_post: {e}")
+            raise e
+
+    def get_friends_posts(self, user_id):
+        try:
+            row = self._query_one('SELECT friends FROM users WHERE id = ?', (user_id,))
+            friends = json.loads(row['friends']) if row else []
+
+            # Include user's own posts
+            friends.append(user_id)
+            placeholders = ','.join('?' * len(friends))
+
+            rows = self._query(
+                f'SELECT * FROM posts WHERE userId IN ({placeholders}) ORDER BY createdAt DESC, id DESC LIMIT 20',
+                friends
+            )
+            return self._post_dicts(rows)
+        except Exception as e:
+            print(f"Error in get_friends_posts: {e}")
+            raise e
+
+    # Like Methods
+
+    def toggle_like(self, post_id, user_id):
+        try:
+            with self._transaction() as conn:
+                if not conn.execute('SELECT 1 FROM posts WHERE id = ?', (post_id,)).fetchone():
+                    raise Exception("Post not found")
+
+                deleted = conn.execute('DELETE FROM likes WHERE post_id = ? AND user_id = ?', (post_id, user_id)).rowcount
+                if deleted:
+                    return False
+
+                conn.execute('INSERT INTO likes (post_id, user_id, createdAt) VALUES (?, ?, ?)', (post_id, user_id, _now()))
+                return True
+        except Exception as e:
+            print(f"Error in toggle_like: {e}")
+            raise e
+
+    def add_comment(self, post_id, user_id, content):
+        try:
+            user = self.get_user_profile(user_id)
+
+            comment = {
+                'id': str(uuid.uuid4()),
+                'userId': user_id,
+                'username': user['username'],
+                'content': content,
+                'createdAt': _now()
+            }
+
+            with self._transaction() as conn:
+                if not conn.execute('SELECT 1 FROM posts WHERE id = ?', (post_id,)).fetchone():
+                    raise Exception("Post not found")
+
+                conn.execute(
+                    'INSERT INTO comments (id, post_id, userId, username, content, createdAt) VALUES (?, ?, ?, ?, ?, ?)',
+                    (comment['id'], post_id, user_id, comment['username'], content, comment['createdAt'])
+                )
+                self._moderate(conn, 'comment', post_id, comment['id'], user_id, content)
+
+            return comment
+        except Exception as e:
+            print(f"Error in add_comment: {e}")
+            raise e
+
+    def get_like_details(self, post_id, limit=None, offset=0):
+        try:
+            if not self._query_one('SELECT 1 FROM posts WHERE id = ?', (post_id,)):
+                raise Exception("Post not found")
+
+            rows = self._query(
+                'SELECT likes.user_id, users.username FROM likes JOIN users ON users.id = likes.user_id '
+                'WHERE likes.post_id = ? ORDER BY likes.createdAt LIMIT ? OFFSET ?',
+                (post_id, -1 if limit is None else limit, offset)
+            )
+            return [{'userId': row['user_id'], 'username': row['username']} for row in rows]
+        except Exception as e:
+            print(f"Error in get_like_details: {e}")
+            raise e
+
+    def get_post(self, post_id):
+        try:
+            row = self._query_one('SELECT * FROM posts WHERE id = ?', (post_id,))
+
+            if not row:
+                raise Exception("Post not found")
+
+            return self._post_dicts([row])[0]
+        except Exception as e:
+            print(f"Error in get_post: {e}")
+            raise e
+
+    def get_feed(self, user_id, last_post=None, cursor=None):
+        try:
+            rows, next_cursor = self._paginate('posts', None, (), 10, cursor=cursor, start_after=last_post)
+            posts = self._post_dicts(rows)
+
+            return {
+                'posts': posts,
+                'last_post': posts[-1]['id'] if posts else None,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        except Exception as e:
+            print(f"Error in get_feed: {e}")
+            raise e
+
+    def get_comments(self, post_id, last_comment=None, cursor=None):
+        try:
+            rows, next_cursor = self._paginate('comments', 'post_id = ?', (post_id,), 20, cursor=cursor, start_after=last_comment)
+            comments = [self._comment_dict(row) for row in rows]
+
+            return {
+                'comments': comments,
+                'last_comment': comments[-1]['id'] if comments else None,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        except Exception as e:
+            print(f"Error in get_comments: {e}")
+            raise e
+
+    def check_like_status(self, post_id, user_id):
+        try:
+            return self._query_one('SELECT 1 FROM likes WHERE post_id = ? AND user_id = ?', (post_id, user_id)) is not None
+        except Exception as e:
+            print(f"Error in check_like_status: {e}")
+            raise e
+
+    # Admin auth methods
+
+    def register_admin(self, email, password, name):
+        '''Register a new admin user'''
+        try:
+            admin_id = _new_id()
+            hashed_password = hashlib.sha256(password.encode()).hexdigest() # same hashing as the firestore backend
+
+            with self._transaction() as conn:
+                if conn.execute('SELECT 1 FROM admins WHERE email = ?', (email,)).fetchone():
+                    raise Exception('Admin with this email already exists')
+
+                conn.execute(
+                    'INSERT INTO admins (id, email, password, name, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (admin_id, email, hashed_password, name, _now())
+                )
+
+            self.log_admin_action(admin_id, 'ADMIN_CREATED', {
+                'admin_email': email
+            })
+
+            return {
+                'id': admin_id,
+                'email': email,
+                'name': name
+            }
+        except Exception as e:
+            print(f'Error in register_admin: {e}')
+            raise(e)
+
+    def login_admin(self, email, password):
+        '''Authenticate an admin user'''
+        try:
+            row = self._query_one('SELECT * FROM admins WHERE email = ?', (email,))
+
+            if not row:
+                return None
+
+            if row['password'] != hashlib.sha256(password.encode()).hexdigest(): # check password
+                return None
+
+            if row['revoked']: # disabled admins can't log in
+                return None
+
+            return self._admin_dict(row)
+        except Exception as e:
+            print(f'Error in login_admin: {e}')
+            raise(e)
+
+    def get_admin(self, admin_id):
+        '''Get admin by id'''
+        try:
+            row = self._query_one('SELECT * FROM admins WHERE id = ?', (admin_id,))
+            return self._admin_dict(row) if row else None
+        except Exception as e:
+            print(f'Error in get_admin: {e}')
+            raise(e)
+
+    def get_revoked_admin_ids(self):
+        '''Get the ids of all admins whose access has been revoked'''
+        try:
+            return [row['id'] for row in self._query('SELECT id FROM admins WHERE revoked = 1')]
+        except Exception as e:
+            print(f'Error in get_revoked_admin_ids: {e}')
+            raise(e)
+
+    def set_admin_revoked(self, admin_id, revoked=True, acting_admin_id=None):
+        '''Revoke or restore an admin's access'''
+        try:
+            with self._transaction() as conn:
+                row = conn.execute('SELECT email FROM admins WHERE id = ?', (admin_id,)).fetchone()
+                if not row:
+                    raise Exception('Admin not found')
+
+                conn.execute(
+                    'UPDATE admins SET revoked = ?, revokedAt = ? WHERE id = ?',
+                    (int(bool(revoked)), _now() if revoked else None, admin_id)
+                )
+
+            if acting_admin_id:
+                action_type = 'ADMIN_REVOKED' if revoked else 'ADMIN_RESTORED'
+                self.log_admin_action(acting_admin_id, action_type, {
+                    'target_admin_id': admin_id,
+                    'admin_email': row['email']
+                })
+
+            return True
+        except Exception as e:
+            print(f'Error in set_admin_revoked: {e}')
+            raise(e)
+
+    # User management methods
+
+    def get_all_users(self, limit=50, start_after=None, cursor=None, fields=None):
+        '''Get all users with basic info, or only the requested fields of it'''
+        try:
+            rows, next_cursor = self._paginate(
+                'users', None, (), limit, cursor=cursor, start_after=start_after,
+                columns=USER_SUMMARY_COLUMNS
+            )
+
+            users = [self._user_summary(row, fields) for row in rows]
+
+            return {
+                'users': users,
+                'last_user': users[-1]['id'] if users else None,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        except Exception as e:
+            print(f'Error in get_all_users: {e}')
+            raise(e)
+
+    def delete_user(self, user_id, admin_id=None, progress=None):
+        '''Delete a user, their posts, and their comments and likes on other posts'''
+        try:
+            with self._transaction() as conn:
+                user = conn.execute('SELECT username, email FROM users WHERE id = ?', (user_id,)).fetchone()
+                if not user:
+                    raise Exception('User not found')
+
+                post_ids = [row['id'] for row in conn.execute('SELECT id FROM posts WHERE userId = ?', (user_id,))]
+
+                # likes and comments on the posts go with them through ON DELETE CASCADE
+                counts = {
+                    'posts_deleted': conn.execute('DELETE FROM posts WHERE userId = ?', (user_id,)).rowcount,
+                    'comments_deleted': conn.execute('DELETE FROM comments WHERE userId = ?', (user_id,)).rowcount,
+                    'likes_removed': conn.execute('DELETE FROM likes WHERE user_id = ?', (user_id,)).rowcount
+                }
+                conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+            self.duplicate_index.remove(*post_ids)
+
+            if progress:
+                progress(dict(counts, failed=0))
+
+            # log action
+            if admin_id:
+                self.log_admin_action(admin_id, 'USER_DELETED', {
+                    'user_id': user_id,
+                    'username': user['username'],
+                    'email': user['email'],
+                    **counts
+                })
+
+            return dict(counts, success=True)
+        except Exception as e:
+            print(f'Error in delete_user: {e}')
+            raise e
+
+    def suspend_user(self, user_id, suspended=True, admin_id=None):
+        '''Suspend or unsuspend a user account'''
+        try:
+            with self._transaction() as conn:
+                user = conn.execute('SELECT username, email FROM users WHERE id = ?', (user_id,)).fetchone()
+                if not user:
+                    raise Exception('User not found')
+
+                conn.execute('UPDATE users SET suspended = ? WHERE id = ?', (int(bool(suspended)), user_id))
+
+            if admin_id:
+                action_type = 'USER_SUSPENDED' if suspended else 'USER_UNSUSPENDED'
+                self.log_admin_action(admin_id, action_type, {
+                    'user_id': user_id,
+                    'username': user['username'],
+                    'email': user['email']
+                })
+
+            return True
+        except Exception as e:
+            print(f'Error in suspend_user: {e}')
+            raise e
+
+    # Post Management methods
+
+    def get_all_posts(self, limit=50, start_after=None, cursor=None, fields=None):
+        '''Get all posts with a specific limit'''
+        try:
+            rows, next_cursor = self._paginate('posts', None, (), limit, cursor=cursor, start_after=start_after)
+            posts = [project(post_data, fields) for post_data in self._post_dicts(rows, summary=True)]
+
+            return {
+                'posts': posts,
+                'last_post': posts[-1]['id'] if posts else None,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        except Exception as e:
+            print(f'Error in get_all_posts: {e}')
+            raise e
+
+    def delete_post(self, post_id, admin_id=None):
+        '''Delete a specified post'''
+        try:
+            with self._transaction() as conn:
+                post = conn.execute('SELECT userId, content FROM posts WHERE id = ?', (post_id,)).fetchone()
+                if not post:
+                    raise Exception('Post not found')
+
+                conn.execute('DELETE FROM posts WHERE id = ?', (post_id,))
+            self.duplicate_index.remove(post_id)
+
+            if admin_id:
+                self.log_admin_action(admin_id, 'POST_DELETED', {
+                    'post_id': post_id,
+                    'user_id': post['userId'],
+                    'content_preview': _preview(post['content'])
+                })
+
+            return True
+        except Exception as e:
+            print(f'Error in delete_post: {e}')
+            raise e
+
+    def update_post_content(self, post_id, new_content, admin_id=None):
+        '''Update a post's content'''
+        try:
+            with self._transaction() as conn:
+                post = conn.execute('SELECT userId, content FROM posts WHERE id = ?', (post_id,)).fetchone()
+                if not post:
+                    raise Exception('Post not found')
+
+                conn.execute(
+                    'UPDATE posts SET content = ?, editedAt = ?, editedByAdmin = 1 WHERE id = ?',
+                    (new_content, _now(), post_id)
+                )
+                self._moderate(conn, 'post', post_id, None, post['userId'], new_content)
+            self.duplicate_index.add(post_id, new_content)
+
+            if admin_id:
+                self.log_admin_action(admin_id, 'POST_EDITED', {
+                    'post_id': post_id,
+                    'old_content_preview': _preview(post['content']),
+                    'new_content_preview': _preview(new_content)
+                })
+
+            return True
+        except Exception as e:
+            print(f'Error in update_post_content: {e}')
+            raise e
+
+    def delete_comment(self, post_id, comment_id, admin_id=None):
+        '''Delete a comment from a post'''
+        try:
+            with self._transaction() as conn:
+                if not conn.execute('SELECT 1 FROM posts WHERE id = ?', (post_id,)).fetchone():
+                    raise Exception('Post not found')
+
+                comment = conn.execute(
+                    'SELECT userId, content FROM comments WHERE id = ? AND post_id = ?',
+                    (comment_id, post_id)
+                ).fetchone()
+                if not comment:
+                    raise Exception('Comment not found')
+
+                conn.execute('DELETE FROM comments WHERE id = ?', (comment_id,))
+
+            if admin_id:
+                self.log_admin_action(admin_id, 'COMMENT_DELETED', {
+                    'post_id': post_id,
+                    'comment_id': comment_id,
+                    'user_id': comment['userId'],
+                    'content_preview': _preview(comment['content'])
+                })
+
+            return True
+        except Exception as e:
+            print(f'Error in delete_comment: {e}')
+            raise e
+
+    def bulk_delete_posts(self, post_ids, admin_id=None):
+        '''Delete many posts and write their audit entries in one transaction'''
+        try:
+            post_ids = list(dict.fromkeys(post_ids))
+            placeholders = ', '.join('?' * len(post_ids))
+
+            with self._transaction() as conn:
+                found = {
+                    row['id']: row
+                    for row in conn.execute(f'SELECT id, userId, content FROM posts WHERE id IN ({placeholders})', post_ids)
+                }
+                deleted = [post_id for post_id in post_ids if post_id in found]
+
+                conn.executemany('DELETE FROM posts WHERE id = ?', [(post_id,) for post_id in deleted])
+                if admin_id:
+                    now = _now()
+                    conn.executemany(
+                        'INSERT INTO admin_logs (id, admin_id, action_type, details, timestamp, ip_address) VALUES (?, ?, ?, ?, ?, ?)',
+                        [(_new_id(), admin_id, 'POST_DELETED', json.dumps({
+                            'post_id': post_id,
+                            'user_id': found[post_id]['userId'],
+                            'content_preview': _preview(found[post_id]['content'])
+                        }), now, None) for post_id in deleted]
+                    )
+            self.duplicate_index.remove(*deleted)
+
+            return {
+                'deleted': deleted,
+                'not_found': [post_id for post_id in post_ids if post_id not in found]
+            }
+        except Exception as e:
+            print(f'Error in bulk_delete_posts: {e}')
+            raise e
+
+    def bulk_delete_comments(self, comments, admin_id=None):
+        '''Delete many comments given as [{'post_id', 'comment_id'}] in one transaction'''
+        try:
+            requested = list(dict.fromkeys((comment['post_id'], comment['comment_id']) for comment in comments))
+            placeholders = ', '.join('?' * len(requested))
+
+            with self._transaction() as conn:
+                found = {
+                    (row['post_id'], row['id']): row
+                    for row in conn.execute(
+                        f'SELECT id, post_id, userId, content FROM comments WHERE id IN ({placeholders})',
+                        [comment_id for _, comment_id in requested]
+                    )
+                }
+                deleted = [key for key in requested if key in found]
+
+                conn.executemany('DELETE FROM comments WHERE id = ?', [(comment_id,) for _, comment_id in deleted])
+                if admin_id:
+                    now = _now()
+                    conn.executemany(
+                        'INSERT INTO admin_logs (id, admin_id, action_type, details, timestamp, ip_address) VALUES (?, ?, ?, ?, ?, ?)',
+                        [(_new_id(), admin_id, 'COMMENT_DELETED', json.dumps({
+                            'post_id': post_id,
+                            'comment_id': comment_id,
+                            'user_id': found[(post_id, comment_id)]['userId'],
+                            'content_preview': _preview(found[(post_id, comment_id)]['content'])
+                        }), now, None) for post_id, comment_id in deleted]
+                    )
+
+            return {
+                'deleted': [{'post_id': post_id, 'comment_id': comment_id} for post_id, comment_id in deleted],
+                'not_found': [{'post_id': post_id, 'comment_id': comment_id} for post_id, comment_id in requested if (post_id, comment_id) not in found]
+            }
+        except Exception as e:
+            print(f'Error in bulk_delete_comments: {e}')
+            raise e
+
+    def migrate_embedded_comments(self, progress=None):
+        '''Comments always have their own table here, there is nothing to migrate'''
+        return {'posts_migrated': 0, 'comments_migrated': 0, 'posts_skipped': 0}
+
+    # Post search methods
+
+    def rebuild_post_index(self, progress=None):
+        '''Rebuild the full-text index from the posts table, returns {'posts_indexed'}'''
+        try:
+            with self._transaction() as conn:
+                conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+                return {'posts_indexed': conn.execute('SELECT COUNT(*) FROM posts').fetchone()[0]}
+        except Exception as e:
+            print(f'Error in rebuild_post_index: {e}')
+            raise e
+
+    def search_posts(self, query, limit=20, offset=0, fields=None):
+        '''Rank posts whose content matches query with fts5 bm25, returns {'posts', 'total', 'has_more'}'''
+        try:
+            phrases = parse_query(query)
+            if not phrases:
+                return {'posts': [], 'total': 0, 'has_more': False}
+
+            # every phrase quoted, fts5 ands them together, tokens are \w+ so they hold no quotes
+            match = ' '.join('"' + ' '.join(phrase) + '"' for phrase in phrases)
+            total = self._query_one('SELECT COUNT(*) FROM posts_fts WHERE posts_fts MATCH ?', (match,))[0]
+            rows = self._query(
+                'SELECT posts.*, bm25(posts_fts) AS relevance FROM posts_fts JOIN posts ON posts.rowid = posts_fts.rowid '
+                'WHERE posts_fts MATCH ? ORDER BY relevance LIMIT ? OFFSET ?',
+                (match, limit, offset)
+            )
+
+            posts = [
+                {**project(post_data, fields), 'score': -row['relevance']}
+                for post_data, row in zip(self._post_dicts(rows, summary=True), rows)
+            ]
+
+            return {
+                'posts': posts,
+                'total': total,
+                'has_more': offset + len(posts) < total
+            }
+        except Exception as e:
+            print(f'Error in search_posts: {e}')
+            raise e
+
+    # Duplicate detection methods
+
+    def _ready_duplicate_index(self):
+        with self._duplicate_index_lock:
+            if not self.duplicate_index.ready.is_set():
+                self.rebuild_duplicate_index()
+        return self.duplicate_index
+
+    def rebuild_duplicate_index(self, progress=None):
+        '''Rebuild the near-duplicate index from the posts table, returns {'posts_indexed'}'''
+        try:
+            counts = {'posts_indexed': 0}
+
+            def contents():
+                for rows in self._iter_pages('SELECT id, content FROM posts'):
+                    for row in rows:
+                        yield row['id'], row['content']
+                    counts['posts_indexed'] += len(rows)
+                    if progress:
+                        progress(dict(counts))
+
+            self.duplicate_index.replace(contents())
+            return counts
+        except Exception as e:
+            print(f'Error in rebuild_duplicate_index: {e}')
+            raise e
+
+    def _post_summaries_by_id(self, post_ids, fields=None):
+        if not post_ids:
+            return {}
+        rows = self._query(f"SELECT * FROM posts WHERE id IN ({','.join('?' * len(post_ids))})", post_ids)
+        return {post_data['id']: project(post_data, fields) for post_data in self._post_dicts(rows, summary=True)}
+
+    def get_similar_posts(self, post_id, threshold=0.5, limit=50, fields=None):
+        '''Posts whose content is a near-duplicate of a post, most similar first, with a similarity estimate each'''
+        try:
+            post = self._query_one('SELECT content FROM posts WHERE id = ?', (post_id,))
+            if not post:
+                raise Exception('Post not found')
+
+            matches = self._ready_duplicate_index().similar(text=post['content'], doc_id=post_id, threshold=threshold, limit=limit)
+            summaries = self._post_summaries_by_id([match_id for match_id, _ in matches], fields)
+            return [
+                {**summaries[match_id], 'similarity': round(similarity, 3)}
+                for match_id, similarity in matches
+                if match_id in summaries
+            ]
+        except Exception as e:
+            print(f'Error in get_similar_posts: {e}')
+            raise e
+
+    def get_duplicate_clusters(self, threshold=0.7, min_size=3, limit=20):
+        '''Clusters of near-duplicate posts, largest first, each with the post ids and one sample post'''
+        try:
+            clusters = self._ready_duplicate_index().clusters(threshold=threshold, min_size=min_size)
+            samples = self._post_summaries_by_id([post_ids[0] for post_ids in clusters[:limit]])
+
+            return {
+                'clusters': [
+                    {'size': len(post_ids), 'post_ids': post_ids, 'sample': samples.get(post_ids[0])}
+                    for post_ids in clusters[:limit]
+                ],
+                'total_clusters': len(clusters)
+            }
+        except Exception as e:
+            print(f'Error in get_duplicate_clusters: {e}')
+            raise e
+
+    # Moderation methods
+
+    def _moderate(self, conn, kind, post_id, comment_id, user_id, content, matcher=None):
+        '''Queue a post or comment for review if it contains a banned phrase, returns True if newly queued'''
+        matcher = matcher or self.moderation
+        matches = matcher.scan(content) if matcher else []
+        if not matches:
+            return False
+
+        item = review_item(kind, post_id, comment_id, user_id, content, matches)
+        # OR IGNORE keeps an item that is already queued, or was resolved, as it is
+        return conn.execute(
+            'INSERT OR IGNORE INTO moderation_queue (id, kind, post_id, comment_id, userId, content_preview, matches, status, createdAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (item['id'], kind, post_id, comment_id, user_id, item['content_preview'], json.dumps(matches), item['status'], _now())
+        ).rowcount > 0
+
+    def scan_for_moderation(self, progress=None, page_size=500):
+        '''Sweep every post and comment through the banned phrase automaton, flagged ones go to the review queue'''
+        try:
+            self.moderation = PhraseMatcher(load_phrases(self.moderation_phrases_path))
+            matcher = self.moderation
+            counts = {'posts_scanned': 0, 'comments_scanned': 0, 'flagged': 0, 'rules': len(matcher)}
+            if not matcher:
+                return counts
+
+            for rows in self._iter_pages('SELECT id, userId, content FROM posts', page_size=page_size):
+                with self._transaction() as conn:
+                    for row in rows:
+                        counts['flagged'] += self._moderate(conn, 'post', row['id'], None, row['userId'], row['content'], matcher)
+                counts['posts_scanned'] += len(rows)
+                if progress:
+                    progress(dict(counts))
+
+            for rows in self._iter_pages('SELECT id, post_id, userId, content FROM comments', page_size=page_size):
+                with self._transaction() as conn:
+                    for row in rows:
+                        counts['flagged'] += self._moderate(conn, 'comment', row['post_id'], row['id'], row['userId'], row['content'], matcher)
+                counts['comments_scanned'] += len(rows)
+                if progress:
+                    progress(dict(counts))
+
+            return counts
+        except Exception as e:
+            print(f'Error in scan_for_moderation: {e}')
+            raise e
+
+    def get_moderation_queue(self, status='pending', limit=50, cursor=None):
+        '''Get a page of review queue items with the given status, newest first'''
+        try:
+            rows, next_cursor = self._paginate('moderation_queue', 'status = ?', (status,), limit, cursor=cursor)
+
+            items = []
+            for row in rows:
+                item = dict(row)
+                item['matches'] = json.loads(item['matches'])
+                items.append(item)
+
+            return {
+                'items': items,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        except Exception as e:
+            print(f'Error in get_moderation_queue: {e}')
+            raise e
+
+    def resolve_moderation_item(self, item_id, action, admin_id=None):
+        '''Dismiss a review queue item or remove the flagged post/comment'''
+        try:
+            if action not in self.MODERATION_ACTIONS:
+                raise ValueError(f"action must be {' or '.join(self.MODERATION_ACTIONS)}")
+
+            item = self._query_one('SELECT * FROM moderation_queue WHERE id = ?', (item_id,))
+            if not item:
+                raise Exception('Review item not found')
+
+            if action == 'remove':
+                try:
+                    if item['kind'] == 'comment':
+                        self.delete_comment(item['post_id'], item['comment_id'], admin_id=admin_id)
+                    else:
+                        self.delete_post(item['post_id'], admin_id=admin_id)
+                except Exception as e:
+                    if 'not found' not in str(e): # already deleted some other way, still resolve it
+                        raise
+
+            status = 'removed' if action == 'remove' else 'dismissed'
+            with self._transaction() as conn:
+                conn.execute(
+                    'UPDATE moderation_queue SET status = ?, resolvedAt = ?, resolvedBy = ? WHERE id = ?',
+                    (status, _now(), admin_id, item_id)
+                )
+
+            if admin_id:
+                self.log_admin_action(admin_id, 'MODERATION_RESOLVED', {
+                    'item_id': item_id,
+                    'action': action,
+                    'post_id': item['post_id'],
+                    'comment_id': item['comment_id'],
+                    'user_id': item['userId']
+                })
+
+            return {
+                'id': item_id,
+                'kind': item['kind'],
+                'post_id': item['post_id'],
+                'comment_id': item['comment_id'],
+                'status': status
+            }
+        except Exception as e:
+            print(f'Error in resolve_moderation_item: {e}')
+            raise e
+
+    # Analytics methods
+
+    def get_analytics_summary(self, days=30):
+        '''Get summary analytics for the dashboard'''
+        try:
+            start_date = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)).isoformat()
+
+            # every count is answered from the createdAt indexes
+            summary = {}
+            for name in self.ROLLUP_METRICS:
+                summary[f'total_{name}'] = self._query_one(f'SELECT COUNT(*) FROM {name}')[0]
+                summary[f'new_{name}'] = self._query_one(f'SELECT COUNT(*) FROM {name} WHERE createdAt >= ?', (start_date,))[0]
+            summary['period_days'] = days
+
+            return summary
+        except Exception as e:
+            print(f'Error in get_analytics_summary: {e}')
+            raise e
+
+    def rebuild_counters(self, admin_id=None, progress=None):
+        '''Counts are always computed from the tables, so this only reports the totals'''
+        try:
+            totals = {name: self._query_one(f'SELECT COUNT(*) FROM {name}')[0] for name in self.ROLLUP_METRICS}
+            if admin_id:
+                self.log_admin_action(admin_id, 'COUNTERS_REBUILT', totals)
+            return totals
+        except Exception as e:
+            print(f'Error in rebuild_counters: {e}')
+            raise e
+
+    def compact_daily_rollups(self, page_size=400, settle_seconds=60):
+        '''Nothing to compact, the time series is grouped straight from the createdAt indexes'''
+        return {'users': 0, 'posts': 0, 'comment_days': 0}
+
+    def get_analytics_timeseries(self, days=30, metrics=StorageBackend.ROLLUP_METRICS):
+        '''Get per-day counts for the last `days` days'''
+        try:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            start_day = now.date() - datetime.timedelta(days=days - 1)
+
+            counts = {}
+            for metric in metrics:
+                rows = self._query(
+                    f'SELECT substr(createdAt, 1, 10) AS day, COUNT(*) AS count FROM {metric} '
+                    'WHERE createdAt >= ? GROUP BY day',
+                    (start_day.isoformat(),)
+                )
+                counts[metric] = {row['day']: row['count'] for row in rows}
+
+            series = []
+            for offset in range(days):
+                day = (start_day + datetime.timedelta(days=offset)).isoformat()
+                point = {'date': day}
+                for metric in metrics:
+                    point[metric] = counts[metric].get(day, 0)
+                series.append(point)
+
+            return {
+                'series': series,
+                'metrics': list(metrics),
+                'period_days': days,
+                'compacted_through': {metric: now.isoformat() for metric in self.ROLLUP_METRICS}
+            }
+        except Exception as e:
+            print(f'Error in get_analytics_timeseries: {e}')
+            raise e
+
+    # Job methods
+
+    def create_job(self, job_type, admin_id, params):
+        '''Record a queued background job'''
+        try:
+            job_id = _new_id()
+            with self._transaction() as conn:
+                conn.execute(
+                    'INSERT INTO admin_jobs (id, type, status, admin_id, params, createdAt, heartbeatAt) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, job_type, 'queued', admin_id, json.dumps(params), _now(), _now())
+                )
+            return job_id
+        except Exception as e:
+            print(f'Error in create_job: {e}')
+            raise e
+
+    def update_job(self, job_id, status=None, progress=None, result=None, error=None, started=False, finished=False):
+        '''Update the state of a background job'''
+        try:
+            updates = {}
+            if status is not None:
+                updates['status'] = status
+            if progress is not None:
+                updates['progress'] = json.dumps(progress)
+            if result is not None:
+                updates['result'] = json.dumps(result)
+            if error is not None:
+                updates['error'] = error
+            if started:
+                updates['startedAt'] = _now()
+            if finished:
+                updates['finishedAt'] = _now()
+
+            if updates:
+                assignments = ', '.join(f'{column} = ?' for column in updates)
+                with self._transaction() as conn:
+                    conn.execute(f'UPDATE admin_jobs SET {assignments} WHERE id = ?', (*updates.values(), job_id))
+            return True
+        except Exception as e:
+            print(f'Error in update_job: {e}')
+            raise e
+
+    def get_job(self, job_id):
+        '''Get a background job by id'''
+        try:
+            row = self._query_one('SELECT * FROM admin_jobs WHERE id = ?', (job_id,))
+            if not row:
+                return None
+
+            return {
+                'id': row['id'],
+                'type': row['type'],
+                'status': row['status'],
+                'admin_id': row['admin_id'],
+                'params': json.loads(row['params']),
+                'progress': json.loads(row['progress']),
+                'result': json.loads(row['result']) if row['result'] else None,
+                'error': row['error'],
+                'createdAt': row['createdAt'],
+                'startedAt': row['startedAt'],
+                'heartbeatAt': row['heartbeatAt'],
+                'finishedAt': row['finishedAt']
+            }
+        except Exception as e:
+            print(f'Error in get_job: {e}')
+            raise e
+
+    def heartbeat_jobs(self, job_ids):
+        '''Stamp the heartbeat of jobs that are still queued or running in this process'''
+        try:
+            with self._transaction() as conn:
+                conn.executemany('UPDATE admin_jobs SET heartbeatAt = ? WHERE id = ?', [(_now(), job_id) for job_id in job_ids])
+            return True
+        except Exception as e:
+            print(f'Error in heartbeat_jobs: {e}')
+            raise e
+
+    def fail_stale_jobs(self, stale_after, error):
+        '''Mark queued and running jobs without a heartbeat for stale_after seconds as failed, returns how many'''
+        try:
+            cutoff = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=stale_after)).isoformat()
+            with self._transaction() as conn:
+                return conn.execute(
+                    "UPDATE admin_jobs SET status = 'failed', error = ?, finishedAt = ? WHERE status IN ('queued', 'running') AND COALESCE(heartbeatAt, startedAt, createdAt) < ?",
+                    (error, _now(), cutoff)
+                ).rowcount
+        except Exception as e:
+            print(f'Error in fail_stale_jobs: {e}')
+            raise e
+
+    # Admin logs methods
+
+    def log_admin_action(self, admin_id, action_type, details=None):
+        '''Log an action taken/performed by an admin'''
+        try:
+            log_id = _new_id()
+            with self._transaction() as conn:
+                conn.execute(
+                    'INSERT INTO admin_logs (id, admin_id, action_type, details, timestamp, ip_address) VALUES (?, ?, ?, ?, ?, ?)',
+                    (log_id, admin_id, action_type, json.dumps(details or dict()), _now(), None)
+                )
+            return log_id
+        except Exception as e:
+            print(f'Error in log_admin_actions: {e}')
+            raise e
+
+    def get_admin_logs(self, limit=100, fields=None, filters=None, since=None, until=None, cursor=None):
+        '''Get a page of admin activity logs, newest first, only the requested fields when fields is given'''
+        try:
+            conditions = []
+            params = []
+            for name, value in (filters or {}).items():
+                conditions.append(f'{LOG_FILTER_COLUMNS[name]} = ?')
+                params.append(value)
+            # timestamps are stored as utc isoformat strings, which sort in time order
+            if since:
+                conditions.append('timestamp >= ?')
+                params.append(since.astimezone(datetime.timezone.utc).isoformat())
+            if until:
+                conditions.append('timestamp < ?')
+                params.append(until.astimezone(datetime.timezone.utc).isoformat())
+
+            rows, next_cursor = self._paginate(
+                'admin_logs', ' AND '.join(conditions), params, limit,
+                cursor=cursor, order_field='timestamp'
+            )
+
+            return {
+                'logs': [project(self._log_dict(row), fields) for row in rows],
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        except Exception as e:
+            print(f'Error in get_admins_logs: {e}')
+            raise e
+
+    # Export methods
+
+    def iter_users(self, fields=None):
+        '''Yield every user summary in createdAt order, one page of rows at a time'''
+        for rows in self._iter_pages(f'SELECT {USER_SUMMARY_COLUMNS} FROM users ORDER BY createdAt, id'):
+            for row in rows:
+                yield self._user_summary(row, fields)
+
+    def iter_posts(self, fields=None):
+        '''Yield every post summary in createdAt order, one page of rows at a time'''
+        for rows in self._iter_pages('SELECT * FROM posts ORDER BY createdAt, id'):
+            for post_data in self._post_dicts(rows, summary=True):
+                yield project(post_data, fields)
+
+    def iter_admin_logs(self, fields=None):
+        '''Yield every admin log entry in timestamp order, one page of rows at a time'''
+        for rows in self._iter_pages('SELECT * FROM admin_logs ORDER BY timestamp, id'):
+            for row in rows:
+                yield project(self._log_dict(row), fields)
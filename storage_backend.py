@@ -0,0 +1,305 @@
+# storage_backend.py
+from abc import ABC, abstractmethod
+import os
+
+class StorageBackend(ABC):
+    '''Data access interface used by the admin API
+
+    Implemented by FirebaseService (firestore) and SQLiteService (local sqlite database),
+    use create_storage_backend() to get the one selected by the STORAGE_BACKEND env variable.
+    Every implementation returns the same dict shapes so routes don't care which one is in use.
+    '''
+
+    ROLLUP_METRICS = ('users', 'posts', 'comments')
+    LOG_FILTERS = ('admin_id', 'action_type', 'user_id', 'post_id') # user_id and post_id are the target in the details
+    MODERATION_ACTIONS = ('dismiss', 'remove')
+
+    # Authentication methods
+
+    @abstractmethod
+    def register_user(self, email, password, username):
+        '''Create a user account, returns {'uid', 'email', 'displayName'}'''
+
+    @abstractmethod
+    def login_user(self, email, password):
+        '''Look up a user by email, returns {'uid', 'email', 'displayName'}'''
+
+    # User methods
+
+    @abstractmethod
+    def get_user_profile(self, user_id):
+        '''Get a user document, raises if the user does not exist'''
+
+    @abstractmethod
+    def get_user_posts(self, user_id, limit=50, cursor=None, order='desc', fields=None):
+        '''Get a page of a user's posts ordered by createdAt, returns {'posts', 'next_cursor', 'has_more'}
+
+        fields limits each post to the id and the given projection.POST_FIELDS, None returns them all.
+        '''
+
+    @abstractmethod
+    def search_users(self, search_term):
+        '''Get up to 10 users whose username starts with search_term'''
+
+    @abstractmethod
+    def admin_search_users(self, search_term, limit=20):
+        '''Get up to limit [{'id', 'username', 'email', 'suspended'}] whose username or email starts with search_term, ignoring case'''
+
+    @abstractmethod
+    def add_friend(self, user_id, friend_id):
+        pass
+
+    @abstractmethod
+    def remove_friend(self, user_id, friend_id):
+        pass
+
+    @abstractmethod
+    def toggle_follow(self, follower_id, target_user_id):
+        '''Follow or unfollow a user, returns True if now following'''
+
+    @abstractmethod
+    def update_user_profile(self, user_id, updates):
+        pass
+
+    def upload_profile_picture(self, user_id, file):
+        raise NotImplementedError('Profile pictures are not supported by this storage backend')
+
+    # Post methods
+
+    @abstractmethod
+    def create_post(self, user_id, content):
+        '''Create a post, returns the new post id'''
+
+    @abstractmethod
+    def get_friends_posts(self, user_id):
+        pass
+
+    @abstractmethod
+    def toggle_like(self, post_id, user_id):
+        '''Like or unlike a post, returns True if the post is now liked'''
+
+    @abstractmethod
+    def add_comment(self, post_id, user_id, content):
+        '''Add a comment to a post, returns the comment'''
+
+    @abstractmethod
+    def get_like_details(self, post_id, limit=None, offset=0):
+        '''Get [{'userId', 'username'}] for the users who liked a post, optionally one page at a time'''
+
+    @abstractmethod
+    def get_post(self, post_id):
+        '''Get a post, raises if the post does not exist'''
+
+    @abstractmethod
+    def get_feed(self, user_id, last_post=None, cursor=None):
+        pass
+
+    @abstractmethod
+    def get_comments(self, post_id, last_comment=None, cursor=None):
+        pass
+
+    @abstractmethod
+    def check_like_status(self, post_id, user_id):
+        pass
+
+    # Admin auth methods
+
+    @abstractmethod
+    def register_admin(self, email, password, name):
+        pass
+
+    @abstractmethod
+    def login_admin(self, email, password):
+        '''Authenticate an admin, returns the admin without its password or None'''
+
+    @abstractmethod
+    def get_admin(self, admin_id):
+        '''Get an admin without its password, or None if it does not exist'''
+
+    @abstractmethod
+    def get_revoked_admin_ids(self):
+        pass
+
+    @abstractmethod
+    def set_admin_revoked(self, admin_id, revoked=True, acting_admin_id=None):
+        pass
+
+    # User management methods
+
+    @abstractmethod
+    def get_all_users(self, limit=50, start_after=None, cursor=None, fields=None):
+        '''Get a page of users, returns {'users', 'last_user', 'next_cursor', 'has_more'}, fields as in get_user_posts'''
+
+    @abstractmethod
+    def delete_user(self, user_id, admin_id=None, progress=None):
+        '''Delete a user with their posts, comments and likes
+
+        progress(counts) is called as the cascade goes, returns
+        {'success', 'posts_deleted', 'comments_deleted', 'likes_removed'}
+        '''
+
+    @abstractmethod
+    def suspend_user(self, user_id, suspended=True, admin_id=None):
+        pass
+
+    # Post management methods
+
+    @abstractmethod
+    def get_all_posts(self, limit=50, start_after=None, cursor=None, fields=None):
+        '''Get a page of posts, returns {'posts', 'last_post', 'next_cursor', 'has_more'}, fields as in get_user_posts'''
+
+    @abstractmethod
+    def delete_post(self, post_id, admin_id=None):
+        pass
+
+    @abstractmethod
+    def update_post_content(self, post_id, new_content, admin_id=None):
+        pass
+
+    @abstractmethod
+    def delete_comment(self, post_id, comment_id, admin_id=None):
+        pass
+
+    @abstractmethod
+    def migrate_embedded_comments(self, progress=None):
+        '''Move comments embedded in post documents to their own records, returns {'posts_migrated', 'comments_migrated', 'posts_skipped'}'''
+
+    @abstractmethod
+    def bulk_delete_posts(self, post_ids, admin_id=None):
+        '''Delete many posts, logging each one, returns {'deleted': [ids], 'not_found': [ids]}'''
+
+    @abstractmethod
+    def bulk_delete_comments(self, comments, admin_id=None):
+        '''Delete many [{'post_id', 'comment_id'}] comments, returns {'deleted', 'not_found'} in the same shape'''
+
+    # Post search methods
+
+    @abstractmethod
+    def rebuild_post_index(self, progress=None):
+        '''Rebuild the post full-text index from scratch, returns {'posts_indexed'}'''
+
+    @abstractmethod
+    def search_posts(self, query, limit=20, offset=0, fields=None):
+        '''Rank posts matching query (words, "quoted phrases"), returns {'posts', 'total', 'has_more'}
+
+        Each post is a get_all_posts summary (fields as in get_user_posts) with a relevance 'score'.
+        '''
+
+    # Export methods
+
+    @abstractmethod
+    def iter_users(self, fields=None):
+        '''Yield every user in the get_all_users shape, reading the table a page at a time'''
+
+    @abstractmethod
+    def iter_posts(self, fields=None):
+        '''Yield every post in the get_all_posts shape, reading the table a page at a time'''
+
+    @abstractmethod
+    def iter_admin_logs(self, fields=None):
+        '''Yield every admin log entry in the get_admin_logs shape, reading the table a page at a time'''
+
+    # Duplicate detection methods
+
+    @abstractmethod
+    def rebuild_duplicate_index(self, progress=None):
+        '''Rebuild the near-duplicate (minhash) index from scratch, returns {'posts_indexed'}'''
+
+    @abstractmethod
+    def get_similar_posts(self, post_id, threshold=0.5, limit=50, fields=None):
+        '''Get post summaries whose estimated content jaccard similarity to post_id is at least threshold, most similar first'''
+
+    @abstractmethod
+    def get_duplicate_clusters(self, threshold=0.7, min_size=3, limit=20):
+        '''Get {'clusters': [{'size', 'post_ids', 'sample'}], 'total_clusters'} of near-duplicate posts, largest first'''
+
+    # Moderation methods
+
+    @abstractmethod
+    def scan_for_moderation(self, progress=None):
+        '''Scan every post and comment for banned phrases and queue the flagged ones for review
+
+        Returns {'posts_scanned', 'comments_scanned', 'flagged', 'rules'}, flagged counts only newly queued items.
+        '''
+
+    @abstractmethod
+    def get_moderation_queue(self, status='pending', limit=50, cursor=None):
+        '''Get a page of review items newest first, returns {'items', 'next_cursor', 'has_more'}'''
+
+    @abstractmethod
+    def resolve_moderation_item(self, item_id, action, admin_id=None):
+        '''Apply one of MODERATION_ACTIONS to a review item, returns {'id', 'kind', 'post_id', 'comment_id', 'status'}'''
+
+    # Analytics methods
+
+    @abstractmethod
+    def get_analytics_summary(self, days=30):
+        pass
+
+    @abstractmethod
+    def rebuild_counters(self, admin_id=None, progress=None):
+        '''Recompute any maintained totals from the source data, returns the totals
+
+        Runs as a background job, progress is called with the documents counted so far.
+        '''
+
+    @abstractmethod
+    def compact_daily_rollups(self):
+        pass
+
+    @abstractmethod
+    def get_analytics_timeseries(self, days=30, metrics=ROLLUP_METRICS):
+        pass
+
+    def get_cache_stats(self):
+        return []
+
+    # Job methods
+
+    @abstractmethod
+    def create_job(self, job_type, admin_id, params):
+        '''Record a queued background job, returns the job id'''
+
+    @abstractmethod
+    def update_job(self, job_id, status=None, progress=None, result=None, error=None, started=False, finished=False):
+        '''Update a job record, started/finished stamp the start and finish times'''
+
+    @abstractmethod
+    def get_job(self, job_id):
+        '''Get a job record, or None if it does not exist'''
+
+    @abstractmethod
+    def heartbeat_jobs(self, job_ids):
+        '''Stamp the heartbeat of jobs that are still queued or running in this process'''
+
+    @abstractmethod
+    def fail_stale_jobs(self, stale_after, error):
+        '''Mark queued and running jobs without a heartbeat for stale_after seconds as failed, returns how many'''
+
+    # Admin logs methods
+
+    @abstractmethod
+    def log_admin_action(self, admin_id, action_type, details=None):
+        pass
+
+    @abstractmethod
+    def get_admin_logs(self, limit=100, fields=None, filters=None, since=None, until=None, cursor=None):
+        '''Get a page of logs newest first, returns {'logs', 'next_cursor', 'has_more'}
+
+        filters maps LOG_FILTERS names to the value to match, since/until are aware datetimes
+        bounding the timestamp (since inclusive, until exclusive).
+        '''
+
+def create_storage_backend():
+    '''Create the storage backend selected by STORAGE_BACKEND (firestore or sqlite)'''
+    backend = os.environ.get('STORAGE_BACKEND', 'firestore').lower()
+
+    # imported lazily so the sqlite backend runs without the firebase sdk installed
+    if backend == 'firestore':
+        from firebase_service import FirebaseService
+        return FirebaseService()
+    if backend == 'sqlite':
+        from sqlite_service import SQLiteService
+        return SQLiteService(os.environ.get('SQLITE_PATH', 'admin.db'))
+
+    raise ValueError(f'Unknown STORAGE_BACKEND {backend!r}, expected firestore or sqlite')
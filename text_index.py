@@ -0,0 +1,185 @@
+# text_index.py
+import heapq
+import math
+import re
+import threading
+
+TOKEN_RE = re.compile(r'\w+')
+PHRASE_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+def tokenize(text):
+    '''Split text into casefolded word tokens'''
+    return TOKEN_RE.findall((text or '').casefold())
+
+def parse_query(query):
+    '''Split a search query into phrases, a quoted "exact phrase" is one phrase and any other word is its own'''
+    phrases = []
+    for quoted, word in PHRASE_RE.findall(query or ''):
+        tokens = tokenize(quoted if quoted else word)
+        if quoted and tokens:
+            phrases.append(tokens)
+        else:
+            phrases.extend([token] for token in tokens)
+    return phrases
+
+class TextIndex:
+    '''In-process inverted index with positional postings, ranked with BM25
+
+    postings maps term -> {doc_id: [positions]}, so phrases can be matched by position and a
+    document can be removed without re-reading its text. Every query term has to match (AND)
+    and quoted phrases have to appear as consecutive tokens.
+    '''
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self._postings = {}
+        self._docs = {} # doc id -> (token count, distinct terms)
+        self._total_length = 0
+        self._changes = None # adds and removes made while a rebuild is reading, replayed onto its result
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _positions(text):
+        positions = {}
+        tokens = tokenize(text)
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, []).append(position)
+        return len(tokens), positions
+
+    def replace(self, docs):
+        '''Rebuild the whole index from (doc_id, text) pairs and mark it ready
+
+        The current index keeps serving searches until the new one is swapped in, changes made
+        in the meantime are applied to both so none is lost with the swap.
+        '''
+        with self._lock:
+            if self._changes is None: # begin_replace may have started recording already
+                self._changes = []
+
+        try:
+            postings = {}
+            doc_info = {}
+            total_length = 0
+            for doc_id, text in docs:
+                length, positions = self._positions(text)
+                for term, term_positions in positions.items():
+                    postings.setdefault(term, {})[doc_id] = term_positions
+                doc_info[doc_id] = (length, tuple(positions))
+                total_length += length
+
+            with self._lock:
+                self._postings = postings
+                self._docs = doc_info
+                self._total_length = total_length
+                for doc_id, text in self._changes:
+                    self._remove(doc_id)
+                    if text is not None:
+                        self._add(doc_id, text)
+        finally:
+            with self._lock:
+                self._changes = None
+        self.ready.set()
+
+    def begin_replace(self):
+        '''Start recording changes for a replace whose documents are read from now on'''
+        with self._lock:
+            if self._changes is None:
+                self._changes = []
+
+    def cancel_replace(self):
+        '''Stop recording after begin_replace when the replace will not happen'''
+        with self._lock:
+            self._changes = None
+
+    def add(self, doc_id, text):
+        '''Index a document, replacing its previous text if it was indexed'''
+        with self._lock:
+            self._remove(doc_id)
+            self._add(doc_id, text)
+            if self._changes is not None:
+                self._changes.append((doc_id, text))
+
+    def remove(self, *doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+                if self._changes is not None:
+                    self._changes.append((doc_id, None))
+
+    def _add(self, doc_id, text):
+        length, positions = self._positions(text)
+        for term, term_positions in positions.items():
+            self._postings.setdefault(term, {})[doc_id] = term_positions
+        self._docs[doc_id] = (length, tuple(positions))
+        self._total_length += length
+
+    def _remove(self, doc_id):
+        info = self._docs.pop(doc_id, None)
+        if info is None:
+            return
+        length, terms = info
+        for term in terms:
+            docs = self._postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self._postings[term]
+        self._total_length -= length
+
+    def _has_phrase(self, phrase, doc_id):
+        # every later token has to sit right after the one before it
+        first = self._postings[phrase[0]][doc_id]
+        rest = [set(self._postings[term][doc_id]) for term in phrase[1:]]
+        return any(
+            all(start + offset in positions for offset, positions in enumerate(rest, 1))
+            for start in first
+        )
+
+    def search(self, query, limit=20, offset=0):
+        '''Rank the documents matching query, returns (total, [(doc_id, score)]) for the requested page'''
+        phrases = parse_query(query)
+        if not phrases:
+            return 0, []
+
+        terms = list(dict.fromkeys(term for phrase in phrases for term in phrase))
+        with self._lock:
+            if any(term not in self._postings for term in terms):
+                return 0, []
+
+            # intersect starting from the rarest term so the candidate set stays small
+            by_rarity = sorted(terms, key=lambda term: len(self._postings[term]))
+            candidates = set(self._postings[by_rarity[0]])
+            for term in by_rarity[1:]:
+                candidates.intersection_update(self._postings[term])
+                if not candidates:
+                    return 0, []
+
+            for phrase in phrases:
+                if len(phrase) > 1:
+                    candidates = {doc_id for doc_id in candidates if self._has_phrase(phrase, doc_id)}
+
+            doc_count = len(self._docs)
+            average_length = self._total_length / doc_count if doc_count else 0
+            idf = {
+                term: math.log(1 + (doc_count - len(self._postings[term]) + 0.5) / (len(self._postings[term]) + 0.5))
+                for term in terms
+            }
+
+            def score(doc_id):
+                length = self._docs[doc_id][0]
+                norm = self.K1 * (1 - self.B + self.B * length / average_length) if average_length else self.K1
+                total = 0.0
+                for term in terms:
+                    tf = len(self._postings[term][doc_id])
+                    total += idf[term] * tf * (self.K1 + 1) / (tf + norm)
+                return total
+
+            top = heapq.nsmallest(offset + limit, ((-score(doc_id), doc_id) for doc_id in candidates))
+
+        return len(candidates), [(doc_id, -negative) for negative, doc_id in top[offset:]]
+
+    def __len__(self):
+        return len(self._docs)
@@ -0,0 +1,87 @@
+# user_index.py
+import bisect
+import threading
+
+def normalize(text):
+    '''Lowercase and trim a search key, casefold also folds ß and the like'''
+    return (text or '').strip().casefold()
+
+def search_summary(user_id, user_data):
+    '''The fields a search result carries'''
+    return {
+        'id': user_id,
+        'username': user_data.get('username', ''),
+        'email': user_data.get('email', ''),
+        'suspended': user_data.get('suspended', False)
+    }
+
+class UserSearchIndex:
+    '''In-process prefix index over normalized usernames and emails for admin typeahead
+
+    Each key kind is a sorted list of (key, user_id), a prefix lookup is a bisect to the first
+    match and a scan while keys still start with the prefix. `ready` is set once the index has
+    been loaded, until then callers should fall back to querying the database.
+    '''
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self._usernames = []
+        self._emails = []
+        self._users = {} # user id -> summary returned by search
+        self._lock = threading.Lock()
+
+    def replace(self, users):
+        '''Rebuild the whole index from (user_id, user_data) pairs, sorting once instead of inserting one by one'''
+        summaries = {user_id: search_summary(user_id, user_data) for user_id, user_data in users}
+        usernames = sorted((normalize(user['username']), user_id) for user_id, user in summaries.items())
+        emails = sorted((normalize(user['email']), user_id) for user_id, user in summaries.items())
+
+        with self._lock:
+            self._users = summaries
+            self._usernames = usernames
+            self._emails = emails
+        self.ready.set()
+
+    def upsert(self, user_id, user_data):
+        summary = search_summary(user_id, user_data)
+        with self._lock:
+            self._remove(user_id)
+            self._users[user_id] = summary
+            bisect.insort(self._usernames, (normalize(summary['username']), user_id))
+            bisect.insort(self._emails, (normalize(summary['email']), user_id))
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def _remove(self, user_id):
+        user = self._users.pop(user_id, None)
+        if user is None:
+            return
+        for keys, key in ((self._usernames, user['username']), (self._emails, user['email'])):
+            entry = (normalize(key), user_id)
+            i = bisect.bisect_left(keys, entry)
+            if i < len(keys) and keys[i] == entry:
+                del keys[i]
+
+    def search(self, term, limit=20):
+        '''Users whose username or email starts with term (case-insensitive), username matches first'''
+        prefix = normalize(term)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            for keys in (self._usernames, self._emails):
+                i = bisect.bisect_left(keys, (prefix,))
+                while i < len(keys) and len(results) < limit and keys[i][0].startswith(prefix):
+                    user_id = keys[i][1]
+                    if user_id not in seen:
+                        seen.add(user_id)
+                        results.append(dict(self._users[user_id]))
+                    i += 1
+        return results
+
+    def __len__(self):
+        return len(self._users)